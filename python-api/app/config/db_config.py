@@ -77,10 +77,10 @@ class DatabaseConfig:
             db.close()
 
     @classmethod
-    def load_data_from_db(cls, query: str) -> pd.DataFrame:
+    def load_data_from_db(cls, query: str, params=None) -> pd.DataFrame:
         try:
             with cls.get_db_connection() as engine:
-                df = pd.read_sql_query(query, engine)
+                df = pd.read_sql_query(query, engine, params=params)
             print(
                 f"✅ Dados carregados com sucesso! DataFrame tem "
                 f"{df.shape[0]} linhas e {df.shape[1]} colunas."
@@ -57,11 +57,13 @@ class ImportController:
     @router.post("/upload/historical-data")
     async def import_historical_data(
         file: UploadFile = File(...),
+        streaming: bool = Form(False),
         db: Session = Depends(get_db)
     ):
         """
         Importa dados históricos de vendas.
         Aceita formato wide (colunas de datas) ou long (periodo, cdproduto, valor).
+        Com `streaming=true` o arquivo é lido e gravado em lotes (arquivos grandes).
         """
         ext = validate_file_extension(file.filename)
         manager = ImportService(db)
@@ -69,7 +71,8 @@ class ImportController:
         try:
             result = await manager.processar_dados_historicos(
                 file=file,
-                file_extension=ext
+                file_extension=ext,
+                streaming=streaming
             )
             return result
         except Exception as e:
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+from typing import List, Optional
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.config.db_config import DatabaseConfig
+from app.controllers.import_controller import validate_file_extension
+from app.repository.dataset_cache import DatasetCache
+from app.schemas.forecasting import CatalogForecastRequest
+from app.schemas.job import JobResponse, JobResultResponse
+from app.services.import_service import ImportService
+from app.services.job_service import JOB_UPLOAD_DIR, JobService
+from app.services.xgboost_service import XGBoostService
+
+router = APIRouter()
+
+
+def _salvar_upload(file: UploadFile, ext: str) -> str:
+    """Copia o upload para um arquivo próprio: o UploadFile é fechado ao fim do request."""
+    with tempfile.NamedTemporaryFile(delete=False, prefix="import_", suffix=ext, dir=JOB_UPLOAD_DIR) as tmp:
+        shutil.copyfileobj(file.file, tmp, 1024 * 1024)
+        return tmp.name
+
+
+def _remover_arquivo(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _tarefa_importacao(path: str, ext: str):
+    """Importação em streaming do arquivo salvo, com progresso pela posição de leitura."""
+    def tarefa(ctx):
+        size = os.path.getsize(path)
+        with open(path, "rb") as fh:
+            def progresso(lotes, linhas):
+                fracao = min(fh.tell() / size, 0.99) if size else None
+                ctx.progress(fracao, f"{lotes} lotes lidos, {linhas} linhas importadas")
+
+            return ImportService(None)._processar_historico_em_lotes(fh, ext, progresso=progresso)
+
+    return tarefa
+
+
+def _tarefa_previsao_catalogo(payload: CatalogForecastRequest):
+    """
+    Previsão XGBoost de todos os SKUs. Com treino separado da previsão
+    (lockstep ou modo global), o treino ocupa a primeira metade do progresso
+    e as previsões por SKU concluído, a segunda.
+    """
+    def tarefa(ctx):
+        ctx.progress(0.0, "Carregando histórico preprocessado", force=True)
+        df_processed = DatasetCache.get_preprocessed()
+        total = int(df_processed["SKU"].nunique())
+        concluidos = 0
+        peso_treino = 0.5 if payload.lockstep or payload.training_mode == "global" else 0.0
+
+        def on_progress(feitos, total_treino, mensagem):
+            ctx.progress(peso_treino * feitos / total_treino if total_treino else None, mensagem)
+
+        def on_result(sku, forecast, error):
+            nonlocal concluidos
+            concluidos += 1
+            fracao = peso_treino + (1 - peso_treino) * concluidos / total if total else None
+            ctx.progress(fracao, f"{concluidos}/{total} SKUs")
+
+        with DatabaseConfig.get_db_session() as db:
+            run_id, failed_skus = XGBoostService(db).predict_all_skus(
+                df_processed,
+                periods=payload.periods,
+                lockstep=payload.lockstep,
+                training_mode=payload.training_mode,
+                pool_by=payload.pool_by,
+                n_jobs=payload.n_jobs,
+                on_result=on_result,
+                on_progress=on_progress,
+            )
+
+        return {
+            "run_id": str(run_id),
+            "total_skus": total,
+            "succeeded": total - len(failed_skus),
+            "failed_skus": [{"sku": sku, "error": error} for sku, error in failed_skus],
+        }
+
+    return tarefa
+
+
+class JobController:
+
+    @router.post("/jobs/import/historical-data", response_model=JobResponse, status_code=202)
+    async def submit_historical_import(file: UploadFile = File(...)):
+        """
+        Importação de dados históricos em segundo plano (streaming, em lotes).
+        Devolve a tarefa; acompanhe em /jobs/{job_id}.
+        """
+        ext = validate_file_extension(file.filename)
+        path = await run_in_threadpool(_salvar_upload, file, ext)
+
+        try:
+            return await run_in_threadpool(
+                JobService.submit,
+                "import_historical",
+                _tarefa_importacao(path, ext),
+                {"filename": file.filename},
+                lambda: _remover_arquivo(path),
+            )
+        except Exception as e:
+            _remover_arquivo(path)
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.post("/jobs/forecast/catalog", response_model=JobResponse, status_code=202)
+    def submit_catalog_forecast(payload: CatalogForecastRequest):
+        """
+        Previsão XGBoost de todo o catálogo em segundo plano.
+        O resultado (run_id e SKUs com falha) fica em /jobs/{job_id}/result.
+        """
+        try:
+            return JobService.submit(
+                "forecast_catalog",
+                _tarefa_previsao_catalogo(payload),
+                payload.model_dump(),
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @router.get("/jobs", response_model=List[JobResponse])
+    def list_jobs(kind: Optional[str] = None, status: Optional[str] = None, limit: int = 50):
+        return JobService.list(kind=kind, status=status, limit=limit)
+
+    @router.get("/jobs/{job_id}", response_model=JobResponse)
+    def get_job(job_id: str):
+        """Status e progresso da tarefa."""
+        job = JobService.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Tarefa '{job_id}' não encontrada")
+        return job
+
+    @router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+    def cancel_job(job_id: str):
+        """
+        Cancela a tarefa: na fila, na hora; em execução, no próximo passo de
+        progresso (lotes já gravados de uma importação permanecem).
+        """
+        job = JobService.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Tarefa '{job_id}' não encontrada")
+        return job
+
+    @router.get("/jobs/{job_id}/result", response_model=JobResultResponse)
+    def get_job_result(job_id: str):
+        job = JobService.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Tarefa '{job_id}' não encontrada")
+        if job["status"] != "completed":
+            raise HTTPException(
+                status_code=409,
+                detail=f"Tarefa '{job_id}' sem resultado (status: {job['status']})",
+            )
+        return {"job_id": job["job_id"], "status": job["status"], "result": job["result"]}
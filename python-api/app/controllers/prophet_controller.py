@@ -1,8 +1,15 @@
 from app.data_processing.clusterization import DataClusterization
-from app.data_processing.transformer import DataTransformer
 from app.deps import get_db
+from app.repository.dataset_cache import DatasetCache
 from app.repository.query_repository import QueryRepository
-from app.schemas.forecasting import ForecastRequest, ForecastRunResponse
+from app.schemas.forecasting import (
+    BatchForecastItemResponse,
+    BatchForecastRequest,
+    BatchForecastRunResponse,
+    ForecastRequest,
+    ForecastRunResponse,
+)
+from app.services.aggregation_service import AggregationService
 from app.services.classification_service import ClassificationService
 from app.services.redirect_service import RedirectService
 from fastapi import APIRouter, Depends, HTTPException
@@ -14,7 +21,7 @@ router = APIRouter()
 class ProphetController:
     @router.get("/outliers")
     def get_data(db: Session = Depends(get_db)):
-        df_processed = DataTransformer().preprocess(QueryRepository.get_all_skus())
+        df_processed = DatasetCache.get_preprocessed()
 
         return "OK", df_processed.to_dict(orient="records")
 
@@ -97,11 +104,6 @@ class ProphetController:
                 }
         """
         try:
-            df_processed = DataTransformer().preprocess(QueryRepository.get_all_skus())
-            df_classified = ClassificationService.classificar_abc_segmentado(
-                ClassificationService.somar_quantidade_por_segmento(df_processed)
-            )
-
             # Validações específicas por tipo de agregação
             if payload.aggregation_type == "sku" and not payload.sku:
                 raise HTTPException(
@@ -121,6 +123,20 @@ class ProphetController:
                     "⚠️ Modelo não especificado para agregação. Usando Prophet como padrão."
                 )
 
+            if payload.aggregation_type == "sku":
+                # Só a série do SKU é preprocessada; a classe ABC vem do índice
+                # em cache (e nem é consultada se o modelo foi especificado)
+                df_processed = DatasetCache.get_sku_preprocessed(payload.sku)
+                df_classified = None
+                routing_index = None if payload.model else ClassificationService.indice_roteamento_cacheado()
+                cube = None
+            else:
+                # Agregações saem do cubo Família × Processo × ABC × mês em cache
+                df_processed = DatasetCache.get_preprocessed()
+                df_classified = ClassificationService.classificar_abc_cacheado(df_processed)
+                routing_index = None
+                cube = AggregationService.cubo_cacheado(df_processed, df_classified)
+
             result = RedirectService.model_direction(
                 df=df_classified,
                 df_processed=df_processed,
@@ -132,6 +148,8 @@ class ProphetController:
                 familia=payload.familia,
                 processo=payload.processo,
                 abc_class=payload.abc_class,
+                routing_index=routing_index,
+                cube=cube,
             )
 
             (
@@ -170,30 +188,95 @@ class ProphetController:
             traceback.print_exc()
             raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+    @router.post("/predict/batch", response_model=BatchForecastRunResponse)
+    def predict_batch(payload: BatchForecastRequest, db: Session = Depends(get_db)):
+        """
+        Várias previsões numa única execução (ex.: todas as famílias, todos os
+        processos e todas as classes ABC).
+
+        Dados preprocessados, classificação ABC e cubo de agregação são
+        carregados uma vez para o lote; os modelos são treinados em paralelo
+        e todas as séries ficam no mesmo run_id. Itens que falham não
+        interrompem os demais (status "partial").
+
+        EXEMPLO:
+                {
+                    "items": [
+                        {"aggregation_type": "familia", "familia": ["LINHA_A"], "model": "XGBoost"},
+                        {"aggregation_type": "processo", "processo": ["PROC_X"], "model": "XGBoost"},
+                        {"aggregation_type": "abc", "abc_class": ["A"], "model": "XGBoost"}
+                    ],
+                    "n_jobs": 4
+                }
+        """
+        try:
+            df_processed = DatasetCache.get_preprocessed()
+            df_classified = ClassificationService.classificar_abc_cacheado(df_processed)
+
+            run_id, results, time = RedirectService.model_direction_batch(
+                payload.items,
+                df=df_classified,
+                df_processed=df_processed,
+                db=db,
+                routing_index=ClassificationService.indice_roteamento_cacheado(df_processed),
+                cube=AggregationService.cubo_cacheado(df_processed, df_classified),
+                n_jobs=payload.n_jobs,
+            )
+
+            items = []
+            for result in results:
+                forecast_df = result.pop("forecast_df", None)
+                preview = (
+                    forecast_df.head(payload.preview_rows).to_dict(orient="records")
+                    if forecast_df is not None
+                    else None
+                )
+                items.append(BatchForecastItemResponse(preview=preview, **result))
+
+            failed = sum(item.status == "failed" for item in items)
+            if failed == 0:
+                status = "completed"
+            elif failed == len(items):
+                status = "failed"
+            else:
+                status = "partial"
+
+            return BatchForecastRunResponse(
+                run_id=str(run_id) if run_id is not None else None,
+                status=status,
+                time=time,
+                results=items,
+            )
+
+        except Exception as e:
+            print(f"\n❌ Erro inesperado no lote: {str(e)}")
+            import traceback
+
+            traceback.print_exc()
+            raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
     @router.get("/classifier")
     def classify(db: Session = Depends(get_db)):
-        df_processed = DataTransformer().preprocess(QueryRepository.get_all_skus())
+        df_processed = DatasetCache.get_preprocessed()
 
-        df_classified = ClassificationService.classificar_abc_segmentado(
-            ClassificationService.somar_quantidade_por_segmento(df_processed)
-        )
+        df_classified = ClassificationService.classificar_abc_cacheado(df_processed)
 
         return df_classified.to_dict(orient="records")
 
     @router.get("/metrics")
     def get_model_metrics():
-        df_processed = DataTransformer().preprocess(QueryRepository.get_all_skus())
+        df_processed = DatasetCache.get_preprocessed()
         df_clustered = DataClusterization.obter_metricas_todos_skus(df_processed)
         return df_clustered
 
     @router.get("/metrics/{sku}")
     def get_sku_metrics(sku: str):
-        df_processed = DataTransformer().preprocess(QueryRepository.get_all_skus())
+        df_processed = DatasetCache.get_preprocessed()
         df_clustered = DataClusterization.obter_metricas(df_processed, sku)
         return df_clustered
 
     @router.get("/clusters")
     def get_sku_clusters():
-        df_processed = DataTransformer().preprocess(QueryRepository.get_all_skus())
+        df_processed = DatasetCache.get_preprocessed()
         df_metrics = DataClusterization.clusterizar_skus(df_processed)
         return df_metrics
@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+
+class AggregateCube:
+    """
+    Cubo denso Família × Processo × ABC × mês com somas e contagens.
+
+    Cada linha do histórico cai numa célula (família, processo, máscara ABC);
+    por célula guardamos a soma e a contagem de cada data, o total e a
+    primeira linha em que aparece. A máscara ABC é, por SKU, o conjunto de
+    classes que ele recebeu em algum segmento (bit 0 = A, 1 = B, 2 = C),
+    de modo que filtrar por classes equivale a `SKU.isin(skus_da_classe)`.
+
+    Um filtro qualquer (famílias, processos, classes) vira uma máscara de
+    células, e a série agregada é a soma das fatias selecionadas — sem
+    varrer as linhas por SKU. As informações por SKU (quantos, quais)
+    vêm da tabela de pares (célula, SKU), do tamanho do catálogo.
+    """
+
+    ABC_CLASSES = ("A", "B", "C")
+    N_MASKS = 1 << len(ABC_CLASSES)
+
+    def __init__(self, familias, processos, dates, skus, sums, counts, cell_rows, cell_total,
+                 cell_first, pair_cell, pair_sku, abc_skus=None, abc_classes=None, dtype=np.float64):
+        self.familias = familias
+        self.processos = processos
+        self.dates = dates
+        self.skus = skus
+        self.sums = sums
+        self.counts = counts
+        self.cell_rows = cell_rows
+        self.cell_total = cell_total
+        self.cell_first = cell_first
+        self.pair_cell = pair_cell
+        self.pair_sku = pair_sku
+        self.abc_skus = abc_skus
+        self.abc_classes = abc_classes
+        self.dtype = dtype
+
+    @property
+    def has_abc(self):
+        """Se o cubo foi montado com a classificação ABC."""
+        return self.abc_skus is not None
+
+    # --------------------------------------------------------------- montagem
+
+    @classmethod
+    def build(cls, df, df_classified=None):
+        """
+        Monta o cubo a partir do histórico preprocessado (já sem duplicatas,
+        ver AggregationService._prepare_data) e, opcionalmente, da
+        classificação ABC.
+        """
+        fam_codes, familias = pd.factorize(df["Familia"], use_na_sentinel=False)
+        proc_codes, processos = pd.factorize(df["Processo"], use_na_sentinel=False)
+        sku_codes, skus = pd.factorize(df["SKU"], use_na_sentinel=False)
+        date_codes, dates = pd.factorize(df["Data"], sort=True)
+        skus = pd.Index(skus)
+
+        # Máscara ABC de cada SKU (classes em que aparece na classificação)
+        abc_skus = abc_classes = None
+        sku_mask = np.zeros(len(skus), dtype=np.int64)
+        if df_classified is not None:
+            abc_skus = df_classified["SKU"].to_numpy()
+            abc_classes = df_classified["Classe_ABC"].to_numpy()
+            positions = skus.get_indexer(abc_skus)
+            for bit, classe in enumerate(cls.ABC_CLASSES):
+                found = positions[(abc_classes == classe) & (positions >= 0)]
+                sku_mask[np.unique(found)] |= 1 << bit
+
+        n_fam, n_proc, n_dates = len(familias), len(processos), len(dates)
+        n_cells = n_fam * n_proc * cls.N_MASKS
+        cell = (fam_codes * n_proc + proc_codes) * cls.N_MASKS + sku_mask[sku_codes]
+
+        quantidade = df["Quantidade"].to_numpy(dtype=np.float64)
+        quantidade = np.where(np.isnan(quantidade), 0.0, quantidade)
+
+        # Somas e contagens por (célula, data); linhas sem data só entram no total
+        dated = date_codes >= 0
+        flat = cell[dated] * n_dates + date_codes[dated]
+        sums = np.bincount(flat, weights=quantidade[dated], minlength=n_cells * n_dates)
+        counts = np.bincount(flat, minlength=n_cells * n_dates)
+
+        cell_rows = np.bincount(cell, minlength=n_cells)
+        cell_total = np.bincount(cell, weights=quantidade, minlength=n_cells)
+        cell_first = np.full(n_cells, len(df), dtype=np.int64)
+        present, first = np.unique(cell, return_index=True)
+        cell_first[present] = first
+
+        # Pares (célula, SKU) na ordem da primeira linha em que aparecem
+        pairs, first = np.unique(cell * len(skus) + sku_codes, return_index=True)
+        order = np.argsort(first, kind="stable")
+        pairs = pairs[order]
+
+        cube = cls(
+            familias=pd.Index(familias),
+            processos=pd.Index(processos),
+            dates=pd.DatetimeIndex(dates),
+            skus=skus,
+            sums=sums.reshape(n_cells, n_dates),
+            counts=counts.reshape(n_cells, n_dates),
+            cell_rows=cell_rows,
+            cell_total=cell_total,
+            cell_first=cell_first,
+            pair_cell=pairs // max(len(skus), 1),
+            pair_sku=pairs % max(len(skus), 1),
+            abc_skus=abc_skus,
+            abc_classes=abc_classes,
+            dtype=df["Quantidade"].dtype,
+        )
+        for array in (cube.sums, cube.counts, cube.cell_rows, cube.cell_total, cube.cell_first):
+            array.flags.writeable = False
+        return cube
+
+    # ---------------------------------------------------------------- filtros
+
+    def select(self, familia=None, processo=None, abc_class=None, mask=None):
+        """
+        Máscara de células do filtro (E lógico com `mask`, se informada).
+        Listas vazias ou None não filtram a dimensão, como nos serviços.
+        """
+        fam = self.familias.isin(familia) if familia else np.ones(len(self.familias), dtype=bool)
+        proc = self.processos.isin(processo) if processo else np.ones(len(self.processos), dtype=bool)
+        masks = np.arange(self.N_MASKS)
+        if abc_class:
+            bits = sum(1 << self.ABC_CLASSES.index(c) for c in abc_class if c in self.ABC_CLASSES)
+            abc = (masks & bits) != 0
+        else:
+            abc = np.ones(self.N_MASKS, dtype=bool)
+
+        selected = (fam[:, None, None] & proc[None, :, None] & abc[None, None, :]).ravel()
+        return selected if mask is None else selected & mask
+
+    def n_rows(self, mask):
+        """Quantidade de linhas do histórico nas células selecionadas."""
+        return int(self.cell_rows[mask].sum())
+
+    def abc_sku_list(self, abc_class):
+        """SKUs da classificação com classe em `abc_class` (ordem da classificação)."""
+        return pd.unique(self.abc_skus[np.isin(self.abc_classes, abc_class)])
+
+    # ------------------------------------------------------------- resultados
+
+    def series(self, mask):
+        """Série agregada (Data, Quantidade) das células, só com datas presentes."""
+        sums = self.sums[mask].sum(axis=0)
+        present = self.counts[mask].sum(axis=0) > 0
+        quantidade = sums[present]
+        if np.issubdtype(self.dtype, np.integer):
+            quantidade = quantidade.astype(self.dtype)
+        return pd.DataFrame({"Data": self.dates[present], "Quantidade": quantidade})
+
+    def total(self, mask):
+        total = self.cell_total[mask].sum()
+        return self.dtype.type(total) if np.issubdtype(self.dtype, np.integer) else total
+
+    def date_range(self, mask):
+        present = np.flatnonzero(self.counts[mask].sum(axis=0) > 0)
+        if len(present) == 0:
+            return {"start": str(pd.NaT), "end": str(pd.NaT)}
+        return {"start": str(self.dates[present[0]]), "end": str(self.dates[present[-1]])}
+
+    def sku_values(self, mask):
+        """SKUs das células na ordem em que aparecem no histórico (como unique())."""
+        codes = pd.unique(self.pair_sku[mask[self.pair_cell]])
+        return self.skus[codes].tolist()
+
+    def sku_count(self, mask):
+        """Número de SKUs distintos (sem nulos, como nunique())."""
+        codes = np.unique(self.pair_sku[mask[self.pair_cell]])
+        return int((~pd.isna(self.skus[codes])).sum())
+
+    def _ordered_cells(self, mask):
+        cells = np.flatnonzero(mask & (self.cell_rows > 0))
+        return cells[np.argsort(self.cell_first[cells], kind="stable")]
+
+    def familia_values(self, mask):
+        """Famílias das células na ordem em que aparecem no histórico."""
+        cells = self._ordered_cells(mask)
+        codes = pd.unique(cells // (len(self.processos) * self.N_MASKS))
+        return self.familias[codes].tolist()
+
+    def processo_values(self, mask):
+        """Processos das células na ordem em que aparecem no histórico."""
+        cells = self._ordered_cells(mask)
+        codes = pd.unique((cells // self.N_MASKS) % len(self.processos))
+        return self.processos[codes].tolist()
@@ -0,0 +1,176 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from app.models.feature_metadata import FeatureMetadata
+from app.utils.exogenous import month_index
+
+# Tabelas de features já lidas, por (table_name, version): um novo upload
+# incrementa a versão no FeatureMetadata, o que invalida a entrada antiga
+_cache_lock = threading.Lock()
+_table_cache = {}
+
+
+def invalidate_feature_cache(table_name=None):
+    """Descarta as tabelas em cache (todas ou só as versões de `table_name`)."""
+    with _cache_lock:
+        for key in list(_table_cache):
+            if table_name is None or key[0] == table_name:
+                del _table_cache[key]
+
+
+def load_feature_table(db, feature):
+    """
+    Lê (uma vez por versão) a tabela de uma feature customizada.
+
+    Returns:
+        Dict com 'feature_name', 'columns' (colunas numéricas), 'dates'
+        (datetime64 ordenado), 'values' (arrays alinhados a 'dates'),
+        'months' (month_index distintos, ordenados) e 'monthly' (matriz
+        meses x colunas com a média de cada mês)
+    """
+    key = (feature.table_name, feature.version)
+    with _cache_lock:
+        table = _table_cache.get(key)
+    if table is not None:
+        return table
+
+    feature_df = pd.read_sql(text(f"SELECT * FROM {feature.table_name}"), db.bind)
+    dates = pd.to_datetime(feature_df['date'])
+    valid = dates.notna().to_numpy()
+    order = np.argsort(dates.to_numpy()[valid], kind='stable')
+
+    # Colunas não numéricas nunca entram no modelo (a média mensal falharia)
+    columns = [
+        col for col in feature_df.columns
+        if col != 'date' and pd.api.types.is_numeric_dtype(feature_df[col])
+    ]
+    values = feature_df.loc[valid, columns].to_numpy(dtype=float)[order]
+    sorted_dates = dates.to_numpy()[valid][order]
+
+    monthly = pd.DataFrame(values, columns=columns).groupby(month_index(sorted_dates)).mean()
+
+    table = {
+        'feature_name': feature.feature_name,
+        'columns': columns,
+        'dates': sorted_dates,
+        'values': {col: values[:, j] for j, col in enumerate(columns)},
+        'months': monthly.index.to_numpy(dtype=np.int64),
+        'monthly': monthly.to_numpy(dtype=float),
+    }
+
+    with _cache_lock:
+        # Mantém só a versão atual de cada tabela
+        for old_key in [k for k in _table_cache if k[0] == feature.table_name]:
+            del _table_cache[old_key]
+        _table_cache[key] = table
+    return table
+
+
+class CustomFeatureIndex:
+    """
+    Índice as-of em memória das tabelas de features customizadas.
+
+    Cada tabela registrada em FeatureMetadata é lida uma única vez por versão
+    (ver load_feature_table) e mantida ordenada por data; o valor de uma
+    feature numa data é o do último registro com `date <= data` (o mesmo que
+    `ORDER BY date DESC LIMIT 1`), obtido com `searchsorted` para todas as
+    datas do horizonte de uma vez.
+    """
+
+    def __init__(self, tables):
+        """
+        Args:
+            tables: Lista de dicts com 'feature_name', 'columns' (colunas do
+                metadata), 'dates' (datetime64 ordenado ou None se a leitura
+                falhou) e 'values' (dict coluna -> array alinhado a 'dates')
+        """
+        self.tables = tables
+
+    @classmethod
+    def load(cls, db):
+        """Monta o índice com as tabelas registradas (lidas do cache por versão)."""
+        tables = []
+
+        for feature in db.query(FeatureMetadata).all():
+            try:
+                tables.append(load_feature_table(db, feature))
+            except Exception as e:
+                print(f"⚠️ Erro ao carregar feature '{feature.feature_name}': {str(e)}")
+                tables.append({
+                    'feature_name': feature.feature_name,
+                    'columns': [col for col in (feature.columns or []) if col != 'date'],
+                    'dates': None,
+                    'values': {},
+                })
+
+        return cls(tables)
+
+    @property
+    def columns(self):
+        """Nomes das colunas geradas ('<feature>_<coluna>')."""
+        return [
+            f"{table['feature_name']}_{col}" for table in self.tables for col in table['columns']
+        ]
+
+    def monthly_block(self, dates):
+        """
+        Média mensal de todas as features para cada data, num único DataFrame.
+
+        Meses sem registro ficam NaN (o chamador decide como preencher).
+        """
+        months = month_index(dates)
+        blocks = []
+
+        for table in self.tables:
+            if table['dates'] is None:
+                # Tabela que não pôde ser lida não gera colunas
+                continue
+            names = [f"{table['feature_name']}_{col}" for col in table['columns']]
+            block = np.full((len(months), len(names)), np.nan)
+            if len(table['months']):
+                positions = np.searchsorted(table['months'], months)
+                positions = np.minimum(positions, len(table['months']) - 1)
+                found = table['months'][positions] == months
+                block[found] = table['monthly'][positions[found]]
+            blocks.append(pd.DataFrame(block, columns=names))
+
+        if not blocks:
+            return pd.DataFrame(index=range(len(months)))
+        return pd.concat(blocks, axis=1)
+
+    def asof(self, dates, fallback=None):
+        """
+        Valores das features nas datas pedidas.
+
+        Args:
+            dates: Array de datas (qualquer shape, ex.: n_séries x horizonte)
+            fallback: Dict coluna -> valor (escalar ou array que faça broadcast
+                com `dates`) usado quando não há registro até a data; padrão 0
+
+        Returns:
+            Dict coluna -> array com o mesmo shape de `dates`
+        """
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        fallback = fallback or {}
+        result = {}
+
+        for table in self.tables:
+            loaded = table['dates'] is not None and len(table['dates']) > 0
+            if loaded:
+                positions = np.searchsorted(table['dates'], dates, side='right') - 1
+                found = positions >= 0
+
+            for col in table['columns']:
+                name = f"{table['feature_name']}_{col}"
+                default = np.broadcast_to(fallback.get(name, 0), dates.shape).astype(float)
+                if loaded:
+                    values = table['values'][col][np.maximum(positions, 0)]
+                    result[name] = np.where(found, values, default)
+                else:
+                    # Sem registros (ou falha na leitura): último valor histórico
+                    result[name] = default
+
+        return result
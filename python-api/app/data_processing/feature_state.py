@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.trend import trailing_slope
+
+
+class BatchForecastFeatureState:
+    """
+    Estado incremental das features de várias séries para a previsão recursiva.
+
+    Guarda as últimas 12 observações de cada série numa matriz circular
+    (n_séries x 12) com somas móveis das janelas 3/6/12, de modo que cada passo
+    do horizonte custa O(1) por série: `push` registra os valores previstos de
+    todas as séries e `next_features` monta a matriz de features já na ordem
+    das colunas do treino, como float32.
+
+    Reproduz as mesmas regras do laço antigo de make_prediction (lags ausentes
+    = 0, desvio-padrão populacional, crescimento 0 quando a base é 0, etc.).
+    """
+
+    CAPACITY = 12
+    LAGS = (1, 3, 6, 12)
+    WINDOWS = (3, 6, 12)
+    FERIADOS = ('01-01', '04-21', '05-01', '09-07', '10-12', '11-02', '11-15', '12-25')
+
+    def __init__(self, histories, feature_cols):
+        """
+        Args:
+            histories: Lista com os valores históricos de cada série, em ordem
+                cronológica (as séries podem ter tamanhos diferentes)
+            feature_cols: Colunas de features na ordem usada no treino
+        """
+        self.feature_cols = list(feature_cols)
+        n_series = len(histories)
+
+        # Buffer alinhado à direita: a coluna CAPACITY-1 é o valor mais recente
+        self._buffer = np.zeros((n_series, self.CAPACITY))
+        self._count = np.zeros(n_series, dtype=np.int64)
+        self._head = 0
+
+        for i, history in enumerate(histories):
+            history = np.asarray(history, dtype=float)
+            recent = history[-self.CAPACITY:]
+            if len(recent):
+                self._buffer[i, self.CAPACITY - len(recent):] = recent
+            self._count[i] = len(history)
+
+        # Posições nunca preenchidas valem 0, então a soma cobre min(w, n) valores
+        self._sums = {w: self._buffer[:, self.CAPACITY - w:].sum(axis=1) for w in self.WINDOWS}
+
+    def __len__(self):
+        return len(self._count)
+
+    def push(self, values):
+        """Acrescenta uma observação (histórica ou prevista) a cada série."""
+        values = np.asarray(values, dtype=float)
+        for w in self.WINDOWS:
+            leaving = np.where(self._count >= w, self._last(w), 0.0)
+            self._sums[w] += values - leaving
+
+        self._buffer[:, self._head] = values
+        self._head = (self._head + 1) % self.CAPACITY
+        self._count += 1
+
+    def _last(self, k):
+        """k-ésimo valor mais recente de cada série (k=1 é o último)."""
+        return self._buffer[:, (self._head - k) % self.CAPACITY]
+
+    def _window(self, w):
+        """Últimos w slots de cada série (cronológico) e máscara dos válidos."""
+        idx = (self._head - w + np.arange(w)) % self.CAPACITY
+        sizes = np.minimum(w, self._count)
+        mask = np.arange(w) >= (w - sizes)[:, None]
+        return self._buffer[:, idx], mask, sizes
+
+    def series_features(self):
+        """Features derivadas do histórico: lags, janelas, crescimento e tendência."""
+        n = self._count
+        features = {}
+
+        for lag in self.LAGS:
+            features[f'lag_{lag}'] = np.where(n >= lag, self._last(lag), 0.0)
+
+        for w in self.WINDOWS:
+            window, mask, sizes = self._window(w)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                features[f'rolling_mean_{w}'] = np.where(sizes > 0, self._sums[w] / sizes, 0.0)
+                # Desvio-padrão populacional (np.std) só sobre os valores válidos
+                mean = np.where(mask, window, 0.0).sum(axis=1) / sizes
+                var = np.where(mask, (window - mean[:, None]) ** 2, 0.0).sum(axis=1) / sizes
+            features[f'rolling_std_{w}'] = np.where(sizes > 1, np.sqrt(var), 0.0)
+
+        lag_1 = features['lag_1']
+        for periods, k in ((1, 2), (3, 4), (6, 7)):
+            base = self._last(k)
+            valid = (n >= k) & (base != 0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                features[f'growth_rate_{periods}'] = np.where(valid, (lag_1 - base) / base, 0.0)
+
+        window_6, _, sizes_6 = self._window(6)
+        features['trend_6'] = np.where(sizes_6 >= 3, trailing_slope(window_6, sizes_6), 0.0)
+
+        return features
+
+    @classmethod
+    def calendar_features(cls, dates):
+        """Features de calendário de cada data (mesmas do enrich_features)."""
+        dates = pd.DatetimeIndex(dates)
+        month = dates.month.to_numpy()
+        quarter = (month - 1) // 3 + 1
+        feriados_mmdd = [int(f.replace('-', '')) for f in cls.FERIADOS]
+        return {
+            'year': dates.year.to_numpy(),
+            'month': month,
+            'quarter': quarter,
+            'day_of_year': dates.dayofyear.to_numpy(),
+            'week_of_year': dates.isocalendar().week.to_numpy(),
+            'month_sin': np.sin(2 * np.pi * month / 12),
+            'month_cos': np.cos(2 * np.pi * month / 12),
+            'quarter_sin': np.sin(2 * np.pi * quarter / 4),
+            'quarter_cos': np.cos(2 * np.pi * quarter / 4),
+            'is_holiday': np.isin(month * 100 + dates.day.to_numpy(), feriados_mmdd).astype(int),
+        }
+
+    def next_features(self, future_dates, exogenous=None):
+        """
+        Matriz de features do próximo período, na ordem de `feature_cols`.
+
+        Args:
+            future_dates: Data do período a prever de cada série
+            exogenous: Dict com regressores externos do período (incc, selic,
+                features customizadas); cada valor é escalar ou array por série
+
+        Returns:
+            np.ndarray float32 com shape (n_séries, len(feature_cols))
+        """
+        values = self.series_features()
+        values.update(self.calendar_features(future_dates))
+        if exogenous:
+            values.update(exogenous)
+
+        matrix = np.empty((len(self), len(self.feature_cols)), dtype=np.float32)
+        for j, col in enumerate(self.feature_cols):
+            # KeyError se faltar alguma coluna do treino, como no DataFrame antigo
+            matrix[:, j] = values[col]
+        return matrix
+
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+
+class GroupedStats:
+    """
+    Estatísticas por grupo (ex.: por SKU) calculadas de uma vez com NumPy.
+
+    Os valores são ordenados por (grupo, valor) uma única vez; cada grupo
+    ocupa um trecho contíguo [offset, offset + tamanho) e quantis/mediana
+    saem por indexação direta nesses trechos. Os resultados reproduzem
+    exatamente os de `groupby(...).transform(lambda x: x.quantile(...))`,
+    `.median()`, `.mean()` e `.std()` do pandas (mesma interpolação linear
+    do NumPy e mesma ordem de soma), para que o tratamento de outliers não
+    mude nenhum valor.
+    """
+
+    def __init__(self, keys, values):
+        """
+        Args:
+            keys: Chave do grupo de cada linha (linhas com chave nula ficam fora,
+                como no groupby)
+            values: Valores numéricos de cada linha (NaN é ignorado)
+        """
+        self.codes, uniques = pd.factorize(np.asarray(keys), use_na_sentinel=True)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.keys = uniques
+        self.n_groups = len(uniques)
+
+        grouped = self.codes >= 0
+        codes = self.codes[grouped]
+        self.sizes = np.bincount(codes, minlength=self.n_groups)
+        self.offsets = np.concatenate(([0], np.cumsum(self.sizes)[:-1])).astype(np.int64)
+
+        # Linhas de cada grupo, em trechos contíguos e na ordem original (para
+        # somas); a ordem por valor (quantis) só é calculada se for usada
+        rows = np.flatnonzero(grouped)
+        self.rows_original = rows[np.argsort(codes, kind="stable")]
+        self._rows_sorted_cache = None
+        self._sorted_values_cache = None
+
+        self.counts = np.bincount(codes, weights=~np.isnan(self.values[rows]), minlength=self.n_groups).astype(np.int64)
+        self.has_nan = self.counts < self.sizes
+
+    @property
+    def _rows_sorted(self):
+        """Linhas de cada grupo ordenadas por valor (no lexsort, NaN vai para o fim)."""
+        if self._rows_sorted_cache is None:
+            rows = self.rows_original
+            self._rows_sorted_cache = rows[np.lexsort((self.values[rows], self.codes[rows]))]
+        return self._rows_sorted_cache
+
+    @property
+    def sorted_values(self):
+        if self._sorted_values_cache is None:
+            self._sorted_values_cache = self.values[self._rows_sorted]
+        return self._sorted_values_cache
+
+    # ------------------------------------------------------------ estatísticas
+
+    @staticmethod
+    def _lerp(a, b, t):
+        """Interpolação idêntica à do np.quantile (método 'linear')."""
+        diff_b_a = b - a
+        result = a + diff_b_a * t
+        return np.where(t >= 0.5, b - diff_b_a * (1 - t), result)
+
+    def _quantile_sorted(self, sorted_values, counts, q):
+        """Quantil linear de cada grupo a partir dos valores já ordenados."""
+        # O pandas passa o quantil em porcentagem ao np.percentile (q*100/100)
+        q = np.true_divide(np.float64(q) * 100.0, 100)
+        virtual = (counts - 1) * q
+        previous = np.floor(virtual)
+        gamma = virtual - previous
+
+        previous = previous.astype(np.int64)
+        following = np.minimum(previous + 1, counts - 1)
+        previous = np.minimum(previous, counts - 1)
+
+        empty = counts == 0
+        base = np.where(empty, 0, self.offsets)
+        a = sorted_values[np.where(empty, 0, base + previous)] if len(sorted_values) else np.zeros(len(counts))
+        b = sorted_values[np.where(empty, 0, base + following)] if len(sorted_values) else np.zeros(len(counts))
+        return np.where(empty, np.nan, self._lerp(a, b, gamma))
+
+    def quantile(self, q):
+        """Quantil q de cada grupo (como Series.quantile)."""
+        return self._quantile_sorted(self.sorted_values, self.counts, q)
+
+    def _median_sorted(self, sorted_values, counts):
+        half = counts // 2
+        empty = counts == 0
+        base = np.where(empty, 0, self.offsets)
+        if not len(sorted_values):
+            return np.full(len(counts), np.nan)
+        upper = sorted_values[base + np.where(empty, 0, half)]
+        lower = sorted_values[base + np.where(empty, 0, np.maximum(half - 1, 0))]
+        median = np.where(counts % 2 == 1, upper, (lower + upper) / 2)
+        return np.where(empty, np.nan, median)
+
+    def median(self):
+        """Mediana de cada grupo (como Series.median)."""
+        return self._median_sorted(self.sorted_values, self.counts)
+
+    def mad(self, median=None):
+        """
+        Mediana dos desvios absolutos de cada grupo, como
+        np.median(np.abs(x - mediana)): NaN se o grupo tiver NaN.
+        """
+        if median is None:
+            median = self.median()
+
+        codes = self.codes[self._rows_sorted]
+        deviations = np.abs(self.sorted_values - median[codes])
+        order = np.lexsort((deviations, codes))
+        mad = self._median_sorted(deviations[order], self.sizes)
+        return np.where(self.has_nan, np.nan, mad)
+
+    def group_sums(self, values):
+        """
+        Soma de cada grupo na ordem original das linhas.
+
+        Grupos do mesmo tamanho viram as linhas de uma matriz somada com
+        sum(axis=1), que usa a mesma soma em pares do np.sum de cada grupo.
+        """
+        sums = np.zeros(self.n_groups)
+        ordered = np.asarray(values, dtype=np.float64)[self.rows_original]
+        for size in np.unique(self.sizes[self.sizes > 0]):
+            groups = np.flatnonzero(self.sizes == size)
+            index = self.offsets[groups][:, None] + np.arange(size)
+            sums[groups] = ordered[index].sum(axis=1)
+        return sums
+
+    def mean(self):
+        """Média de cada grupo (como Series.mean)."""
+        filled = np.where(np.isnan(self.values), 0.0, self.values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.counts > 0, self.group_sums(filled) / self.counts, np.nan)
+
+    def std(self, ddof=1):
+        """Desvio-padrão amostral de cada grupo (como Series.std)."""
+        missing = np.isnan(self.values)
+        filled = np.where(missing, 0.0, self.values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            avg = self.group_sums(filled) / self.counts
+            sqr = (self.broadcast(avg) - filled) ** 2
+            sqr[missing | (self.codes < 0)] = 0.0
+            d = self.counts - ddof
+            var = np.where(d > 0, self.group_sums(sqr) / d, np.nan)
+        return np.sqrt(var)
+
+    # ---------------------------------------------------------------- aplicação
+
+    def broadcast(self, per_group):
+        """Leva um valor por grupo para as linhas (NaN nas linhas sem grupo)."""
+        per_group = np.asarray(per_group, dtype=np.float64)
+        result = np.full(len(self.codes), np.nan)
+        grouped = self.codes >= 0
+        result[grouped] = per_group[self.codes[grouped]]
+        return result
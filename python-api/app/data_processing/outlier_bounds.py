@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+from app.data_processing.grouped_stats import GroupedStats
+
+
+class OutlierBounds:
+    """
+    Tabela de limites de outliers por SKU para um (método, threshold).
+
+    Guarda, por SKU, só as estatísticas que o método usa (quartis e limites
+    do IQR, mediana/MAD, média/desvio etc.). Aplicar a tabela a um DataFrame
+    é uma busca do SKU no índice seguida de clip/substituição vetorizados,
+    com o mesmo resultado do DataTransformer recalculando tudo. SKUs marcados
+    como desatualizados (ou ausentes) são recalculados sob demanda a partir
+    do histórico recebido.
+    """
+
+    COLUMNS = {
+        "iqr": ("q1", "q3", "lower", "upper"),
+        "mad": ("median", "mad", "upper"),
+        "percentile": ("lower", "upper"),
+        "zscore": ("mean", "std", "median"),
+        "winsorize": ("lower", "upper"),
+    }
+
+    def __init__(self, method, threshold, table, stale=None, version=None):
+        """
+        Args:
+            method: Método de tratamento ('iqr', 'mad', 'percentile', 'zscore', 'winsorize')
+            threshold: Threshold do método (usado por IQR e Z-Score)
+            table: DataFrame indexado por SKU com as colunas de COLUMNS[method]
+            stale: SKUs cujos limites precisam ser recalculados
+            version: Versão do dataset usada no cálculo (informativo)
+        """
+        if method not in self.COLUMNS:
+            raise ValueError(f"Método '{method}' não reconhecido. Use: {', '.join(self.COLUMNS)}")
+        self.method = method
+        self.threshold = threshold
+        self.table = table
+        self.stale = frozenset(stale or ())
+        self.version = version
+
+    def __len__(self):
+        return len(self.table)
+
+    def matches(self, method, threshold):
+        return self.method == method and self.threshold == threshold
+
+    # ----------------------------------------------------------------- cálculo
+
+    @classmethod
+    def compute(cls, df, method, threshold=1.5, version=None):
+        """Calcula os limites de todos os SKUs de `df` numa passada (GroupedStats)."""
+        stats = GroupedStats(df["SKU"], df["Quantidade"])
+        columns = {}
+
+        if method == "iqr":
+            columns["q1"] = stats.quantile(0.25)
+            columns["q3"] = stats.quantile(0.75)
+            iqr = columns["q3"] - columns["q1"]
+            columns["lower"] = np.maximum(0, columns["q1"] - threshold * iqr)
+            columns["upper"] = columns["q3"] + threshold * iqr
+        elif method == "mad":
+            columns["median"] = stats.median()
+            columns["mad"] = stats.mad(columns["median"])
+            columns["upper"] = stats.quantile(0.90)
+        elif method == "percentile":
+            columns["lower"] = stats.quantile(0.05)
+            columns["upper"] = stats.quantile(0.90)
+        elif method == "zscore":
+            columns["mean"] = stats.mean()
+            columns["std"] = stats.std()
+            columns["median"] = stats.median()
+        elif method == "winsorize":
+            columns["lower"] = stats.quantile(0.10)
+            columns["upper"] = stats.quantile(0.90)
+        else:
+            raise ValueError(f"Método '{method}' não reconhecido. Use: {', '.join(cls.COLUMNS)}")
+
+        table = pd.DataFrame(columns, index=pd.Index(stats.keys, name="SKU"))
+        return cls(method, threshold, table, version=version)
+
+    @staticmethod
+    def _normalize(skus):
+        # O SKU vindo de planilha pode ser número; no banco é texto
+        return pd.Index(skus).astype(str).str.strip()
+
+    def invalidate(self, skus):
+        """Nova tabela com `skus` marcados para recálculo (ex.: meses novos)."""
+        stale = self.stale | set(self._normalize(list(skus)))
+        return OutlierBounds(self.method, self.threshold, self.table, stale, self.version)
+
+    def refresh(self, df, version=None):
+        """
+        Garante limites atualizados para todos os SKUs de `df`: recalcula
+        apenas os desatualizados e os que ainda não estão na tabela.
+        """
+        skus = pd.Index(df["SKU"].dropna().unique())
+        is_stale = self._normalize(skus).isin(list(self.stale))
+        pending = skus[~skus.isin(self.table.index) | is_stale]
+        if len(pending) == 0:
+            return self
+
+        updated = OutlierBounds.compute(df[df["SKU"].isin(pending)], self.method, self.threshold).table
+        table = pd.concat([self.table[~self.table.index.isin(updated.index)], updated])
+
+        # SKUs desatualizados que não vieram em `df` continuam pendentes
+        stale = self.stale - set(self._normalize(pending))
+        return OutlierBounds(self.method, self.threshold, table, stale, version if version is not None else self.version)
+
+    # --------------------------------------------------------------- aplicação
+
+    def broadcast(self, df, column):
+        """Valor de `column` para cada linha de `df` (NaN para SKU ausente/nulo)."""
+        positions = self.table.index.get_indexer(df["SKU"])
+        values = self.table[column].to_numpy(dtype=np.float64)
+        result = np.full(len(df), np.nan)
+        found = positions >= 0
+        result[found] = values[positions[found]]
+        return result
+
+    def apply(self, df):
+        """
+        Quantidades tratadas de `df` segundo as regras do método.
+
+        Returns:
+            np.ndarray float64 alinhado às linhas de `df`; linhas sem SKU
+            ficam NaN (como no groupby.transform), exceto no IQR, que só
+            faz clip e ignora limites ausentes
+        """
+        values = df["Quantidade"].to_numpy(dtype=np.float64)
+        col = lambda name: self.broadcast(df, name)
+
+        if self.method == "iqr":
+            lower = pd.Series(col("lower"), index=df.index)
+            upper = pd.Series(col("upper"), index=df.index)
+            return df["Quantidade"].clip(lower=lower, upper=upper).to_numpy(dtype=np.float64)
+
+        if self.method == "mad":
+            median, mad, upper = col("median"), col("mad"), col("upper")
+            # Modified Z-Score (mais sensível que o padrão); outliers viram a mediana
+            with np.errstate(invalid="ignore", divide="ignore"):
+                modified_z = 0.6745 * (values - median) / mad
+            result = np.where((mad != 0) & (np.abs(modified_z) > 2.5), median, values)
+            # Se MAD = 0, usa percentil 90 como teto
+            result = np.where((mad == 0) & (values > upper), upper, result)
+
+        elif self.method == "percentile":
+            lower = pd.Series(col("lower"), index=df.index)
+            upper = pd.Series(col("upper"), index=df.index)
+            result = df["Quantidade"].clip(lower=lower, upper=upper).to_numpy(dtype=np.float64)
+
+        elif self.method == "zscore":
+            mean, std, median = col("mean"), col("std"), col("median")
+            # std = 0 não altera o SKU; outliers viram a mediana (mais robusto que média)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z_scores = np.abs((values - mean) / std)
+            result = np.where((std != 0) & (z_scores > self.threshold), median, values)
+
+        else:  # winsorize
+            lower, upper = col("lower"), col("upper")
+            result = np.where(values < lower, lower, values)
+            result = np.where(values > upper, upper, result)
+
+        result = np.asarray(result, dtype=np.float64).copy()
+        result[pd.isna(df["SKU"]).to_numpy()] = np.nan
+        return result
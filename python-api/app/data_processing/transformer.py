@@ -1,6 +1,8 @@
 import numpy as np
 import pandas as pd
 
+from app.data_processing.outlier_bounds import OutlierBounds
+
 
 class DataTransformer:
     """
@@ -8,18 +10,21 @@ class DataTransformer:
     Trata colunas, datas, outliers e transformações.
     """
 
-    def __init__(self, outlier_method='iqr', outlier_threshold=1.5, apply_log=False, verbose=True):
+    def __init__(self, outlier_method='iqr', outlier_threshold=1.5, apply_log=False, verbose=True, bounds=None):
         """
         Args:
             outlier_method: Método de tratamento ('iqr', 'mad', 'percentile', 'zscore', 'winsorize', 'none')
             outlier_threshold: Threshold para detecção (1.5 para IQR, 3.0 para zscore)
             apply_log: Se True, aplica transformação logarítmica
             verbose: Se True, exibe logs detalhados
+            bounds: OutlierBounds já calculado para reaproveitar (opcional); após
+                o preprocess, `self.bounds` contém a tabela usada
         """
         self.outlier_method = outlier_method
         self.outlier_threshold = outlier_threshold
         self.apply_log = apply_log
         self.verbose = verbose
+        self.bounds = bounds
         self.outlier_stats = {}
 
     def preprocess(self, df):
@@ -74,19 +79,21 @@ class DataTransformer:
 
         df = df.copy()
         
-        # Detecta se há múltiplos SKUs
+        # Detecta se há múltiplos SKUs; com limites pré-calculados (self.bounds),
+        # até um SKU único usa a tabela em vez de recalcular
         num_skus = df['SKU'].nunique()
+        group_by_sku = num_skus > 1 or self.bounds is not None
         
         if method == 'iqr':
-            df = self._remove_outliers_iqr(df, group_by_sku=(num_skus > 1))
+            df = self._remove_outliers_iqr(df, group_by_sku=group_by_sku)
         elif method == 'mad':
-            df = self._remove_outliers_mad(df, group_by_sku=(num_skus > 1))
+            df = self._remove_outliers_mad(df, group_by_sku=group_by_sku)
         elif method == 'percentile':
-            df = self._remove_outliers_percentile(df, group_by_sku=(num_skus > 1))
+            df = self._remove_outliers_percentile(df, group_by_sku=group_by_sku)
         elif method == 'zscore':
-            df = self._remove_outliers_zscore(df, group_by_sku=(num_skus > 1))
+            df = self._remove_outliers_zscore(df, group_by_sku=group_by_sku)
         elif method == 'winsorize':
-            df = self._remove_outliers_winsorize(df, group_by_sku=(num_skus > 1))
+            df = self._remove_outliers_winsorize(df, group_by_sku=group_by_sku)
         else:
             raise ValueError(f"Método '{method}' não reconhecido. Use: 'iqr', 'mad', 'percentile', 'zscore', 'winsorize'")
 
@@ -100,9 +107,10 @@ class DataTransformer:
         original_values = df["Quantidade"].copy()
         
         if group_by_sku:
-            # Múltiplos SKUs: agrupa por SKU
-            q1 = df.groupby("SKU")["Quantidade"].transform(lambda x: x.quantile(0.25))
-            q3 = df.groupby("SKU")["Quantidade"].transform(lambda x: x.quantile(0.75))
+            # Por SKU: quartis da tabela de limites
+            bounds = self._grouped_bounds(df, 'iqr')
+            q1 = pd.Series(bounds.broadcast(df, 'q1'), index=df.index)
+            q3 = pd.Series(bounds.broadcast(df, 'q3'), index=df.index)
         else:
             # SKU único: calcula direto na série
             q1 = df["Quantidade"].quantile(0.25)
@@ -148,26 +156,7 @@ class DataTransformer:
         original_values = df["Quantidade"].copy()
         
         if group_by_sku:
-            def mad_treatment(series):
-                median = series.median()
-                mad = np.median(np.abs(series - median))
-                
-                if mad == 0:
-                    # Se MAD = 0, usa percentil como fallback
-                    upper = series.quantile(0.90)
-                    return series.clip(upper=upper)
-                
-                # Modified Z-Score (mais sensível que o padrão)
-                modified_z = 0.6745 * (series - median) / mad
-                outliers_mask = np.abs(modified_z) > 2.5  # Threshold mais baixo (era 3.5)
-                
-                # Substitui outliers pela mediana
-                series_clean = series.copy()
-                series_clean[outliers_mask] = median
-                
-                return series_clean
-            
-            df["Quantidade"] = df.groupby("SKU")["Quantidade"].transform(mad_treatment)
+            df["Quantidade"] = self._grouped_bounds(df, 'mad').apply(df)
         else:
             median = df["Quantidade"].median()
             mad = np.median(np.abs(df["Quantidade"] - median))
@@ -208,12 +197,7 @@ class DataTransformer:
         original_values = df["Quantidade"].copy()
 
         if group_by_sku:
-            def percentile_cap(series):
-                lower = series.quantile(lower_percentile / 100)
-                upper = series.quantile(upper_percentile / 100)
-                return series.clip(lower=lower, upper=upper)
-            
-            df["Quantidade"] = df.groupby("SKU")["Quantidade"].transform(percentile_cap)
+            df["Quantidade"] = self._grouped_bounds(df, 'percentile').apply(df)
         else:
             lower = df["Quantidade"].quantile(lower_percentile / 100)
             upper = df["Quantidade"].quantile(upper_percentile / 100)
@@ -240,24 +224,7 @@ class DataTransformer:
         original_values = df["Quantidade"].copy()
         
         if group_by_sku:
-            def zscore_treatment(series):
-                mean = series.mean()
-                std = series.std()
-                
-                if std == 0:
-                    return series
-                
-                z_scores = np.abs((series - mean) / std)
-                outliers_mask = z_scores > self.outlier_threshold
-                
-                # Substitui outliers pela mediana (mais robusto que média)
-                median = series.median()
-                series_clean = series.copy()
-                series_clean[outliers_mask] = median
-                
-                return series_clean
-            
-            df["Quantidade"] = df.groupby("SKU")["Quantidade"].transform(zscore_treatment)
+            df["Quantidade"] = self._grouped_bounds(df, 'zscore').apply(df)
         else:
             mean = df["Quantidade"].mean()
             std = df["Quantidade"].std()
@@ -296,19 +263,7 @@ class DataTransformer:
         upper_percentile = 90  # Percentil superior
 
         if group_by_sku:
-            def winsorize_treatment(series):
-                lower = series.quantile(lower_percentile / 100)
-                upper = series.quantile(upper_percentile / 100)
-                
-                # Substitui valores abaixo do p10 pelo p10
-                # Substitui valores acima do p90 pelo p90
-                series_clean = series.copy()
-                series_clean[series < lower] = lower
-                series_clean[series > upper] = upper
-                
-                return series_clean
-            
-            df["Quantidade"] = df.groupby("SKU")["Quantidade"].transform(winsorize_treatment)
+            df["Quantidade"] = self._grouped_bounds(df, 'winsorize').apply(df)
         else:
             lower = df["Quantidade"].quantile(lower_percentile / 100)
             upper = df["Quantidade"].quantile(upper_percentile / 100)
@@ -332,6 +287,17 @@ class DataTransformer:
 
         return df
 
+    def _grouped_bounds(self, df, method):
+        """
+        Limites por SKU do método: reaproveita `self.bounds` (recalculando só
+        SKUs novos ou desatualizados) ou calcula a tabela do zero.
+        """
+        if self.bounds is not None and self.bounds.matches(method, self.outlier_threshold):
+            self.bounds = self.bounds.refresh(df)
+        else:
+            self.bounds = OutlierBounds.compute(df, method, self.outlier_threshold)
+        return self.bounds
+
     def log_transform(self, df, quantity_col="Quantidade"):
         """
         Aplica transformação logarítmica para estabilizar variância.
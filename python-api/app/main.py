@@ -4,11 +4,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config.db_config import DatabaseConfig
 from app.controllers import (
     import_controller,
+    job_controller,
     prophet_controller,
     xgboost_controller,
 )
 from app.controllers.auth_controller import router as auth_router
 from app.controllers.auth_controller import users_router
+from app.services.job_service import JobService
 
 app = FastAPI(
     title="Tigre Forecast API",
@@ -35,6 +37,7 @@ app.include_router(xgboost_controller.router)
 app.include_router(auth_router)
 app.include_router(users_router)
 app.include_router(import_controller.router)
+app.include_router(job_controller.router)
 
 
 @app.on_event("startup")
@@ -48,6 +51,17 @@ def on_startup():
     print("   - tbpontosprevisao")
     print("   - tbusuarios")
     print("   - tbmetricas")
+    print("   - tbjobs")
+
+    # Tarefas que ficaram pela metade na execução anterior não voltam a rodar
+    interrompidas = JobService.fail_interrupted()
+    if interrompidas:
+        print(f"⚠️ {interrompidas} tarefas interrompidas marcadas como 'failed'")
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    JobService.shutdown()
 
 
 @app.get("/")
@@ -73,5 +87,12 @@ async def root():
             "metrics_by_sku": "/xgboost/metrics/by-sku?sku=SKU123",
             "top_worst": "/xgboost/metrics/top-worst?limit=10",
         },
+        "jobs": {
+            "import_historical": "/jobs/import/historical-data (POST)",
+            "forecast_catalog": "/jobs/forecast/catalog (POST)",
+            "status": "/jobs/{job_id}",
+            "cancel": "/jobs/{job_id}/cancel (POST)",
+            "result": "/jobs/{job_id}/result",
+        },
         "docs": "/docs",
     }
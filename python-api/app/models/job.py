@@ -0,0 +1,39 @@
+import uuid
+from datetime import datetime
+
+from app.config.db_config import DatabaseConfig
+from sqlalchemy import JSON, Boolean, Column, DateTime, Float, String, Text
+
+
+class Job(DatabaseConfig.Base):
+    """
+    Tarefa executada em segundo plano (importação de histórico, previsão
+    do catálogo).
+
+    Tabela: tbjobs
+
+    Status: queued -> running -> completed | failed | cancelled
+    """
+
+    __tablename__ = "tbjobs"
+
+    id_job = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    ds_tipo = Column(String(50), nullable=False)
+    ds_status = Column(String(20), nullable=False, default="queued", index=True)
+
+    num_progresso = Column(Float, nullable=False, default=0.0)
+    ds_mensagem = Column(Text, nullable=True)
+
+    js_parametros = Column(JSON, nullable=True)
+    js_resultado = Column(JSON, nullable=True)
+    ds_erro = Column(Text, nullable=True)
+
+    # Pedido de cancelamento: a tarefa verifica a cada passo de progresso
+    fl_cancelar = Column(Boolean, nullable=False, default=False)
+
+    # Processo da API que executa a tarefa ("host:pid")
+    ds_dono = Column(String(255), nullable=True, index=True)
+
+    dt_criacao = Column(DateTime, nullable=False, default=datetime.utcnow)
+    dt_inicio = Column(DateTime, nullable=True)
+    dt_fim = Column(DateTime, nullable=True)
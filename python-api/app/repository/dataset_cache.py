@@ -0,0 +1,148 @@
+import threading
+
+from app.data_processing.transformer import DataTransformer
+from app.repository.query_repository import QueryRepository
+
+
+class DatasetCache:
+    """
+    Cache em processo dos DataFrames de histórico usados pelos endpoints.
+
+    Guarda o resultado bruto de cada consulta e o resultado do preprocess
+    por (consulta, parâmetros do DataTransformer), além de artefatos derivados
+    (`get_or_compute`). Uma importação de dados
+    históricos chama `invalidate()`, que incrementa a versão e descarta tudo.
+    Sempre devolve cópias, já que os serviços alteram os DataFrames.
+    """
+
+    _lock = threading.RLock()
+    _version = 0
+    _raw = {}
+    _processed = {}
+    _artifacts = {}
+    # Limites de outliers por (consulta, método, threshold): sobrevivem às
+    # invalidações, que só marcam os SKUs alterados para recálculo
+    _bounds = {}
+
+    # Consultas conhecidas: nome -> método do QueryRepository (sem argumentos)
+    QUERIES = {
+        "all_skus": "get_all_skus",
+    }
+
+    @classmethod
+    def version(cls):
+        """Versão atual do dataset (muda a cada invalidação)."""
+        return cls._version
+
+    @classmethod
+    def get_raw(cls, query="all_skus"):
+        """DataFrame bruto da consulta (vai ao banco só na primeira chamada)."""
+        with cls._lock:
+            df = cls._raw.get(query)
+            if df is None:
+                df = getattr(QueryRepository, cls.QUERIES[query])()
+                cls._raw[query] = df
+            else:
+                print(f"♻️ Dataset '{query}' servido do cache (versão {cls._version})")
+            return df.copy()
+
+    @classmethod
+    def get_preprocessed(cls, query="all_skus", outlier_method="iqr", outlier_threshold=1.5, apply_log=False):
+        """DataFrame preprocessado pelo DataTransformer com os parâmetros dados."""
+        key = (query, outlier_method, outlier_threshold, apply_log)
+
+        with cls._lock:
+            df = cls._processed.get(key)
+            if df is None:
+                bounds_key = (query, outlier_method, outlier_threshold)
+                transformer = DataTransformer(
+                    outlier_method=outlier_method,
+                    outlier_threshold=outlier_threshold,
+                    apply_log=apply_log,
+                    bounds=cls._bounds.get(bounds_key),
+                )
+                df = transformer.preprocess(cls.get_raw(query))
+                if transformer.bounds is not None:
+                    transformer.bounds.version = cls._version
+                    cls._bounds[bounds_key] = transformer.bounds
+                cls._processed[key] = df
+            return df.copy()
+
+    @classmethod
+    def get_sku_preprocessed(cls, sku, outlier_method="iqr", outlier_threshold=1.5, apply_log=False):
+        """
+        Histórico preprocessado de um único SKU, sem carregar o catálogo.
+
+        Se o catálogo já estiver preprocessado em cache, só filtra o SKU; senão
+        busca a série do SKU no banco e trata outliers com os limites já
+        calculados para ele (ou a partir da própria série, se não houver).
+        """
+        bounds_key = ("all_skus", outlier_method, outlier_threshold)
+        # Não espera o lock: se o catálogo estiver sendo carregado por outra
+        # thread, segue pela consulta do SKU (leitura de dict é atômica)
+        if cls._lock.acquire(blocking=False):
+            try:
+                df = cls._processed.get(("all_skus", outlier_method, outlier_threshold, apply_log))
+                if df is not None:
+                    return df[df["SKU"] == sku].copy()
+            finally:
+                cls._lock.release()
+        bounds = cls._bounds.get(bounds_key)
+        # Mesma verificação de get_outlier_bounds: limites desatualizados não
+        # são usados (o SKU é tratado com os limites da própria série)
+        if bounds is not None and (bounds.stale or bounds.version != cls._version):
+            bounds = None
+
+        # Fora do lock: a consulta de um SKU não deve bloquear os demais endpoints
+        df_raw = QueryRepository.get_unique_sku(sku)
+        return DataTransformer(
+            outlier_method=outlier_method,
+            outlier_threshold=outlier_threshold,
+            apply_log=apply_log,
+            bounds=bounds,
+        ).preprocess(df_raw)
+
+    @classmethod
+    def get_outlier_bounds(cls, query="all_skus", outlier_method="iqr", outlier_threshold=1.5):
+        """Tabela de limites por SKU (OutlierBounds) da versão atual do dataset."""
+        bounds_key = (query, outlier_method, outlier_threshold)
+        with cls._lock:
+            bounds = cls._bounds.get(bounds_key)
+            if bounds is None or bounds.stale or bounds.version != cls._version:
+                cls.get_preprocessed(query, outlier_method, outlier_threshold)
+                bounds = cls._bounds.get(bounds_key)
+            return bounds
+
+    @classmethod
+    def get_or_compute(cls, name, compute):
+        """
+        Artefato derivado do dataset (ex.: classificação ABC), calculado uma
+        vez por versão: `compute()` só roda se ainda não houver resultado.
+        """
+        with cls._lock:
+            artifact = cls._artifacts.get(name)
+            if artifact is None:
+                artifact = compute()
+                cls._artifacts[name] = artifact
+            return artifact.copy() if hasattr(artifact, "copy") else artifact
+
+    @classmethod
+    def invalidate(cls, changed_skus=None):
+        """
+        Descarta os DataFrames em cache (ex.: após importar dados históricos).
+
+        Args:
+            changed_skus: SKUs que receberam linhas novas/alteradas; se
+                informado, só os limites de outliers desses SKUs são recalculados
+                no próximo preprocess (senão, todos)
+        """
+        with cls._lock:
+            cls._raw.clear()
+            cls._processed.clear()
+            cls._artifacts.clear()
+            if changed_skus is None:
+                cls._bounds.clear()
+            else:
+                cls._bounds = {key: bounds.invalidate(changed_skus) for key, bounds in cls._bounds.items()}
+            cls._version += 1
+        print(f"🧹 Cache de datasets invalidado (versão {cls._version})")
@@ -0,0 +1,284 @@
+import fcntl
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from app.config.db_config import DatabaseConfig
+
+# Diretório do snapshot; sem ele, as consultas vão direto ao banco
+HISTORY_SNAPSHOT_DIR = os.getenv("HISTORY_SNAPSHOT_DIR")
+# Idade máxima (s) antes de consultar o banco por períodos novos
+HISTORY_SNAPSHOT_MAX_AGE = int(os.getenv("HISTORY_SNAPSHOT_MAX_AGE", "3600"))
+# Tempo (s) que uma versão substituída fica no disco antes de ser apagada
+HISTORY_SNAPSHOT_GRACE = int(os.getenv("HISTORY_SNAPSHOT_GRACE", "600"))
+
+
+class HistorySnapshot:
+    """
+    Snapshot colunar local da tbdadosbruto.
+
+    Cada coluna é um arquivo .npy lido com memory-map: `periodo` como
+    datetime64, `valor` como float64 e cdproduto/cdfamilia/cdprocesso como
+    códigos inteiros + array de categorias. O `meta.json` aponta para o
+    diretório da versão atual, de modo que uma atualização nunca expõe
+    arquivos pela metade para outro processo.
+
+    A atualização é incremental pelo watermark de `periodo`: só as linhas
+    com período maior que o último já salvo (ou a partir de `stale_from`,
+    marcado por importações que alteram meses antigos) vêm do banco.
+
+    Atualizações são serializadas entre processos por um lock de arquivo, e
+    cada `mark_stale` incrementa `stale_seq`: se uma importação marcar o
+    snapshot durante uma atualização, a marca é mantida na versão nova. As
+    versões substituídas só são apagadas depois de HISTORY_SNAPSHOT_GRACE
+    segundos, para leitores que já leram o meta.json antigo.
+    """
+
+    CATEGORICAL = ("cdfamilia", "cdproduto", "cdprocesso")
+    COLUMNS = ("cdfamilia", "cdproduto", "cdprocesso", "periodo", "valor")
+    META_FILE = "meta.json"
+
+    def __init__(self, directory, max_age=HISTORY_SNAPSHOT_MAX_AGE, grace=HISTORY_SNAPSHOT_GRACE):
+        self.directory = directory
+        self.max_age = max_age
+        self.grace = grace
+
+    @classmethod
+    def from_env(cls):
+        """Snapshot configurado por HISTORY_SNAPSHOT_DIR (ou None se desativado)."""
+        if not HISTORY_SNAPSHOT_DIR:
+            return None
+        return cls(HISTORY_SNAPSHOT_DIR)
+
+    # ------------------------------------------------------------------ leitura
+
+    def _read_meta(self):
+        path = os.path.join(self.directory, self.META_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        path = os.path.join(self.directory, self.META_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _file_lock(self, name):
+        """Lock exclusivo entre processos (flock) em `<diretório>/<name>.lock`."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{name}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _needs_refresh(self, meta):
+        return (
+            meta is None
+            or meta.get("version") is None
+            or meta.get("stale_from")
+            or time.time() - meta["refreshed_at"] > self.max_age
+        )
+
+    def _load_categorical(self, meta, col):
+        """Códigos (memory-map) e categorias de uma coluna categórica da versão atual."""
+        version_dir = os.path.join(self.directory, meta["version"])
+        codes = np.load(os.path.join(version_dir, f"{col}_codes.npy"), mmap_mode="r")
+        categories = np.load(os.path.join(version_dir, f"{col}_categories.npy"), allow_pickle=False)
+        return codes, categories
+
+    def _load_columns(self, meta):
+        """Lê as colunas da versão atual (memory-map) e decodifica as categorias."""
+        version_dir = os.path.join(self.directory, meta["version"])
+        data = {}
+        for col in self.COLUMNS:
+            if col in self.CATEGORICAL:
+                codes, categories = self._load_categorical(meta, col)
+                # Volta para objetos Python (str), como o read_sql devolve; -1 = nulo
+                categories = np.append(categories.astype(object), None)
+                data[col] = categories[codes]
+            else:
+                data[col] = np.load(os.path.join(version_dir, f"{col}.npy"), mmap_mode="r")
+        return data
+
+    def load(self, start=None, end=None, cdproduto=None):
+        """
+        Histórico entre `start` e `end` (inclusive), ordenado por período,
+        opcionalmente só de um produto (`cdproduto`).
+
+        Atualiza o snapshot antes, se ele não existir, estiver marcado como
+        desatualizado ou for mais velho que `max_age`.
+
+        Returns:
+            DataFrame com as colunas de tbdadosbruto usadas pela API
+        """
+        meta = self._read_meta()
+        if self._needs_refresh(meta):
+            meta = self.refresh(if_needed=True)
+
+        data = self._load_columns(meta)
+        periodo = data["periodo"]
+        mask = np.ones(len(periodo), dtype=bool)
+        if start is not None:
+            mask &= periodo >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            mask &= periodo <= np.datetime64(pd.Timestamp(end))
+        if cdproduto is not None:
+            # Compara como texto, como o `cdproduto = '...'` da consulta (12 e
+            # " 12" acham "12"); a comparação é feita nas categorias, não por linha
+            codes, categories = self._load_categorical(meta, "cdproduto")
+            matches = np.flatnonzero(np.char.strip(categories.astype(str)) == str(cdproduto).strip())
+            mask &= np.isin(codes, matches)
+
+        df = pd.DataFrame({col: np.asarray(values)[mask] for col, values in data.items()})
+        return df[list(self.COLUMNS)]
+
+    # ------------------------------------------------------------- atualização
+
+    def refresh(self, if_needed=False):
+        """
+        Busca no banco só os períodos novos (ou desatualizados) e grava nova versão.
+
+        Args:
+            if_needed: Se True e outro processo atualizou o snapshot enquanto
+                este esperava o lock, usa a versão dele
+        """
+        with self._file_lock("refresh"):
+            meta = self._read_meta()
+            if if_needed and not self._needs_refresh(meta):
+                return meta
+            return self._refresh_locked(meta)
+
+    def _refresh_locked(self, meta):
+        # Marcas feitas a partir daqui podem não estar nas linhas consultadas
+        stale_seq = 0 if meta is None else meta.get("stale_seq", 0)
+
+        if meta is None or meta.get("version") is None:
+            cutoff = None
+            existing = None
+        else:
+            # Recarrega a partir do período mais antigo alterado por importação
+            stale_from = meta.get("stale_from")
+            watermark = np.datetime64(meta["watermark"]) if meta["watermark"] else None
+            if stale_from:
+                cutoff = np.datetime64(pd.Timestamp(stale_from))
+                include_cutoff = True
+            else:
+                cutoff = watermark
+                include_cutoff = False
+
+            data = self._load_columns(meta)
+            keep = np.ones(len(data["periodo"]), dtype=bool)
+            if cutoff is not None:
+                keep = data["periodo"] < cutoff if include_cutoff else data["periodo"] <= cutoff
+            existing = pd.DataFrame({col: np.asarray(values)[keep] for col, values in data.items()})
+
+        if cutoff is None:
+            query = text("SELECT cdfamilia, cdproduto, cdprocesso, periodo, valor FROM tbdadosbruto")
+            params = {}
+        else:
+            operator = ">=" if include_cutoff else ">"
+            query = text(
+                "SELECT cdfamilia, cdproduto, cdprocesso, periodo, valor FROM tbdadosbruto "
+                f"WHERE periodo {operator} :cutoff"
+            )
+            params = {"cutoff": pd.Timestamp(cutoff).to_pydatetime()}
+
+        with DatabaseConfig.get_db_connection() as engine:
+            new_rows = pd.read_sql_query(query, engine, params=params)
+
+        df = new_rows if existing is None else pd.concat([existing, new_rows], ignore_index=True)
+        df["periodo"] = pd.to_datetime(df["periodo"])
+        df = df.sort_values("periodo", kind="stable").reset_index(drop=True)
+
+        meta = self._write_version(df, stale_seq)
+        print(
+            f"📦 Snapshot do histórico atualizado: {len(new_rows)} linhas novas do banco, "
+            f"{len(df)} no total (até {meta['watermark']})"
+        )
+        return meta
+
+    def _write_version(self, df, stale_seq=0):
+        """
+        Grava as colunas num diretório novo e troca o meta.json atomicamente.
+
+        Args:
+            stale_seq: `stale_seq` do meta lido no início da atualização; se
+                mudou até a troca, o `stale_from` atual é mantido
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        version = f"v{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        version_dir = os.path.join(self.directory, version)
+        os.makedirs(version_dir)
+
+        for col in self.COLUMNS:
+            if col in self.CATEGORICAL:
+                codes, categories = pd.factorize(df[col])
+                # Texto vira array unicode de tamanho fixo (sem pickle)
+                categories = np.asarray(categories, dtype=str if categories.dtype == object else None)
+                np.save(os.path.join(version_dir, f"{col}_codes.npy"), codes.astype(np.int32))
+                np.save(os.path.join(version_dir, f"{col}_categories.npy"), categories)
+            elif col == "periodo":
+                np.save(os.path.join(version_dir, "periodo.npy"), df[col].to_numpy(dtype="datetime64[ns]"))
+            else:
+                values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+                np.save(os.path.join(version_dir, f"{col}.npy"), values)
+
+        watermark = df["periodo"].max()
+        with self._file_lock("meta"):
+            # Relido na hora da troca: mark_stale pode ter rodado durante a consulta
+            previous = self._read_meta() or {}
+            current_seq = previous.get("stale_seq", 0)
+            retired = dict(previous.get("retired", {}))
+            if previous.get("version"):
+                retired[previous["version"]] = time.time()
+
+            meta = {
+                "version": version,
+                "rows": int(len(df)),
+                "watermark": None if pd.isna(watermark) else watermark.isoformat(),
+                "stale_from": previous.get("stale_from") if current_seq != stale_seq else None,
+                "stale_seq": current_seq,
+                "refreshed_at": time.time(),
+                "retired": retired,
+            }
+            self._purge_retired(meta)
+            self._write_meta(meta)
+
+        return meta
+
+    def _purge_retired(self, meta):
+        """
+        Apaga as versões substituídas há mais de `grace` segundos. Um leitor
+        que leu o meta.json antigo ainda encontra os arquivos até lá.
+        """
+        now = time.time()
+        for version, retired_at in list(meta["retired"].items()):
+            if version != meta["version"] and now - retired_at > self.grace:
+                shutil.rmtree(os.path.join(self.directory, version), ignore_errors=True)
+                del meta["retired"][version]
+
+    def mark_stale(self, from_periodo):
+        """Marca que os períodos a partir de `from_periodo` mudaram no banco."""
+        with self._file_lock("meta"):
+            # Sem versão ainda (primeira carga em andamento) a marca também fica
+            meta = self._read_meta() or {"version": None, "watermark": None, "refreshed_at": 0}
+
+            from_periodo = pd.Timestamp(from_periodo)
+            current = meta.get("stale_from")
+            if current is None or from_periodo < pd.Timestamp(current):
+                meta["stale_from"] = from_periodo.isoformat()
+            meta["stale_seq"] = meta.get("stale_seq", 0) + 1
+            self._write_meta(meta)
@@ -0,0 +1,187 @@
+from datetime import datetime
+
+from app.config.db_config import DatabaseConfig
+from app.models.job import Job
+
+
+class JobRepository:
+    """
+    Persistência das tarefas em segundo plano (tbjobs).
+
+    Cada operação abre e fecha a própria sessão, já que é chamada tanto
+    pelos endpoints quanto pelas threads dos workers. Os registros são
+    devolvidos como dicionários, para não depender de sessão aberta.
+    """
+
+    # Status finais: a tarefa não muda mais
+    FINISHED = ("completed", "failed", "cancelled")
+
+    # Campo do dicionário -> coluna da tabela
+    FIELDS = {
+        "job_id": "id_job",
+        "kind": "ds_tipo",
+        "status": "ds_status",
+        "progress": "num_progresso",
+        "message": "ds_mensagem",
+        "params": "js_parametros",
+        "result": "js_resultado",
+        "error": "ds_erro",
+        "cancel_requested": "fl_cancelar",
+        "owner": "ds_dono",
+        "created_at": "dt_criacao",
+        "started_at": "dt_inicio",
+        "finished_at": "dt_fim",
+    }
+
+    @classmethod
+    def _to_dict(cls, job):
+        return {field: getattr(job, column) for field, column in cls.FIELDS.items()}
+
+    @classmethod
+    def create(cls, kind, params=None, owner=None):
+        """Registra uma tarefa nova (status 'queued') do processo `owner`."""
+        with DatabaseConfig.get_db_session() as session:
+            job = Job(ds_tipo=kind, ds_status="queued", num_progresso=0.0, js_parametros=params,
+                      fl_cancelar=False, ds_dono=owner, dt_criacao=datetime.utcnow())
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return cls._to_dict(job)
+
+    @classmethod
+    def get(cls, job_id):
+        """Tarefa pelo id (ou None)."""
+        with DatabaseConfig.get_db_session() as session:
+            job = session.get(Job, job_id)
+            return cls._to_dict(job) if job else None
+
+    @classmethod
+    def list(cls, kind=None, status=None, limit=50):
+        """Tarefas mais recentes primeiro, opcionalmente filtradas."""
+        with DatabaseConfig.get_db_session() as session:
+            query = session.query(Job)
+            if kind:
+                query = query.filter(Job.ds_tipo == kind)
+            if status:
+                query = query.filter(Job.ds_status == status)
+            jobs = query.order_by(Job.dt_criacao.desc()).limit(limit).all()
+            return [cls._to_dict(job) for job in jobs]
+
+    @classmethod
+    def update(cls, job_id, **fields):
+        """Atualiza os campos informados (nomes de FIELDS) e devolve a tarefa."""
+        with DatabaseConfig.get_db_session() as session:
+            job = session.get(Job, job_id)
+            if job is None:
+                return None
+            for field, value in fields.items():
+                setattr(job, cls.FIELDS[field], value)
+            session.commit()
+            session.refresh(job)
+            return cls._to_dict(job)
+
+    @classmethod
+    def report(cls, job_id, **fields):
+        """
+        Grava campos de progresso só se a tarefa ainda estiver em execução (uma
+        tarefa encerrada por fora não é sobrescrita) e devolve a tarefa.
+        """
+        values = {getattr(Job, cls.FIELDS[field]): value for field, value in fields.items()}
+        with DatabaseConfig.get_db_session() as session:
+            if values:
+                (
+                    session.query(Job)
+                    .filter(Job.id_job == job_id, Job.ds_status == "running")
+                    .update(values, synchronize_session=False)
+                )
+                session.commit()
+            job = session.get(Job, job_id)
+            return cls._to_dict(job) if job else None
+
+    @classmethod
+    def finish(cls, job_id, status, **fields):
+        """
+        Encerra uma tarefa em execução com o status final. Devolve False se ela
+        já tinha sido encerrada por fora (ex.: marcada como interrompida).
+        """
+        values = {getattr(Job, cls.FIELDS[field]): value for field, value in fields.items()}
+        values[Job.ds_status] = status
+        values[Job.dt_fim] = datetime.utcnow()
+        with DatabaseConfig.get_db_session() as session:
+            count = (
+                session.query(Job)
+                .filter(Job.id_job == job_id, Job.ds_status == "running")
+                .update(values, synchronize_session=False)
+            )
+            session.commit()
+            return count == 1
+
+    @classmethod
+    def start(cls, job_id):
+        """
+        Passa a tarefa de 'queued' para 'running'. Devolve False se ela não
+        estava mais na fila (ex.: cancelada antes de um worker pegá-la).
+        """
+        with DatabaseConfig.get_db_session() as session:
+            count = (
+                session.query(Job)
+                .filter(Job.id_job == job_id, Job.ds_status == "queued")
+                .update({Job.ds_status: "running", Job.dt_inicio: datetime.utcnow()}, synchronize_session=False)
+            )
+            session.commit()
+            return count == 1
+
+    @classmethod
+    def request_cancel(cls, job_id):
+        """
+        Pede o cancelamento: tarefa na fila é cancelada na hora; em execução,
+        fica marcada até o próximo passo de progresso. Finalizadas não mudam.
+        """
+        with DatabaseConfig.get_db_session() as session:
+            job = session.get(Job, job_id)
+            if job is None:
+                return None
+            if job.ds_status not in cls.FINISHED:
+                job.fl_cancelar = True
+                if job.ds_status == "queued":
+                    job.ds_status = "cancelled"
+                    job.dt_fim = datetime.utcnow()
+            session.commit()
+            session.refresh(job)
+            return cls._to_dict(job)
+
+    @classmethod
+    def active_owners(cls):
+        """Donos ("host:pid") das tarefas na fila ou em execução."""
+        with DatabaseConfig.get_db_session() as session:
+            rows = (
+                session.query(Job.ds_dono)
+                .filter(Job.ds_status.in_(("queued", "running")), Job.ds_dono.isnot(None))
+                .distinct()
+                .all()
+            )
+            return [owner for (owner,) in rows]
+
+    @classmethod
+    def fail_interrupted(cls, owners):
+        """
+        Marca como 'failed' as tarefas na fila ou em execução dos processos
+        `owners`, que pararam sem terminá-las (elas não voltam a executar).
+        """
+        if not owners:
+            return 0
+        with DatabaseConfig.get_db_session() as session:
+            count = (
+                session.query(Job)
+                .filter(Job.ds_status.in_(("queued", "running")), Job.ds_dono.in_(list(owners)))
+                .update(
+                    {
+                        Job.ds_status: "failed",
+                        Job.ds_erro: "Interrompida pela reinicialização da API",
+                        Job.dt_fim: datetime.utcnow(),
+                    },
+                    synchronize_session=False,
+                )
+            )
+            session.commit()
+            return count
@@ -1,15 +1,35 @@
+from sqlalchemy import text
+
 from app.config.db_config import DatabaseConfig
+from app.repository.history_snapshot import HistorySnapshot
 
 
 class QueryRepository:
     def get_all_skus():
+        # Com HISTORY_SNAPSHOT_DIR configurado, lê do snapshot colunar local
+        snapshot = HistorySnapshot.from_env()
+        if snapshot is not None:
+            df = snapshot.load(start="2022-08-01", end="2025-07-01")
+            print(f"✅ Dados carregados do snapshot local! DataFrame tem {df.shape[0]} linhas e {df.shape[1]} colunas.")
+            return df
+
         query = "SELECT cdfamilia, cdproduto, cdprocesso, periodo, valor FROM tbdadosbruto WHERE periodo BETWEEN '2022-08-01' AND '2025-07-01' ORDER BY periodo;"
         df = DatabaseConfig.load_data_from_db(query)
         return df
 
     def get_unique_sku(sku=None):
-        query = f"SELECT cdfamilia, cdproduto, cdprocesso, periodo, valor FROM tbdadosbruto WHERE cdproduto = '{sku}' AND periodo BETWEEN '2022-08-01' AND '2025-07-01' ORDER BY periodo;"
-        df = DatabaseConfig.load_data_from_db(query)
+        # Mesmo recorte de get_all_skus, só com as linhas do SKU
+        snapshot = HistorySnapshot.from_env()
+        if snapshot is not None:
+            df = snapshot.load(start="2022-08-01", end="2025-07-01", cdproduto=sku)
+            print(f"✅ SKU {sku} carregado do snapshot local ({df.shape[0]} linhas).")
+            return df
+
+        query = text(
+            "SELECT cdfamilia, cdproduto, cdprocesso, periodo, valor FROM tbdadosbruto "
+            "WHERE cdproduto = :sku AND periodo BETWEEN '2022-08-01' AND '2025-07-01' ORDER BY periodo;"
+        )
+        df = DatabaseConfig.load_data_from_db(query, params={"sku": sku})
         return df
 
     def get_validation_data():
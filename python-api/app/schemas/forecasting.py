@@ -131,3 +131,70 @@ class ForecastRunResponse(BaseModel):
     metrics: Optional[dict] = Field(
         default=None, description="Métricas do modelo (WMAPE, MAE, RMSE, etc.)"
     )
+
+
+class BatchForecastRequest(BaseModel):
+    items: List[ForecastRequest] = Field(
+        min_length=1,
+        description="Previsões do lote (mesmos campos do /predict: agregação, filtros, modelo e períodos)",
+    )
+
+    n_jobs: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Séries treinadas em paralelo. Se None, usa todos os núcleos",
+    )
+
+    preview_rows: int = Field(
+        default=10, ge=1, le=100, description="Número de linhas para preview de cada item"
+    )
+
+
+class BatchForecastItemResponse(BaseModel):
+    status: str
+    preview: Optional[List[Any]] = None
+    aggregation_info: Optional[dict] = None
+    model_used: Optional[str] = None
+    auto_selected: bool = False
+    metrics: Optional[dict] = None
+    error: Optional[str] = Field(
+        default=None, description="Motivo da falha, se o item não pôde ser previsto"
+    )
+
+
+class BatchForecastRunResponse(BaseModel):
+    run_id: Optional[str] = Field(
+        default=None, description="Execução do lote; None se nenhum item XGBoost passou na validação"
+    )
+    status: str = Field(description="completed, partial (algum item falhou) ou failed")
+    time: float
+    results: List[BatchForecastItemResponse] = Field(
+        description="Resultado de cada item, na ordem do pedido"
+    )
+
+
+class CatalogForecastRequest(BaseModel):
+    periods: int = Field(
+        default=12, ge=1, description="Número de períodos para previsão"
+    )
+
+    training_mode: Literal["per_sku", "global"] = Field(
+        default="per_sku",
+        description="per_sku (um XGBoost por SKU) ou global (modelo compartilhado)",
+    )
+
+    pool_by: Optional[Literal["Familia", "Processo"]] = Field(
+        default=None,
+        description="No modo global, treina um modelo por Familia ou Processo",
+    )
+
+    lockstep: bool = Field(
+        default=False,
+        description="Treina todos os SKUs e prevê o horizonte de todos juntos",
+    )
+
+    n_jobs: Optional[int] = Field(
+        default=1,
+        ge=1,
+        description="Processos no modo por SKU. Se None, usa todos os núcleos",
+    )
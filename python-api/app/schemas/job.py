@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str = Field(description="Tipo da tarefa (import_historical, forecast_catalog)")
+    status: str = Field(description="queued, running, completed, failed ou cancelled")
+    progress: float = Field(description="Progresso de 0 a 1")
+    message: Optional[str] = Field(default=None, description="Último passo reportado")
+    error: Optional[str] = Field(default=None, description="Motivo da falha")
+    cancel_requested: bool = False
+    params: Optional[dict] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class JobResultResponse(BaseModel):
+    job_id: str
+    status: str
+    result: Optional[Any] = None
@@ -2,6 +2,9 @@ from typing import List, Optional, Tuple
 
 import pandas as pd
 
+from app.data_processing.aggregate_cube import AggregateCube
+from app.repository.dataset_cache import DatasetCache
+
 
 class AggregationService:
     @staticmethod
@@ -23,6 +26,25 @@ class AggregationService:
 
         return df_clean
 
+    @staticmethod
+    def build_cube(df: pd.DataFrame, df_classified: Optional[pd.DataFrame] = None) -> AggregateCube:
+        """Cubo Família × Processo × ABC × mês do histórico (ver AggregateCube)."""
+        return AggregateCube.build(AggregationService._prepare_data(df), df_classified)
+
+    @staticmethod
+    def cubo_cacheado(df_processed: pd.DataFrame, df_classified: pd.DataFrame) -> AggregateCube:
+        """Cubo do dataset atual, montado uma vez por versão."""
+        return DatasetCache.get_or_compute(
+            "cubo_agregado",
+            lambda: AggregationService.build_cube(df_processed, df_classified),
+        )
+
+    @staticmethod
+    def _get_cube(df, df_classified=None, cube=None) -> AggregateCube:
+        if cube is None or (df_classified is not None and not cube.has_abc):
+            cube = AggregationService.build_cube(df, df_classified)
+        return cube
+
     @staticmethod
     def aggregate_combined(
         df: pd.DataFrame,
@@ -30,36 +52,37 @@ class AggregationService:
         familia: Optional[List[str]] = None,
         processo: Optional[List[str]] = None,
         abc_class: Optional[List[str]] = None,
+        cube: Optional[AggregateCube] = None,
     ) -> Tuple[pd.DataFrame, dict]:
-        df_clean = AggregationService._prepare_data(df)
+        cube = AggregationService._get_cube(df, df_classified, cube)
 
-        df_filtered = df_clean.copy()
+        mask = cube.select()
         filters_applied = []
 
         if familia:
-            df_filtered = df_filtered[df_filtered["Familia"].isin(familia)]
-            if df_filtered.empty:
+            mask = cube.select(familia=familia, mask=mask)
+            if cube.n_rows(mask) == 0:
                 raise ValueError(
                     f"Família(s) '{', '.join(familia)}' não encontrada(s) nos dados"
                 )
             filters_applied.append(f"Familia={', '.join(familia)}")
             print(
-                f"🔍 Filtro aplicado: Familia = {', '.join(familia)} → {len(df_filtered)} registros"
+                f"🔍 Filtro aplicado: Familia = {', '.join(familia)} → {cube.n_rows(mask)} registros"
             )
 
         if processo:
-            df_filtered = df_filtered[df_filtered["Processo"].isin(processo)]
-            if df_filtered.empty:
+            mask = cube.select(processo=processo, mask=mask)
+            if cube.n_rows(mask) == 0:
                 raise ValueError(
                     f"Processo(s) '{', '.join(processo)}' não encontrado(s) nos dados (após filtros anteriores)"
                 )
             filters_applied.append(f"Processo={', '.join(processo)}")
             print(
-                f"🔍 Filtro aplicado: Processo = {', '.join(processo)} → {len(df_filtered)} registros"
+                f"🔍 Filtro aplicado: Processo = {', '.join(processo)} → {cube.n_rows(mask)} registros"
             )
 
         if abc_class:
-            if df_classified is None:
+            if not cube.has_abc:
                 raise ValueError(
                     "df_classified é necessário quando abc_class é especificado"
                 )
@@ -71,38 +94,31 @@ class AggregationService:
                     f"Classe(s) ABC inválida(s): '{', '.join(invalid_classes)}'. Use A, B ou C"
                 )
 
-            skus_abc = df_classified[df_classified["Classe_ABC"].isin(abc_class_upper)][
-                "SKU"
-            ].unique()
-
-            if len(skus_abc) == 0:
+            if len(cube.abc_sku_list(abc_class_upper)) == 0:
                 raise ValueError(
                     f"Nenhum SKU encontrado para classe(s) ABC '{', '.join(abc_class_upper)}'"
                 )
 
-            df_filtered = df_filtered[df_filtered["SKU"].isin(skus_abc)]
+            mask = cube.select(abc_class=abc_class_upper, mask=mask)
 
-            if df_filtered.empty:
+            if cube.n_rows(mask) == 0:
                 raise ValueError(
                     f"Nenhum dado encontrado para classe(s) ABC '{', '.join(abc_class_upper)}' (após filtros anteriores)"
                 )
 
             filters_applied.append(f"ABC={', '.join(abc_class_upper)}")
             print(
-                f"🔍 Filtro aplicado: ABC = {', '.join(abc_class_upper)} → {len(df_filtered)} registros"
+                f"🔍 Filtro aplicado: ABC = {', '.join(abc_class_upper)} → {cube.n_rows(mask)} registros"
             )
 
-        df_aggregated = df_filtered.groupby("Data")["Quantidade"].sum().reset_index()
+        df_aggregated = cube.series(mask)
 
         info = {
             "type": "combined",
             "filters": filters_applied,
-            "skus_count": df_filtered["SKU"].nunique(),
-            "total_quantity": df_filtered["Quantidade"].sum(),
-            "date_range": {
-                "start": str(df_filtered["Data"].min()),
-                "end": str(df_filtered["Data"].max()),
-            },
+            "skus_count": cube.sku_count(mask),
+            "total_quantity": cube.total(mask),
+            "date_range": cube.date_range(mask),
         }
 
         if familia:
@@ -112,41 +128,41 @@ class AggregationService:
         if abc_class:
             info["abc_class"] = abc_class
 
-        info["familias_included"] = df_filtered["Familia"].unique().tolist()
-        info["processos_included"] = df_filtered["Processo"].unique().tolist()
+        info["familias_included"] = cube.familia_values(mask)
+        info["processos_included"] = cube.processo_values(mask)
 
         return df_aggregated, info
 
     @staticmethod
     def aggregate_familia(
-        df: pd.DataFrame, familia: Optional[List[str]] = None
+        df: pd.DataFrame, familia: Optional[List[str]] = None, cube: Optional[AggregateCube] = None
     ) -> Tuple[pd.DataFrame, dict]:
-        df_clean = AggregationService._prepare_data(df)
+        cube = AggregationService._get_cube(df, cube=cube)
 
         if familia:
-            df_filtered = df_clean[df_clean["Familia"].isin(familia)].copy()
-            if df_filtered.empty:
+            mask = cube.select(familia=familia)
+            if cube.n_rows(mask) == 0:
                 raise ValueError(
                     f"Família(s) '{', '.join(familia)}' não encontrada(s) nos dados"
                 )
 
-            skus_list = df_filtered["SKU"].unique().tolist()
+            skus_list = cube.sku_values(mask)
             info = {
                 "type": "familia",
                 "familia": familia,
                 "skus_count": len(skus_list),
-                "processos": df_filtered["Processo"].unique().tolist(),
+                "processos": cube.processo_values(mask),
                 "skus": skus_list[:10],
             }
         else:
-            df_filtered = df_clean.copy()
+            mask = cube.select()
             info = {
                 "type": "all_familias",
-                "familias": df_clean["Familia"].unique().tolist(),
-                "skus_count": df_clean["SKU"].nunique(),
+                "familias": cube.familia_values(mask),
+                "skus_count": cube.sku_count(mask),
             }
 
-        df_aggregated = df_filtered.groupby("Data")["Quantidade"].sum().reset_index()
+        df_aggregated = cube.series(mask)
 
         print(
             f"📊 Agregação concluída: {len(df_aggregated)} períodos, {info['skus_count']} SKUs"
@@ -156,34 +172,34 @@ class AggregationService:
 
     @staticmethod
     def aggregate_by_processo(
-        df: pd.DataFrame, processo: Optional[List[str]] = None
+        df: pd.DataFrame, processo: Optional[List[str]] = None, cube: Optional[AggregateCube] = None
     ) -> Tuple[pd.DataFrame, dict]:
-        df_clean = AggregationService._prepare_data(df)
+        cube = AggregationService._get_cube(df, cube=cube)
 
         if processo:
-            df_filtered = df_clean[df_clean["Processo"].isin(processo)].copy()
-            if df_filtered.empty:
+            mask = cube.select(processo=processo)
+            if cube.n_rows(mask) == 0:
                 raise ValueError(
                     f"Processo(s) '{', '.join(processo)}' não encontrado(s) nos dados"
                 )
 
-            skus_list = df_filtered["SKU"].unique().tolist()
+            skus_list = cube.sku_values(mask)
             info = {
                 "type": "processo",
                 "processo": processo,
                 "skus_count": len(skus_list),
-                "familias": df_filtered["Familia"].unique().tolist(),
+                "familias": cube.familia_values(mask),
                 "skus": skus_list[:10],
             }
         else:
-            df_filtered = df_clean.copy()
+            mask = cube.select()
             info = {
                 "type": "all_processos",
-                "processos": df_clean["Processo"].unique().tolist(),
-                "skus_count": df_clean["SKU"].nunique(),
+                "processos": cube.processo_values(mask),
+                "skus_count": cube.sku_count(mask),
             }
 
-        df_aggregated = df_filtered.groupby("Data")["Quantidade"].sum().reset_index()
+        df_aggregated = cube.series(mask)
 
         print(
             f"📊 Agregação concluída: {len(df_aggregated)} períodos, {info['skus_count']} SKUs"
@@ -193,7 +209,7 @@ class AggregationService:
 
     @staticmethod
     def aggregate_by_abc(
-        df: pd.DataFrame, df_classified: pd.DataFrame, abc_class: List[str]
+        df: pd.DataFrame, df_classified: pd.DataFrame, abc_class: List[str], cube: Optional[AggregateCube] = None
     ) -> Tuple[pd.DataFrame, dict]:
         abc_class_upper = [c.upper().strip() for c in abc_class]
         invalid_classes = [c for c in abc_class_upper if c not in ["A", "B", "C"]]
@@ -202,32 +218,30 @@ class AggregationService:
                 f"Classe(s) ABC inválida(s): '{', '.join(invalid_classes)}'. Use A, B ou C"
             )
 
-        df_clean = AggregationService._prepare_data(df)
+        cube = AggregationService._get_cube(df, df_classified, cube)
 
-        skus_abc = df_classified[df_classified["Classe_ABC"].isin(abc_class_upper)][
-            "SKU"
-        ].unique()
+        skus_abc = cube.abc_sku_list(abc_class_upper)
 
         if len(skus_abc) == 0:
             raise ValueError(
                 f"Nenhum SKU encontrado para classe(s) ABC '{', '.join(abc_class_upper)}'"
             )
 
-        df_filtered = df_clean[df_clean["SKU"].isin(skus_abc)].copy()
+        mask = cube.select(abc_class=abc_class_upper)
 
-        if df_filtered.empty:
+        if cube.n_rows(mask) == 0:
             raise ValueError(
                 f"Nenhum dado encontrado para classe(s) ABC '{', '.join(abc_class_upper)}'"
             )
 
-        df_aggregated = df_filtered.groupby("Data")["Quantidade"].sum().reset_index()
+        df_aggregated = cube.series(mask)
 
         info = {
             "type": "abc",
             "abc_class": abc_class_upper,
             "skus_count": len(skus_abc),
-            "familias": df_filtered["Familia"].unique().tolist(),
-            "processos": df_filtered["Processo"].unique().tolist(),
+            "familias": cube.familia_values(mask),
+            "processos": cube.processo_values(mask),
             "skus": skus_abc.tolist()[:10],
         }
 
@@ -238,17 +252,18 @@ class AggregationService:
         return df_aggregated, info
 
     @staticmethod
-    def aggregate_all(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
-        df_clean = AggregationService._prepare_data(df)
+    def aggregate_all(df: pd.DataFrame, cube: Optional[AggregateCube] = None) -> Tuple[pd.DataFrame, dict]:
+        cube = AggregationService._get_cube(df, cube=cube)
+        mask = cube.select()
 
-        df_aggregated = df_clean.groupby("Data")["Quantidade"].sum().reset_index()
+        df_aggregated = cube.series(mask)
 
         info = {
             "type": "all",
-            "skus_count": df_clean["SKU"].nunique(),
-            "familias": df_clean["Familia"].unique().tolist(),
-            "processos": df_clean["Processo"].unique().tolist(),
-            "total_quantity": df_clean["Quantidade"].sum(),
+            "skus_count": cube.sku_count(mask),
+            "familias": cube.familia_values(mask),
+            "processos": cube.processo_values(mask),
+            "total_quantity": cube.total(mask),
         }
 
         print(
@@ -1,5 +1,9 @@
+import numpy as np
 import pandas as pd
 
+from app.repository.dataset_cache import DatasetCache
+from app.services.routing_index import SkuRoutingIndex
+
 
 class ClassificationService:
     def somar_quantidade_por_segmento(df):
@@ -13,31 +17,45 @@ class ClassificationService:
         return soma_segmentada
 
     def classificar_abc_segmentado(df_segmentado):
-        resultados = []
-
-        def classificar(percentual):
-            if percentual <= 0.8:
-                return "A"
-            elif percentual <= 0.95:
-                return "B"
-            else:
-                return "C"
-
-        for (familia, processo), grupo in df_segmentado.groupby(
-            ["Familia", "Processo"]
-        ):
-            grupo = grupo.sort_values(by="Quantidade_Total", ascending=False)
-            total_geral = grupo["Quantidade_Total"].sum()
-
-            grupo["Percentual_Acumulado"] = (
-                grupo["Quantidade_Total"].cumsum() / total_geral
-            )
-            grupo["Classe_ABC"] = grupo["Percentual_Acumulado"].apply(classificar)
+        # Ordena cada segmento (Familia, Processo) pela quantidade decrescente
+        # e classifica todos os segmentos de uma vez, sem laço por grupo.
+        df_classificado = df_segmentado.dropna(subset=["Familia", "Processo"])
+        df_classificado = df_classificado.sort_values(
+            by=["Familia", "Processo", "Quantidade_Total"],
+            ascending=[True, True, False],
+            kind="mergesort",
+        ).reset_index(drop=True)
+
+        grupos = df_classificado.groupby(["Familia", "Processo"], sort=False)["Quantidade_Total"]
+        df_classificado["Percentual_Acumulado"] = grupos.cumsum() / grupos.transform("sum")
+
+        percentual = df_classificado["Percentual_Acumulado"].to_numpy()
+        df_classificado["Classe_ABC"] = np.select(
+            [percentual <= 0.8, percentual <= 0.95], ["A", "B"], default="C"
+        )
 
-            grupo["Familia"] = familia
-            grupo["Processo"] = processo
+        return df_classificado
 
-            resultados.append(grupo)
+    def classificar_abc_cacheado(df_processed=None):
+        """
+        Classificação ABC do dataset atual, calculada uma vez por versão.
+        Sem `df_processed`, o catálogo preprocessado só é carregado se a
+        classificação ainda não estiver em cache.
+        """
+        return DatasetCache.get_or_compute(
+            "classificacao_abc",
+            lambda: ClassificationService.classificar_abc_segmentado(
+                ClassificationService.somar_quantidade_por_segmento(
+                    df_processed if df_processed is not None else DatasetCache.get_preprocessed()
+                )
+            ),
+        )
 
-        df_classificado = pd.concat(resultados).reset_index(drop=True)
-        return df_classificado
+    def indice_roteamento_cacheado(df_processed=None):
+        """Índice SKU -> (classe ABC, cluster) do dataset atual, uma vez por versão."""
+        return DatasetCache.get_or_compute(
+            "indice_roteamento",
+            lambda: SkuRoutingIndex.from_classified(
+                ClassificationService.classificar_abc_cacheado(df_processed)
+            ),
+        )
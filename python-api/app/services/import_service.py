@@ -1,29 +1,171 @@
+import os
+from decimal import Decimal
+import numpy as np
 import pandas as pd
 import io
-from sqlalchemy import create_engine, text
+from openpyxl import load_workbook
+from sqlalchemy import bindparam, create_engine, inspect, text
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.models.feature_metadata import FeatureMetadata
+from app.data_processing.feature_index import invalidate_feature_cache
+from app.repository.dataset_cache import DatasetCache
+from app.repository.history_snapshot import HistorySnapshot
 from app.config.db_config import DatabaseConfig
 from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+# Linhas lidas por lote na importação em streaming
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "50000"))
+# Acima deste número de produtos, a busca dos existentes usa tabela temporária
+IMPORT_IN_LIMIT = int(os.getenv("IMPORT_IN_LIMIT", "1000"))
 
 class ImportService:
     def __init__(self, db: Session):
         self.db = db
         self.engine: Engine = DatabaseConfig.get_engine()
 
-    # Adicione este método na classe ImportService (import_service.py)
-
-    async def processar_dados_historicos(self, file, file_extension: str):
+    async def processar_dados_historicos(self, file, file_extension: str, streaming: bool = False):
         """
         Processa e importa dados históricos de vendas.
         Aceita tanto formato wide (colunas de datas) quanto formato long (normalizado).
+
+        Com `streaming=True` o arquivo é lido e gravado em lotes de
+        IMPORT_CHUNK_ROWS linhas (ver _processar_historico_em_lotes).
+        O trabalho de pandas/banco roda no threadpool, sem travar o event loop.
         """
+        if streaming:
+            return await run_in_threadpool(self._processar_historico_em_lotes, file, file_extension)
+
         df = await self._read_file_raw(file, file_extension)
+        return await run_in_threadpool(self._importar_historico, df)
 
+    def _importar_historico(self, df: pd.DataFrame):
+        """Importa a planilha inteira já lida (parte síncrona de processar_dados_historicos)."""
         formato = self._detectar_formato_planilha(df)
+        df = self._preparar_historico(df, formato)
+
+        if df.empty:
+            raise ValueError("Nenhum dado válido encontrado no arquivo")
+
+        new_records, update_records, skipped = self._importar_lote_historico(df)
+        inserted = len(new_records)
+        updated = len(update_records)
+
+        # Histórico mudou: os endpoints voltam a carregar do banco
+        if inserted or updated:
+            changed_skus = pd.concat([new_records['cdproduto'], update_records.get('cdproduto', pd.Series(dtype=object))])
+            changed = pd.concat([new_records['periodo'], update_records.get('periodo', pd.Series(dtype='datetime64[ns]'))])
+            self._invalidar_caches_historico(changed_skus.unique(), changed.min())
+
+        # 11. Estatísticas
+        produtos_unicos = df['cdproduto'].nunique()
+        periodo_min = df['periodo'].min()
+        periodo_max = df['periodo'].max()
         
+        return {
+            "message": "Dados históricos importados com sucesso",
+            "formato_detectado": formato,
+            "inserted": inserted,
+            "updated": updated,
+            "skipped": skipped,  # Registros que já existiam e não mudaram
+            "total_rows": len(df),
+            "unique_products": produtos_unicos,
+            "date_range": {
+                "start": str(periodo_min.date()) if hasattr(periodo_min, 'date') else str(periodo_min)[:10],
+                "end": str(periodo_max.date()) if hasattr(periodo_max, 'date') else str(periodo_max)[:10]
+            },
+            "summary": {
+                "new_products": new_records['cdproduto'].nunique() if not new_records.empty else 0,
+                "updated_products": update_records['cdproduto'].nunique() if not update_records.empty else 0
+            }
+        }
+
+    def _processar_historico_em_lotes(self, file, file_extension: str, chunk_rows: int = None, progresso=None):
+        """
+        Importação em streaming: cada lote do arquivo é normalizado,
+        comparado com o banco (só no escopo do lote) e gravado antes de ler
+        o próximo, então a memória depende do tamanho do lote e não do
+        arquivo. O formato é detectado pelos cabeçalhos do primeiro lote.
+
+        Um registro repetido em lotes diferentes é gravado uma vez e
+        atualizado/ignorado nos seguintes, já que o lote seguinte o encontra
+        no banco.
+
+        Args:
+            progresso: Callback chamado após cada lote com (lotes, linhas
+                importadas); uma exceção nele interrompe a importação (os
+                lotes já gravados permanecem)
+        """
+        chunk_rows = chunk_rows or IMPORT_CHUNK_ROWS
+        formato = None
+        lotes = 0
+        inserted = updated = skipped = total_rows = 0
+        produtos, produtos_novos, produtos_atualizados, changed_skus = set(), set(), set(), set()
+        periodo_min = periodo_max = alterado_min = None
+
+        try:
+            for chunk in self._iter_file_chunks(file, file_extension, chunk_rows):
+                if formato is None:
+                    formato = self._detectar_formato_planilha(chunk)
+                df = self._preparar_historico(chunk, formato)
+                lotes += 1
+                if df.empty:
+                    continue
+
+                new_records, update_records, lote_skipped = self._importar_lote_historico(df)
+                inserted += len(new_records)
+                updated += len(update_records)
+                skipped += lote_skipped
+                total_rows += len(df)
+
+                produtos.update(df['cdproduto'].dropna().unique())
+                lote_min, lote_max = df['periodo'].min(), df['periodo'].max()
+                periodo_min = lote_min if periodo_min is None else min(periodo_min, lote_min)
+                periodo_max = lote_max if periodo_max is None else max(periodo_max, lote_max)
+
+                for records, vistos in ((new_records, produtos_novos), (update_records, produtos_atualizados)):
+                    if records.empty:
+                        continue
+                    vistos.update(records['cdproduto'].dropna().unique())
+                    changed_skus.update(records['cdproduto'].unique())
+                    menor = records['periodo'].min()
+                    alterado_min = menor if alterado_min is None else min(alterado_min, menor)
+
+                print(f"📦 Lote {lotes}: {len(df)} linhas ({len(new_records)} novas, {len(update_records)} alteradas)")
+                if progresso:
+                    progresso(lotes, total_rows)
+        finally:
+            # Invalida os caches uma vez só, com tudo o que mudou nos lotes
+            # (inclusive se a importação parou no meio)
+            if inserted or updated:
+                self._invalidar_caches_historico(list(changed_skus), alterado_min)
+
+        if total_rows == 0:
+            raise ValueError("Nenhum dado válido encontrado no arquivo")
+
+        return {
+            "message": "Dados históricos importados com sucesso",
+            "formato_detectado": formato,
+            "inserted": inserted,
+            "updated": updated,
+            "skipped": skipped,
+            "total_rows": total_rows,
+            "unique_products": len(produtos),
+            "date_range": {
+                "start": str(periodo_min.date()),
+                "end": str(periodo_max.date())
+            },
+            "summary": {
+                "new_products": len(produtos_novos),
+                "updated_products": len(produtos_atualizados)
+            },
+            "chunks": lotes
+        }
+
+    def _preparar_historico(self, df: pd.DataFrame, formato: str) -> pd.DataFrame:
+        """Leva a planilha (ou um lote dela) ao formato de tbdadosbruto, sem linhas inválidas."""
         if formato == 'wide':
             df = self._transformar_wide_to_long(df)
         elif formato == 'long':
@@ -43,46 +185,29 @@ class ImportService:
         # Remove linhas com valores inválidos
         df = df.dropna(subset=['periodo', 'cdproduto', 'valor'])
         
-        if df.empty:
-            raise ValueError("Nenhum dado válido encontrado no arquivo")
-        
         # 5. Renomeia cdlinha para cdfamilia (padrão do banco)
         df = df.rename(columns={'cdlinha': 'cdfamilia'})
         
         # 6. Seleciona apenas as colunas necessárias
-        df = df[['periodo', 'cdproduto', 'cdfamilia', 'cdprocesso', 'valor']]
-        
-        # 7. Busca dados existentes para fazer merge inteligente (AGORA COM VALOR)
-        existing_query = text("""
-            SELECT periodo, cdproduto, cdfamilia, cdprocesso, valor 
-            FROM tbdadosbruto
-        """)
-        existing_df = pd.read_sql(existing_query, self.engine)
-        existing_df['periodo'] = pd.to_datetime(existing_df['periodo'])
-        
-        # Substitua as linhas 64-96 por:
-        merge_cols = ['periodo', 'cdproduto', 'cdfamilia', 'cdprocesso']
+        return df[['periodo', 'cdproduto', 'cdfamilia', 'cdprocesso', 'valor']]
+
+    def _importar_lote_historico(self, df: pd.DataFrame):
+        """
+        Compara `df` com o banco e grava o que é novo ou mudou.
+
+        Returns:
+            (new_records, update_records, skipped)
+        """
+        # 7. Busca só os registros existentes que podem casar com a planilha
+        # (mesmo intervalo de períodos e mesmos produtos), com o valor atual
+        existing_df = self._buscar_existentes(df)
 
         # Cria cópias para não afetar os DataFrames originais
         df_compare = df.copy()
         existing_compare = existing_df.copy()
 
-        # Normaliza tipos para comparação
-        df_compare['cdproduto'] = df_compare['cdproduto'].astype(str).str.strip()
-        df_compare['cdfamilia'] = df_compare['cdfamilia'].astype(str).str.strip()
-        df_compare['cdprocesso'] = df_compare['cdprocesso'].astype(str).str.strip()
-        df_compare['periodo_str'] = pd.to_datetime(df_compare['periodo']).dt.strftime('%Y-%m-%d')
-
-        existing_compare['cdproduto'] = existing_compare['cdproduto'].astype(str).str.strip()
-        existing_compare['cdfamilia'] = existing_compare['cdfamilia'].astype(str).str.strip()
-        existing_compare['cdprocesso'] = existing_compare['cdprocesso'].astype(str).str.strip()
-        existing_compare['periodo_str'] = pd.to_datetime(existing_compare['periodo']).dt.strftime('%Y-%m-%d')
-        
-
-        # Cria chave única para comparação
-        merge_cols_compare = ['periodo_str', 'cdproduto', 'cdfamilia', 'cdprocesso']
-        df_compare['_key'] = df_compare[merge_cols_compare].agg('|'.join, axis=1)
-        existing_compare['_key'] = existing_compare[merge_cols_compare].agg('|'.join, axis=1)
+        # Chave (dia, produto, família, processo) empacotada num int64
+        df_compare['_key'], existing_compare['_key'] = self._chaves_historico(df_compare, existing_compare)
 
         # Separa registros novos (chave não existe no banco)
         new_keys = df_compare[~df_compare['_key'].isin(existing_compare['_key'])].index
@@ -112,66 +237,203 @@ class ImportService:
         else:
             update_records = pd.DataFrame()
         
-        # 9. Insere novos registros
-        inserted = 0
-        updated = 0
+        # 9/10. Insere novos registros e atualiza os que mudaram, em lote
         skipped = len(df) - len(new_records) - len(update_records)
         
-        if not new_records.empty:
-            try:
-                with self.engine.begin() as conn:
-                    new_records.to_sql('tbdadosbruto', con=conn, if_exists='append', index=False)
-                    inserted = len(new_records)
-            except Exception as e:
-                raise RuntimeError(f"Erro ao inserir novos registros: {e}")
-        
-        # 10. Atualiza registros existentes (apenas os que mudaram)
-        if not update_records.empty:
+        if not new_records.empty or not update_records.empty:
+            self._aplicar_upsert_historico(new_records, update_records)
+
+        return new_records, update_records, skipped
+
+    @staticmethod
+    def _invalidar_caches_historico(changed_skus, alterado_desde):
+        """Histórico mudou: os endpoints voltam a carregar do banco."""
+        DatasetCache.invalidate(changed_skus=changed_skus)
+        snapshot = HistorySnapshot.from_env()
+        if snapshot is not None:
+            snapshot.mark_stale(alterado_desde)
+
+    def _buscar_existentes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Registros de tbdadosbruto no intervalo de dias e no conjunto de
+        produtos da planilha: só eles podem ter a mesma chave, então o custo
+        acompanha o tamanho do arquivo e não o histórico inteiro.
+
+        A coluna cdproduto é comparada sem funções em volta (o índice pode ser
+        usado); acima de IMPORT_IN_LIMIT produtos, os códigos vão para uma
+        tabela temporária e a busca vira um JOIN em vez de um IN gigante.
+        """
+        inicio = df['periodo'].min().normalize()
+        fim = df['periodo'].max().normalize() + pd.Timedelta(days=1)
+        produtos = self._codigos_produto(df)
+        params = {'inicio': inicio.to_pydatetime(), 'fim': fim.to_pydatetime()}
+
+        if len(produtos) <= IMPORT_IN_LIMIT:
+            existing_query = text("""
+                SELECT periodo, cdproduto, cdfamilia, cdprocesso, valor 
+                FROM tbdadosbruto
+                WHERE periodo >= :inicio AND periodo < :fim
+                AND cdproduto IN :produtos
+            """).bindparams(bindparam('produtos', expanding=True))
+            existing_df = pd.read_sql(existing_query, self.engine, params={**params, 'produtos': produtos})
+        else:
+            with self.engine.begin() as conn:
+                postgres = conn.dialect.name == 'postgresql'
+                conn.execute(text(
+                    f"CREATE TEMP TABLE {self.PRODUTOS_TABLE} "
+                    f"{'ON COMMIT DROP ' if postgres else ''}AS "
+                    f"SELECT cdproduto FROM tbdadosbruto WHERE 1 = 0"
+                ))
+                self._copy_para_staging(conn, pd.DataFrame({'cdproduto': produtos}), postgres, self.PRODUTOS_TABLE)
+                existing_df = pd.read_sql(text(f"""
+                    SELECT t.periodo, t.cdproduto, t.cdfamilia, t.cdprocesso, t.valor
+                    FROM tbdadosbruto t
+                    JOIN {self.PRODUTOS_TABLE} p ON t.cdproduto = p.cdproduto
+                    WHERE t.periodo >= :inicio AND t.periodo < :fim
+                """), conn, params=params)
+                if not postgres:
+                    conn.execute(text(f"DROP TABLE {self.PRODUTOS_TABLE}"))
+
+        existing_df['periodo'] = pd.to_datetime(existing_df['periodo'])
+        print(f"🔎 {len(existing_df)} registros existentes no escopo da planilha ({len(produtos)} produtos)")
+        return existing_df
+
+    PRODUTOS_TABLE = 'tmp_produtos_import'
+    # Tipo de tbdadosbruto.cdproduto (True = numérico), lido uma vez do banco
+    _cdproduto_numerico = None
+
+    def _codigos_produto(self, df: pd.DataFrame) -> list:
+        """
+        Códigos de produto da planilha no tipo da coluna cdproduto. Em coluna
+        texto vão o valor como veio e sem espaços (o banco guarda o que as
+        importações gravaram); em coluna numérica, o inteiro.
+        """
+        if ImportService._cdproduto_numerico is None:
+            coluna = next(col for col in inspect(self.engine).get_columns('tbdadosbruto') if col['name'] == 'cdproduto')
             try:
-                with self.engine.begin() as conn:
-                    for _, row in update_records.iterrows():
-                        update_query = text("""
-                            UPDATE tbdadosbruto 
-                            SET valor = :valor
-                            WHERE periodo = :periodo 
-                            AND cdproduto = :cdproduto 
-                            AND cdfamilia = :cdfamilia 
-                            AND cdprocesso = :cdprocesso
-                        """)
-                        conn.execute(update_query, {
-                            'valor': row['valor'],
-                            'periodo': row['periodo'],
-                            'cdproduto': row['cdproduto'],
-                            'cdfamilia': row['cdfamilia'],
-                            'cdprocesso': row['cdprocesso']
-                        })
-                    updated = len(update_records)
-            except Exception as e:
-                raise RuntimeError(f"Erro ao atualizar registros: {e}")
-        
-        # 11. Estatísticas
-        produtos_unicos = df['cdproduto'].nunique()
-        periodo_min = df['periodo'].min()
-        periodo_max = df['periodo'].max()
-        
-        return {
-            "message": "Dados históricos importados com sucesso",
-            "formato_detectado": formato,
-            "inserted": inserted,
-            "updated": updated,
-            "skipped": skipped,  # Registros que já existiam e não mudaram
-            "total_rows": len(df),
-            "unique_products": produtos_unicos,
-            "date_range": {
-                "start": str(periodo_min.date()) if hasattr(periodo_min, 'date') else str(periodo_min)[:10],
-                "end": str(periodo_max.date()) if hasattr(periodo_max, 'date') else str(periodo_max)[:10]
-            },
-            "summary": {
-                "new_products": new_records['cdproduto'].nunique() if not new_records.empty else 0,
-                "updated_products": update_records['cdproduto'].nunique() if not update_records.empty else 0
-            }
-        }
+                ImportService._cdproduto_numerico = issubclass(coluna['type'].python_type, (int, float, Decimal))
+            except NotImplementedError:
+                ImportService._cdproduto_numerico = False
+
+        texto = df['cdproduto'].astype(str)
+        if ImportService._cdproduto_numerico:
+            numeros = pd.to_numeric(texto.str.strip(), errors='coerce').dropna()
+            return numeros.astype('int64').unique().tolist()
+        return pd.unique(pd.concat([texto, texto.str.strip()], ignore_index=True)).tolist()
+
+    @staticmethod
+    def _chaves_historico(*frames):
+        """
+        Chave composta (dia, cdproduto, cdfamilia, cdprocesso) de cada linha
+        como int64, comparável entre os DataFrames recebidos.
 
+        Os códigos são normalizados como texto sem espaços (como antes) e
+        fatorados em conjunto; o dia e os códigos são combinados em base
+        mista. Se o produto das cardinalidades não couber em int64, as
+        tuplas de códigos são fatoradas.
+        """
+        sizes = [len(frame) for frame in frames]
+        def dia(periodo):
+            # Dia de calendário local, como no strftime('%Y-%m-%d')
+            periodo = pd.to_datetime(periodo)
+            if periodo.dt.tz is not None:
+                periodo = periodo.dt.tz_localize(None)
+            return periodo.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+        dias = np.concatenate([dia(frame['periodo']) for frame in frames])
+        parts = [dias - dias.min() if len(dias) else dias]
+        for col in ('cdproduto', 'cdfamilia', 'cdprocesso'):
+            values = pd.concat([frame[col].astype(str).str.strip() for frame in frames], ignore_index=True)
+            parts.append(pd.factorize(values)[0].astype(np.int64))
+
+        radices = [int(part.max()) + 1 if len(part) else 1 for part in parts]
+        if np.prod([float(radix) for radix in radices]) < 2 ** 62:
+            keys = np.zeros(len(dias), dtype=np.int64)
+            for part, radix in zip(parts, radices):
+                keys = keys * radix + part
+        else:
+            keys = pd.MultiIndex.from_arrays(parts).factorize()[0].astype(np.int64)
+
+        return np.split(keys, np.cumsum(sizes)[:-1])
+
+    STAGING_TABLE = 'tmp_dadosbruto_import'
+    HISTORICO_COLS = ['periodo', 'cdproduto', 'cdfamilia', 'cdprocesso', 'valor']
+
+    def _aplicar_upsert_historico(self, new_records: pd.DataFrame, update_records: pd.DataFrame):
+        """
+        Grava inserções e atualizações numa única transação, sem um comando
+        por linha: os registros vão para uma tabela temporária (COPY no
+        PostgreSQL) e são aplicados com um UPDATE ... FROM e um
+        INSERT ... SELECT. A tabela não tem chave única, então o ON CONFLICT
+        não se aplica; a separação novo/alterado vem do diff já feito.
+        """
+        cols = self.HISTORICO_COLS
+        staging = pd.concat([
+            new_records[cols].assign(acao='I'),
+            # Mesma chave repetida na planilha: vale o último valor, como nos UPDATEs em sequência
+            update_records.reindex(columns=cols)
+                .drop_duplicates(subset=cols[:4], keep='last')
+                .assign(acao='U'),
+        ], ignore_index=True)
+
+        try:
+            with self.engine.begin() as conn:
+                postgres = conn.dialect.name == 'postgresql'
+                conn.execute(text(
+                    f"CREATE TEMP TABLE {self.STAGING_TABLE} "
+                    f"{'ON COMMIT DROP ' if postgres else ''}AS "
+                    f"SELECT {', '.join(cols)}, CAST(NULL AS CHAR(1)) AS acao "
+                    f"FROM tbdadosbruto WHERE 1 = 0"
+                ))
+                self._copy_para_staging(conn, staging, postgres)
+
+                conn.execute(text(f"""
+                    UPDATE tbdadosbruto
+                    SET valor = s.valor
+                    FROM {self.STAGING_TABLE} s
+                    WHERE s.acao = 'U'
+                    AND tbdadosbruto.periodo = s.periodo
+                    AND tbdadosbruto.cdproduto = s.cdproduto
+                    AND tbdadosbruto.cdfamilia = s.cdfamilia
+                    AND tbdadosbruto.cdprocesso = s.cdprocesso
+                """))
+                conn.execute(text(f"""
+                    INSERT INTO tbdadosbruto ({', '.join(cols)})
+                    SELECT {', '.join(cols)} FROM {self.STAGING_TABLE} WHERE acao = 'I'
+                """))
+
+                if not postgres:
+                    conn.execute(text(f"DROP TABLE {self.STAGING_TABLE}"))
+        except Exception as e:
+            raise RuntimeError(f"Erro ao gravar registros históricos: {e}")
+
+        print(f"✅ Histórico gravado em lote: {len(new_records)} inseridos, {len(update_records)} atualizados")
+
+    def _copy_para_staging(self, conn, staging: pd.DataFrame, postgres: bool, table: str = None):
+        """Carrega a tabela temporária: COPY FROM STDIN no PostgreSQL, INSERT em lote nos demais."""
+        table = table or self.STAGING_TABLE
+        if not postgres:
+            columns = ', '.join(staging.columns)
+            values = ', '.join(f':{col}' for col in staging.columns)
+            records = staging.astype(object).where(staging.notna(), None).to_dict('records')
+            for record in records:
+                if isinstance(record.get('periodo'), pd.Timestamp):
+                    record['periodo'] = record['periodo'].to_pydatetime()
+            conn.execute(text(f"INSERT INTO {table} ({columns}) VALUES ({values})"), records)
+            return
+
+        buffer = io.StringIO()
+        staging.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S')
+        buffer.seek(0)
+
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(staging.columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        finally:
+            cursor.close()
     
     async def processar_features(
         self,
@@ -241,6 +503,9 @@ class ImportService:
             if close_after:
                 session_ctx.__exit__(None, None, None)
 
+        # A versão nova já invalida o cache; descarta também a antiga da memória
+        invalidate_feature_cache(table_name)
+
         return {
             "message": f"Feature '{feature_name}' importada com sucesso.",
             "table_name": table_name,
@@ -391,8 +656,13 @@ class ImportService:
             value_name='valor'
         )
         
-        # 4. Normaliza datas
-        df_long['periodo'] = df_long['periodo'].apply(self._parse_date)
+        # 4. Normaliza datas: cada cabeçalho é convertido uma vez e repetido
+        # nas linhas (o melt empilha coluna a coluna), já como datetime64
+        datas = pd.to_datetime(
+            pd.Series([self._parse_date(col) for col in date_cols], dtype=object),
+            format='%Y-%m-%d'
+        )
+        df_long['periodo'] = np.repeat(datas.to_numpy(), len(df))
         
         # 5. Remove linhas inválidas
         df_long = df_long.dropna(subset=['periodo', 'valor'])
@@ -460,17 +730,114 @@ class ImportService:
         except Exception as e:
             return None
 
+    def _iter_file_chunks(self, file, extension: str, chunk_rows: int):
+        """
+        Lê o upload em lotes de até `chunk_rows` linhas, sem carregar o
+        arquivo inteiro: CSV com read_csv(chunksize=...) e XLSX linha a linha
+        com o openpyxl em modo read-only. O XLS antigo não tem leitura em
+        streaming e é lido inteiro e fatiado.
+        """
+        # UploadFile guarda o conteúdo num arquivo temporário (file.file)
+        source = getattr(file, 'file', file)
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+        if extension == ".csv":
+            # Cabeçalho primeiro, para ler os códigos como texto em todos os lotes
+            dtype = self._dtype_ids(pd.read_csv(source, nrows=0).columns)
+            source.seek(0)
+            for chunk in pd.read_csv(source, chunksize=chunk_rows, dtype=dtype):
+                yield self._normalizar_ids(chunk)
+        elif extension == ".xlsx":
+            workbook = load_workbook(source, read_only=True, data_only=True)
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    return
+                # Mesmos nomes que o read_excel dá a cabeçalhos vazios
+                columns = [f"Unnamed: {i}" if col is None else col for i, col in enumerate(header)]
+                width = len(columns)
+
+                batch = []
+                for row in rows:
+                    if all(value is None for value in row):
+                        continue
+                    row = tuple(row[:width]) + (None,) * (width - len(row))
+                    batch.append(row)
+                    if len(batch) >= chunk_rows:
+                        yield self._normalizar_ids(pd.DataFrame(batch, columns=columns))
+                        batch = []
+                if batch:
+                    yield self._normalizar_ids(pd.DataFrame(batch, columns=columns))
+            finally:
+                workbook.close()
+        elif extension == ".xls":
+            df = self._read_excel_ids(source)
+            for start in range(0, len(df), chunk_rows):
+                yield df.iloc[start:start + chunk_rows]
+        else:
+            raise ValueError(f"Extensão não suportada: {extension}")
+
     async def _read_file_raw(self, file, extension: str) -> pd.DataFrame:
         """Lê arquivo sem normalizar colunas (para detectar formato)."""
         contents = await file.read()
 
         if extension == ".csv":
-            df = pd.read_csv(io.BytesIO(contents))
+            dtype = self._dtype_ids(pd.read_csv(io.BytesIO(contents), nrows=0).columns)
+            df = self._normalizar_ids(pd.read_csv(io.BytesIO(contents), dtype=dtype))
         elif extension in [".xlsx", ".xls"]:
-            df = pd.read_excel(io.BytesIO(contents))
+            df = self._read_excel_ids(io.BytesIO(contents))
         else:
             raise ValueError(f"Extensão não suportada: {extension}")
 
         return df
 
+    # Trechos de cabeçalho das colunas de código (produto, família/linha,
+    # processo, classe), os mesmos usados para reconhecê-las nos formatos
+    # long e wide
+    ID_COLUMN_HINTS = ('sku', 'produto', 'codigo', 'código', 'familia', 'linha', 'processo', 'classe')
+
+    @classmethod
+    def _colunas_id(cls, columns):
+        return [col for col in columns if any(hint in str(col).lower() for hint in cls.ID_COLUMN_HINTS)]
+
+    @classmethod
+    def _dtype_ids(cls, columns):
+        """
+        dtype do read_csv para as colunas de código: texto. Com o tipo
+        inferido, um lote com célula vazia lê o código como float ("12.0") e
+        zeros à esquerda se perdem, então o mesmo produto mudaria de chave.
+        """
+        return {col: str for col in cls._colunas_id(columns)}
+
+    @staticmethod
+    def _codigo_texto(value):
+        """Código como texto sem espaços nas pontas (12 e 12.0 viram "12"); vazio vira None."""
+        if isinstance(value, str):
+            return value.strip() or None
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        value = str(value).strip()
+        return value or None
+
+    @classmethod
+    def _normalizar_ids(cls, df):
+        """Colunas de código como texto, do mesmo jeito em qualquer leitor e lote."""
+        for col in cls._colunas_id(df.columns):
+            # Convertido por código distinto (poucos) e não por linha; nulo = -1
+            codes, uniques = pd.factorize(df[col])
+            textos = np.array([cls._codigo_texto(value) for value in uniques] + [None], dtype=object)
+            df[col] = textos[codes]
+        return df
+
+    @classmethod
+    def _read_excel_ids(cls, source):
+        """read_excel com as colunas de código como texto (valores das células, sem inferência)."""
+        df = cls._normalizar_ids(pd.read_excel(source, dtype=object))
+        # As demais colunas voltam aos tipos que o read_excel inferiria
+        return df.infer_objects()
+
     
\ No newline at end of file
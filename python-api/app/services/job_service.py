@@ -0,0 +1,227 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.repository.job_repository import JobRepository
+
+# "thread": workers em threads do processo da API; "inline": executa na
+# chamada de submit (mesmo processo/thread, útil em testes e scripts)
+JOB_BACKEND = os.getenv("JOB_BACKEND", "thread")
+# Tarefas executadas ao mesmo tempo no backend "thread"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Intervalo mínimo (s) entre gravações de progresso de uma tarefa
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "1.0"))
+# Onde os uploads ficam até a tarefa processá-los (None = diretório temporário)
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR")
+
+
+class JobCancelled(Exception):
+    """Levantada no passo de progresso quando o cancelamento foi pedido."""
+
+
+class JobContext:
+    """
+    Canal da tarefa com o JobService: reporta progresso e interrompe a
+    execução (JobCancelled) se o cancelamento tiver sido pedido.
+
+    As gravações são limitadas a uma a cada JOB_PROGRESS_INTERVAL segundos,
+    para que tarefas com milhares de passos (ex.: um por SKU) não virem
+    milhares de UPDATEs.
+    """
+
+    def __init__(self, job_id, min_interval=JOB_PROGRESS_INTERVAL):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_write = None
+        self.cancelled = False
+
+    def progress(self, fraction=None, message=None, force=False):
+        """
+        Registra o progresso (0 a 1) e verifica o cancelamento.
+
+        Raises:
+            JobCancelled: Cancelamento pedido pelo usuário
+        """
+        if self.cancelled:
+            # Tarefas que capturam Exception e seguem adiante param no próximo passo
+            raise JobCancelled(f"Tarefa {self.job_id} cancelada")
+
+        now = time.monotonic()
+        if not force and self._last_write is not None and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+
+        fields = {}
+        if fraction is not None:
+            fields["progress"] = float(min(max(fraction, 0.0), 1.0))
+        if message is not None:
+            fields["message"] = message
+        job = JobRepository.report(self.job_id, **fields)
+
+        # Encerrada por fora (ex.: marcada como interrompida) também para a execução
+        if job is not None and (job["cancel_requested"] or job["status"] in JobRepository.FINISHED):
+            self.cancelled = True
+            raise JobCancelled(f"Tarefa {self.job_id} cancelada")
+
+
+class JobService:
+    """
+    Fila local de tarefas longas (importações, previsão do catálogo).
+
+    O estado fica em tbjobs (JobRepository), então status, progresso e
+    resultado sobrevivem ao request e podem ser consultados por qualquer
+    worker da API. A execução é feita por um ThreadPoolExecutor do processo
+    (backend "thread") ou na própria chamada (backend "inline"). Threads, e
+    não processos, porque as tarefas usam o DatasetCache do processo e o
+    pandas/XGBoost liberam o GIL na maior parte do trabalho.
+
+    Uma tarefa é uma função `func(ctx)` que recebe um JobContext e devolve
+    um resultado serializável em JSON.
+    """
+
+    backend = JOB_BACKEND
+    workers = JOB_WORKERS
+
+    _executor = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.workers, thread_name_prefix="job")
+            return cls._executor
+
+    @classmethod
+    def shutdown(cls, wait=False):
+        """Encerra os workers (tarefas ainda na fila não são iniciadas)."""
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    @staticmethod
+    def owner():
+        """Identificação deste processo da API nas tarefas ("host:pid")."""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @classmethod
+    def fail_interrupted(cls):
+        """
+        Marca como 'failed' as tarefas que ficaram pela metade porque o
+        processo que as executava parou. Chamado na inicialização.
+
+        Só considera processos deste host que não estão mais rodando (ou cujo
+        pid foi reaproveitado por este processo): tarefas de outros workers ou
+        hosts ativos, como numa reinicialização gradual, não são tocadas.
+        """
+        host = socket.gethostname()
+        owners = [owner for owner in JobRepository.active_owners() if cls._owner_gone(owner, host)]
+        return JobRepository.fail_interrupted(owners)
+
+    @staticmethod
+    def _owner_gone(owner, host):
+        owner_host, _, pid = owner.rpartition(":")
+        if owner_host != host or not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    @classmethod
+    def submit(cls, kind, func, params=None, cleanup=None):
+        """
+        Registra a tarefa e a coloca na fila.
+
+        Args:
+            kind: Tipo da tarefa (ex.: 'import_historical', 'forecast_catalog')
+            func: Função func(ctx: JobContext) -> resultado (JSON)
+            params: Parâmetros da tarefa, guardados para consulta
+            cleanup: Chamada ao fim da tarefa em qualquer caso, inclusive se
+                ela for cancelada antes de começar (ex.: apagar o upload)
+
+        Returns:
+            Dicionário da tarefa (JobRepository)
+        """
+        job = JobRepository.create(kind, cls._jsonable(params), owner=cls.owner())
+        print(f"📥 Tarefa {job['job_id']} ({kind}) na fila [{cls.backend}]")
+
+        if cls.backend == "inline":
+            cls._run(job["job_id"], func, cleanup)
+        elif cls.backend == "thread":
+            cls._get_executor().submit(cls._run, job["job_id"], func, cleanup)
+        else:
+            raise ValueError(f"Backend de tarefas '{cls.backend}' não reconhecido. Use: 'thread', 'inline'")
+
+        return JobRepository.get(job["job_id"])
+
+    @classmethod
+    def _run(cls, job_id, func, cleanup=None):
+        try:
+            cls._execute(job_id, func)
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    @classmethod
+    def _execute(cls, job_id, func):
+        if not JobRepository.start(job_id):
+            print(f"⏭️ Tarefa {job_id} não está mais na fila (cancelada)")
+            return
+
+        print(f"▶️ Tarefa {job_id} iniciada")
+        try:
+            result = func(JobContext(job_id))
+        except JobCancelled:
+            JobRepository.finish(job_id, "cancelled")
+            print(f"🛑 Tarefa {job_id} cancelada")
+        except Exception as e:
+            traceback.print_exc()
+            JobRepository.finish(job_id, "failed", error=str(e))
+            print(f"❌ Tarefa {job_id} falhou: {e}")
+        else:
+            # finish não sobrescreve uma tarefa encerrada por fora enquanto rodava
+            if JobRepository.finish(job_id, "completed", progress=1.0, result=cls._jsonable(result)):
+                print(f"✅ Tarefa {job_id} concluída")
+            else:
+                print(f"⚠️ Tarefa {job_id} terminou, mas já estava encerrada; resultado descartado")
+
+    @staticmethod
+    def _jsonable(value):
+        """Converte escalares NumPy/pandas e datas para tipos aceitos no JSON."""
+        def default(obj):
+            if isinstance(obj, np.generic):
+                return obj.item()
+            if isinstance(obj, (pd.Timestamp, datetime)):
+                return obj.isoformat()
+            return str(obj)
+
+        return None if value is None else json.loads(json.dumps(value, default=default))
+
+    # ------------------------------------------------------------- consultas
+
+    @staticmethod
+    def get(job_id):
+        return JobRepository.get(job_id)
+
+    @staticmethod
+    def list(kind=None, status=None, limit=50):
+        return JobRepository.list(kind=kind, status=status, limit=limit)
+
+    @staticmethod
+    def cancel(job_id):
+        return JobRepository.request_cancel(job_id)
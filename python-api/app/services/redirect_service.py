@@ -1,5 +1,8 @@
 from app.services.aggregation_service import AggregationService
+from app.services.classification_service import ClassificationService
+from app.services.routing_index import SkuRoutingIndex
 from app.services.xgboost_service import XGBoostService
+from app.utils.time import Time
 
 
 class RedirectService:
@@ -14,6 +17,8 @@ class RedirectService:
         familia=None,
         processo=None,
         abc_class=None,
+        routing_index=None,
+        cube=None,
     ):
         aggregation_info = None
         auto_selected = False
@@ -24,41 +29,9 @@ class RedirectService:
             else:
                 modelo_final = "Prophet"
 
-            if aggregation_type == "familia":
-                df_aggregated, aggregation_info = AggregationService.aggregate_familia(
-                    df_processed, familia
-                )
-
-            elif aggregation_type == "processo":
-                df_aggregated, aggregation_info = (
-                    AggregationService.aggregate_by_processo(df_processed, processo)
-                )
-
-            elif aggregation_type == "abc":
-                if not abc_class:
-                    raise ValueError(
-                        "Classe ABC deve ser especificada para agregação por ABC"
-                    )
-                df_aggregated, aggregation_info = AggregationService.aggregate_by_abc(
-                    df_processed, df, abc_class
-                )
-
-            elif aggregation_type == "all":
-                df_aggregated, aggregation_info = AggregationService.aggregate_all(
-                    df_processed
-                )
-
-            elif aggregation_type == "combined":
-                df_aggregated, aggregation_info = AggregationService.aggregate_combined(
-                    df_processed,
-                    df_classified=df,
-                    familia=familia,
-                    processo=processo,
-                    abc_class=abc_class,
-                )
-
-            else:
-                raise ValueError(f"Tipo de agregação inválido: {aggregation_type}")
+            df_aggregated, aggregation_info = RedirectService._build_aggregated_series(
+                df, df_processed, aggregation_type, familia, processo, abc_class, cube
+            )
 
             run_id, forecast_df, time, metrics = RedirectService._execute_model(
                 modelo_final, db, df_aggregated, None, periods
@@ -78,36 +51,9 @@ class RedirectService:
             if sku is None:
                 raise ValueError("SKU deve ser fornecido para previsão individual")
 
-            if model:
-                modelo_final = model.strip()
-                auto_selected = False
-            else:
-                auto_selected = True
-                mask = (
-                    df["SKU"].astype(str).str.strip().str.upper()
-                    == str(sku).strip().upper()
-                )
-
-                if mask.any():
-                    classe_abc = (
-                        df.loc[mask, "Classe_ABC"]
-                        .astype(str)
-                        .str.strip()
-                        .str.upper()
-                        .iloc[0]
-                    )
-                else:
-                    print(f"⚠️ SKU '{sku}' não encontrado na classificação ABC")
-                    classe_abc = None
-
-                if classe_abc == "A":
-                    modelo_final = "Prophet"
-                elif classe_abc == "B":
-                    modelo_final = "TSB"
-                elif classe_abc == "C":
-                    modelo_final = "XGBoost"
-                else:
-                    modelo_final = "Prophet"
+            modelo_final, auto_selected = RedirectService._select_sku_model(
+                df, sku, model, routing_index
+            )
 
             run_id, forecast_df, time, metrics = RedirectService._execute_model(
                 modelo_final, db, df_processed, sku, periods
@@ -115,6 +61,147 @@ class RedirectService:
 
             return run_id, forecast_df, time, None, modelo_final, auto_selected, metrics
 
+    def model_direction_batch(
+        specs,
+        df=None,
+        df_processed=None,
+        db=None,
+        routing_index=None,
+        cube=None,
+        n_jobs=None,
+    ):
+        """
+        Várias previsões (SKUs e/ou agregações) numa única execução.
+
+        Os dados preprocessados, a classificação e o cubo são compartilhados;
+        as séries são montadas primeiro e os modelos XGBoost são treinados em
+        paralelo (XGBoostService.predict_batch), todos gravados no mesmo run.
+
+        Args:
+            specs: Lista de ForecastRequest (cada um com agregação, filtros,
+                modelo e períodos)
+
+        Returns:
+            (run_id, lista de dicts por spec na ordem recebida, tempo total).
+            run_id é None se nenhum item XGBoost passou pela validação: o run
+            do lote só é criado quando há séries para gravar nele.
+        """
+        time = Time()
+        results = [None] * len(specs)
+        xgboost_jobs = []
+
+        for i, spec in enumerate(specs):
+            try:
+                if spec.aggregation_type == "sku":
+                    if spec.sku is None:
+                        raise ValueError("SKU deve ser fornecido para previsão individual")
+                    modelo_final, auto_selected = RedirectService._select_sku_model(
+                        df, spec.sku, spec.model, routing_index
+                    )
+                    df_series, sku, aggregation_info = df_processed, spec.sku, None
+                else:
+                    modelo_final = spec.model.strip() if spec.model else "Prophet"
+                    auto_selected = False
+                    df_series, aggregation_info = RedirectService._build_aggregated_series(
+                        df, df_processed, spec.aggregation_type,
+                        spec.familia, spec.processo, spec.abc_class, cube,
+                    )
+                    sku = None
+            except ValueError as e:
+                results[i] = {"status": "failed", "error": str(e)}
+                continue
+
+            results[i] = {
+                "status": "completed",
+                "aggregation_info": aggregation_info,
+                "model_used": modelo_final,
+                "auto_selected": auto_selected,
+            }
+            if modelo_final == "XGBoost":
+                xgboost_jobs.append((i, df_series, sku, spec.periods))
+            else:
+                try:
+                    _, forecast_df, _, metrics = RedirectService._execute_model(
+                        modelo_final, db, df_series, sku, spec.periods
+                    )
+                    results[i].update(forecast_df=forecast_df, metrics=metrics)
+                except (ValueError, NotImplementedError) as e:
+                    results[i].update(status="failed", error=str(e))
+
+        if not xgboost_jobs:
+            return None, results, time.obter_tempo()
+
+        xgboost_service = XGBoostService(db)
+        modelos = sorted({r["model_used"] for r in results if r.get("model_used")})
+        run_id = xgboost_service.saver.save_forecast_run(
+            ", ".join(modelos) or "Batch", len(specs), "batch"
+        )
+
+        batch_results = xgboost_service.predict_batch(
+            [(df_series, sku, periods) for _, df_series, sku, periods in xgboost_jobs],
+            run_id=run_id,
+            n_jobs=n_jobs,
+        )
+        for (i, *_), (result, error) in zip(xgboost_jobs, batch_results):
+            if error is not None:
+                results[i].update(status="failed", error=error)
+                continue
+            _, forecast_df, _, metrics = result
+            results[i].update(forecast_df=forecast_df, metrics=metrics)
+
+        return run_id, results, time.obter_tempo()
+
+    @staticmethod
+    def _build_aggregated_series(df, df_processed, aggregation_type, familia, processo, abc_class, cube=None):
+        """Série agregada (Data, Quantidade) e informações do tipo de agregação."""
+        if aggregation_type == "familia":
+            return AggregationService.aggregate_familia(df_processed, familia, cube=cube)
+
+        elif aggregation_type == "processo":
+            return AggregationService.aggregate_by_processo(df_processed, processo, cube=cube)
+
+        elif aggregation_type == "abc":
+            if not abc_class:
+                raise ValueError(
+                    "Classe ABC deve ser especificada para agregação por ABC"
+                )
+            return AggregationService.aggregate_by_abc(df_processed, df, abc_class, cube=cube)
+
+        elif aggregation_type == "all":
+            return AggregationService.aggregate_all(df_processed, cube=cube)
+
+        elif aggregation_type == "combined":
+            return AggregationService.aggregate_combined(
+                df_processed,
+                df_classified=df,
+                familia=familia,
+                processo=processo,
+                abc_class=abc_class,
+                cube=cube,
+            )
+
+        raise ValueError(f"Tipo de agregação inválido: {aggregation_type}")
+
+    @staticmethod
+    def _select_sku_model(df, sku, model, routing_index=None):
+        """Modelo do SKU: o informado ou o da classe ABC. Retorna (modelo, automático?)."""
+        if model:
+            return model.strip(), False
+
+        if routing_index is None:
+            # A classe ABC depende do segmento (Família × Processo) inteiro,
+            # então sem índice em cache ele é montado (uma vez por versão)
+            if df is None:
+                routing_index = ClassificationService.indice_roteamento_cacheado()
+            else:
+                routing_index = SkuRoutingIndex.from_classified(df)
+
+        classe_abc, _ = routing_index.lookup(sku)
+        if classe_abc is None:
+            print(f"⚠️ SKU '{sku}' não encontrado na classificação ABC")
+
+        return routing_index.route(sku), True
+
     @staticmethod
     def _execute_model(model_name, db, df, sku, periods):
         if model_name == "Prophet":
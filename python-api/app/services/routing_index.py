@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+
+CLUSTERS_FILE = "skus_clusters.csv"
+
+
+class SkuRoutingIndex:
+    """
+    Índice SKU -> (classe ABC, cluster) para o redirecionamento de modelos.
+
+    As chaves são normalizadas uma única vez (str, strip, upper), de modo
+    que escolher o modelo de um SKU é uma busca em dicionário, e o mesmo
+    índice atende consultas em lote (`route_many`).
+    """
+
+    MODELO_POR_CLASSE = {"A": "Prophet", "B": "TSB", "C": "XGBoost"}
+    MODELO_PADRAO = "Prophet"
+
+    def __init__(self, classes, clusters=None):
+        """
+        Args:
+            classes: Dict SKU normalizado -> classe ABC normalizada
+            clusters: Dict SKU normalizado -> cluster (opcional)
+        """
+        self.classes = classes
+        self.clusters = clusters or {}
+
+    @staticmethod
+    def normalize(sku):
+        return str(sku).strip().upper()
+
+    @staticmethod
+    def _normalize_series(series):
+        return series.astype(str).str.strip().str.upper()
+
+    @classmethod
+    def from_classified(cls, df_classified, clusters_path=CLUSTERS_FILE):
+        """
+        Monta o índice a partir da classificação ABC (e do CSV de clusters,
+        se existir). Para SKUs repetidos vale a primeira linha, como antes.
+        """
+        skus = cls._normalize_series(df_classified["SKU"])
+        classes = cls._normalize_series(df_classified["Classe_ABC"])
+        classes = pd.Series(classes.to_numpy(), index=skus.to_numpy())
+        classes = classes[~classes.index.duplicated(keep="first")]
+
+        clusters = {}
+        if clusters_path and os.path.exists(clusters_path):
+            df_clusters = pd.read_csv(clusters_path, usecols=["sku", "cluster"])
+            df_clusters["sku"] = cls._normalize_series(df_clusters["sku"])
+            df_clusters = df_clusters.drop_duplicates(subset="sku", keep="first")
+            clusters = dict(zip(df_clusters["sku"], df_clusters["cluster"].astype(int)))
+
+        return cls(classes.to_dict(), clusters)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def lookup(self, sku):
+        """(classe ABC, cluster) do SKU; None para o que não for encontrado."""
+        key = self.normalize(sku)
+        return self.classes.get(key), self.clusters.get(key)
+
+    def route(self, sku):
+        """Modelo escolhido para o SKU pela classe ABC (Prophet se desconhecida)."""
+        return self.MODELO_POR_CLASSE.get(self.classes.get(self.normalize(sku)), self.MODELO_PADRAO)
+
+    def route_many(self, skus):
+        """
+        Roteamento em lote.
+
+        Returns:
+            DataFrame com 'SKU', 'Classe_ABC', 'cluster' e 'modelo', na ordem
+            dos SKUs recebidos
+        """
+        skus = pd.Series(list(skus), dtype=object)
+        keys = self._normalize_series(skus)
+        classes = keys.map(self.classes)
+        return pd.DataFrame({
+            "SKU": skus,
+            "Classe_ABC": classes,
+            "cluster": keys.map(self.clusters).astype("Int64"),
+            "modelo": classes.map(self.MODELO_POR_CLASSE).fillna(self.MODELO_PADRAO),
+        })
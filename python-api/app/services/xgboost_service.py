@@ -1,80 +1,109 @@
+import os
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import multiprocessing
+
 import numpy as np
 import pandas as pd
 from xgboost import XGBRegressor
+from xgboost.callback import TrainingCallback
+from app.config.db_config import DatabaseConfig
 from app.repository.xgboost_repository import XGBoostRepository
 from app.utils.time import Time
-from app.utils.incc import get_incc_with_forecast
-from app.utils.selic import get_selic_with_forecast
+from app.utils.exogenous import MonthlyExogenousTable, get_monthly_exogenous
+from app.utils.trend import linear_slope, rolling_slope
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from app.models.feature_metadata import FeatureMetadata
+from app.data_processing.feature_index import CustomFeatureIndex
+from app.data_processing.feature_state import BatchForecastFeatureState
+from app.data_processing.grouped_stats import GroupedStats
 
 
 class XGBoostService:
+    # Threads do XGBoost por modelo (None = todos os núcleos). Os workers de
+    # predict_all_skus(n_jobs>1) limitam esse valor para não disputar CPU.
+    xgb_threads = None
+
     def __init__(self, db_session: Session):
         self.db = db_session
         self.saver = XGBoostRepository(db_session)
 
     @staticmethod
     def enrich_features(df, target='Quantidade', date_col='Data', group_col=None):
+        """
+        Gera lags, médias/desvios móveis, taxas de crescimento, calendário e
+        tendência para todas as séries de uma vez.
+
+        Em vez de iterar grupo a grupo, ordena o DataFrame por (grupo, data) e
+        aplica shift/rolling/pct_change agrupados sobre o frame inteiro. A saída
+        é idêntica à da versão anterior (mesma ordem de linhas e valores).
+        """
         df = df.copy()
         df[date_col] = pd.to_datetime(df[date_col])
         df = df.sort_values(date_col).reset_index(drop=True)
 
         if group_col:
-            group_obj = df.groupby(group_col)
+            keys = [group_col] if isinstance(group_col, str) else list(group_col)
+            # groupby descarta chaves nulas e itera os grupos em ordem; o sort
+            # estável preserva a ordem por data dentro de cada grupo
+            df = df.dropna(subset=keys)
+            df = df.sort_values(keys, kind='stable').reset_index(drop=True)
+            group_keys = [df[k] for k in keys]
         else:
-            group_obj = [(None, df)]
+            keys = []
+            group_keys = np.zeros(len(df), dtype=np.int64)
 
-        enriched_dfs = []
+        grouped_target = df[target].groupby(group_keys, sort=False)
 
-        for group_name, group_df in group_obj:
-            g = group_df.copy()
+        def rolling(series, window, min_periods):
+            return series.groupby(group_keys, sort=False).rolling(window=window, min_periods=min_periods)
 
-            for lag in [1, 3, 6, 12]:
-                g[f'lag_{lag}'] = g[target].shift(lag)
+        def align(result):
+            # groupby().rolling() devolve MultiIndex (grupo, índice original)
+            return result.droplevel(list(range(result.index.nlevels - 1))).reindex(df.index)
 
-            for w in [3, 6, 12]:
-                g[f'rolling_mean_{w}'] = g[target].shift(1).rolling(window=w, min_periods=1).mean()
-                g[f'rolling_std_{w}'] = g[target].shift(1).rolling(window=w, min_periods=1).std()
+        for lag in [1, 3, 6, 12]:
+            df[f'lag_{lag}'] = grouped_target.shift(lag)
 
-            g['growth_rate_1'] = g[target].pct_change(1)
-            g['growth_rate_3'] = g[target].pct_change(3)
-            g['growth_rate_6'] = g[target].pct_change(6)
+        shifted = grouped_target.shift(1)
+        for w in [3, 6, 12]:
+            df[f'rolling_mean_{w}'] = align(rolling(shifted, w, 1).mean())
+            df[f'rolling_std_{w}'] = align(rolling(shifted, w, 1).std())
 
-            g['year'] = g[date_col].dt.year
-            g['month'] = g[date_col].dt.month
-            g['quarter'] = g[date_col].dt.quarter
-            g['day_of_year'] = g[date_col].dt.dayofyear
-            g['week_of_year'] = g[date_col].dt.isocalendar().week.astype(int)
+        df['growth_rate_1'] = grouped_target.pct_change(1)
+        df['growth_rate_3'] = grouped_target.pct_change(3)
+        df['growth_rate_6'] = grouped_target.pct_change(6)
 
-            g['month_sin'] = np.sin(2 * np.pi * g['month'] / 12)
-            g['month_cos'] = np.cos(2 * np.pi * g['month'] / 12)
-            g['quarter_sin'] = np.sin(2 * np.pi * g['quarter'] / 4)
-            g['quarter_cos'] = np.cos(2 * np.pi * g['quarter'] / 4)
+        dates = df[date_col].dt
+        df['year'] = dates.year
+        df['month'] = dates.month
+        df['quarter'] = dates.quarter
+        df['day_of_year'] = dates.dayofyear
+        df['week_of_year'] = dates.isocalendar().week.astype(int)
 
-            feriados = [
-                '01-01', '04-21', '05-01', '09-07', '10-12', '11-02', '11-15', '12-25'
-            ]
-            g['is_holiday'] = g[date_col].dt.strftime('%m-%d').isin(feriados).astype(int)
+        df['month_sin'] = np.sin(2 * np.pi * df['month'] / 12)
+        df['month_cos'] = np.cos(2 * np.pi * df['month'] / 12)
+        df['quarter_sin'] = np.sin(2 * np.pi * df['quarter'] / 4)
+        df['quarter_cos'] = np.cos(2 * np.pi * df['quarter'] / 4)
 
-            def rolling_trend(x, window=6):
-                if len(x) < 2:
-                    return 0
-                y = np.array(x)
-                X = np.arange(len(y))
-                A = np.vstack([X, np.ones(len(X))]).T
-                slope, _ = np.linalg.lstsq(A, y, rcond=None)[0]
-                return slope
+        feriados = [
+            '01-01', '04-21', '05-01', '09-07', '10-12', '11-02', '11-15', '12-25'
+        ]
+        # Compara (mês * 100 + dia) em vez de formatar cada data com strftime
+        feriados_mmdd = [int(f.replace('-', '')) for f in feriados]
+        df['is_holiday'] = (dates.month * 100 + dates.day).isin(feriados_mmdd).astype(int)
 
-            g['trend_6'] = g[target].shift(1).rolling(window=6, min_periods=3).apply(rolling_trend, raw=False)
+        df['trend_6'] = rolling_slope(
+            shifted, window=6, min_periods=3, group_positions=grouped_target.cumcount()
+        )
 
-            g = g.replace([np.inf, -np.inf], np.nan).fillna(method='bfill').fillna(0)
+        df = df.replace([np.inf, -np.inf], np.nan)
+        value_cols = [col for col in df.columns if col not in keys]
+        df[value_cols] = df[value_cols].groupby(group_keys, sort=False).bfill()
+        df = df.fillna(0)
 
-            enriched_dfs.append(g)
-        
-        df_enriched = pd.concat(enriched_dfs, ignore_index=True)
-        return df_enriched
+        return df
 
     @staticmethod
     def add_external_regressors(df, date_col='Data'):
@@ -82,123 +111,77 @@ class XGBoostService:
         df[date_col] = pd.to_datetime(df[date_col])
         
         max_date = df[date_col].max() + pd.DateOffset(months=24)
-        
-        incc_data = get_incc_with_forecast(end_date=max_date, forecast_periods=730)
-        selic_data = get_selic_with_forecast(end_date=max_date)
-        
-        incc_data['ds'] = pd.to_datetime(incc_data['ds'])
-        selic_data['ds'] = pd.to_datetime(selic_data['ds'])
-        
-        df['year_month'] = df[date_col].dt.to_period('M')
-        incc_data['year_month'] = incc_data['ds'].dt.to_period('M')
-        selic_data['year_month'] = selic_data['ds'].dt.to_period('M')
-        
-        incc_monthly = incc_data.groupby('year_month')['incc'].mean().reset_index()
-        selic_monthly = selic_data.groupby('year_month')['selic'].mean().reset_index()
-        
-        df = df.merge(incc_monthly, on='year_month', how='left')
-        df = df.merge(selic_monthly, on='year_month', how='left')
-        
-        df['incc'] = df['incc'].fillna(method='ffill').fillna(method='bfill')
-        df['selic'] = df['selic'].fillna(method='ffill').fillna(method='bfill')
-        
-        df = df.drop('year_month', axis=1)
+        exogenous = get_monthly_exogenous(max_date)
+
+        # Busca direta no array mensal (o merge antigo também renumerava o índice)
+        df = df.reset_index(drop=True)
+        for col in MonthlyExogenousTable.COLUMNS:
+            df[col] = exogenous.lookup(col, df[date_col])
         
         print(f"✅ Variáveis externas adicionadas: INCC e SELIC")
         
         return df
     
-    def add_custom_features(self, df, date_col='Data'):
+    def add_custom_features(self, df, date_col='Data', feature_index=None, group_col=None):
+        """
+        Junta as features externas (médias mensais) ao DataFrame.
+
+        Meses sem registro são preenchidos com os vizinhos na ordem das linhas;
+        com `group_col` (painel de vários SKUs ordenado por data em cada SKU),
+        o preenchimento fica dentro de cada grupo, como na série individual.
+        """
         df = df.copy()
         df[date_col] = pd.to_datetime(df[date_col])
         
-        # Busca todas as features disponíveis
-        features = self.db.query(FeatureMetadata).all()
+        # Busca todas as features disponíveis (tabelas em cache por versão)
+        if feature_index is None:
+            feature_index = CustomFeatureIndex.load(self.db)
         
-        if not features:
+        if not feature_index.tables:
             print("⚠️ Nenhuma feature externa encontrada no banco")
             return df
         
-        print(f"🔍 Encontradas {len(features)} features externas")
+        print(f"🔍 Encontradas {len(feature_index.tables)} features externas")
         
-        for feature in features:
-            try:
-                # Lê a tabela de feature do banco
-                query = text(f"SELECT * FROM {feature.table_name}")
-                feature_df = pd.read_sql(query, self.db.bind)
-                
-                # Normaliza a coluna de data
-                feature_df['date'] = pd.to_datetime(feature_df['date'])
-                
-                # Cria year_month para merge
-                df['year_month'] = df[date_col].dt.to_period('M')
-                feature_df['year_month'] = feature_df['date'].dt.to_period('M')
-                
-                # Agrupa por mês (caso tenha múltiplos valores)
-                value_cols = [col for col in feature_df.columns if col not in ['date', 'year_month']]
-                
-                for col in value_cols:
-                    feature_monthly = feature_df.groupby('year_month')[col].mean().reset_index()
-                    feature_monthly.rename(columns={col: f"{feature.feature_name}_{col}"}, inplace=True)
-                    
-                    # Merge com o dataframe principal
-                    df = df.merge(feature_monthly, on='year_month', how='left')
-                    
-                    # Preenche valores faltantes
-                    df[f"{feature.feature_name}_{col}"] = df[f"{feature.feature_name}_{col}"].fillna(method='ffill').fillna(method='bfill')
-                
-                print(f"✅ Feature '{feature.feature_name}' adicionada com sucesso")
-                
-            except Exception as e:
-                print(f"⚠️ Erro ao adicionar feature '{feature.feature_name}': {str(e)}")
-                continue
-        
-        # Remove coluna auxiliar
-        df = df.drop('year_month', axis=1)
-        
-        return df
-    def get_future_custom_features(self, future_date, df_enriched):
-        """Busca valores de features externas para uma data futura."""
-        features = self.db.query(FeatureMetadata).all()
-        feature_values = {}
+        # Médias mensais de todas as features de uma vez; meses faltantes
+        # são preenchidos com os vizinhos, como no merge coluna a coluna
+        custom_block = feature_index.monthly_block(df[date_col])
+        if group_col is None:
+            custom_block = custom_block.ffill().bfill()
+        else:
+            keys = df[group_col].to_numpy()
+            custom_block = custom_block.groupby(keys, sort=False).ffill().groupby(keys, sort=False).bfill()
+        df = pd.concat([df.reset_index(drop=True), custom_block], axis=1)
         
-        for feature in features:
-            try:
-                query = text(f"""
-                    SELECT * FROM {feature.table_name} 
-                    WHERE date <= :future_date 
-                    ORDER BY date DESC 
-                    LIMIT 1
-                """)
-                result = self.db.execute(query, {"future_date": future_date}).fetchone()
-                
-                if result:
-                    # Usa _mapping para acessar as colunas corretamente
-                    result_dict = dict(result._mapping)
-                    for col, value in result_dict.items():
-                        if col != 'date':
-                            feature_values[f"{feature.feature_name}_{col}"] = value
-                else:
-                    # NÃO encontrou dados futuros, usa último valor histórico
-                    for col in feature.columns:
-                        if col != 'date':
-                            feature_col_name = f"{feature.feature_name}_{col}"
-                            if feature_col_name in df_enriched.columns:
-                                feature_values[feature_col_name] = df_enriched[feature_col_name].iloc[-1]
-                            else:
-                                feature_values[feature_col_name] = 0
-                                
-            except Exception as e:
-                # Em caso de erro, usa último valor histórico como fallback
-                for col in feature.columns:
-                    if col != 'date':
-                        feature_col_name = f"{feature.feature_name}_{col}"
-                        if feature_col_name in df_enriched.columns:
-                            feature_values[feature_col_name] = df_enriched[feature_col_name].iloc[-1]
-                        else:
-                            feature_values[feature_col_name] = 0
+        for table in feature_index.tables:
+            if table['dates'] is not None:
+                print(f"✅ Feature '{table['feature_name']}' adicionada com sucesso")
         
-        return feature_values
+        return df
+    
+    def get_future_custom_features(self, future_dates, histories, feature_index=None):
+        """
+        Busca valores de features externas para as datas futuras.
+
+        Usa o índice as-of em memória (último registro com date <= data); sem
+        registro até a data, repete o último valor histórico da série (ou 0).
+
+        Args:
+            future_dates: Matriz de datas (n_séries x horizonte)
+            histories: df_enriched de cada série, na mesma ordem
+            feature_index: CustomFeatureIndex já carregado (se None, carrega)
+
+        Returns:
+            Dict coluna -> matriz (n_séries x horizonte)
+        """
+        if feature_index is None:
+            feature_index = CustomFeatureIndex.load(self.db)
+
+        fallback = {
+            col: np.array([[df[col].iloc[-1] if col in df.columns else 0] for df in histories], dtype=float)
+            for col in feature_index.columns
+        }
+        return feature_index.asof(future_dates, fallback)
 
     @staticmethod
     def calculate_metrics(y_true, y_pred):
@@ -230,7 +213,75 @@ class XGBoostService:
         }
 
     @staticmethod
-    def calculate_metrics_aggregated(df, y_true_col='y', y_pred_col='yhat', group_by=None):
+    def calculate_metrics_by_group(keys, y_true, y_pred):
+        """
+        Mesmas métricas de `calculate_metrics`, para todos os grupos de uma vez.
+
+        As somas por grupo seguem a ordem original das linhas (GroupedStats),
+        com a mesma soma em pares do NumPy, e o naive é o shift(1) + bfill de
+        cada grupo; os valores batem com chamar calculate_metrics por grupo.
+
+        Args:
+            keys: Grupo de cada linha (chaves nulas ficam fora, como no groupby)
+            y_true, y_pred: Valores reais e previstos de cada linha
+
+        Returns:
+            Lista de dicts (grupo, métricas, n_observations) na ordem das chaves
+        """
+        y_true = np.asarray(y_true, dtype=np.float64)
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        stats = GroupedStats(keys, y_true)
+        n = stats.sizes
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            error = y_pred - y_true
+            sum_true = stats.group_sums(y_true)
+            sum_error = stats.group_sums(error)
+            mae = stats.group_sums(np.abs(y_true - y_pred)) / n
+            mse = stats.group_sums((y_true - y_pred) ** 2) / n
+            ape = stats.group_sums(np.abs((y_true - y_pred) / (y_true + 1e-10))) / n
+
+            wmape = stats.group_sums(np.abs(y_true - y_pred)) / sum_true * 100
+            bias = sum_error / n
+            bias_pct = (sum_error / sum_true) * 100
+
+            # Naive: valor anterior do próprio grupo (o primeiro repete o seguinte)
+            rows = stats.rows_original
+            codes = stats.codes[rows]
+            naive = pd.Series(y_true[rows]).groupby(codes).shift(1).groupby(codes).bfill().to_numpy()
+            naive_error = np.empty(len(y_true))
+            naive_error[rows] = np.abs(y_true[rows] - naive)
+            # Média do pandas: ignora NaN (grupo de uma linha fica sem naive)
+            valid = ~np.isnan(naive_error)
+            mae_naive = stats.group_sums(np.where(valid, naive_error, 0.0)) / stats.group_sums(valid.astype(np.float64))
+            fva = ((mae_naive - mae) / mae_naive) * 100
+
+            rmse = np.sqrt(mse)
+            mape = ape * 100
+
+        # np.round vetorizado é o mesmo arredondamento do round() de um np.float64
+        columns = {
+            'WMAPE (%)': np.round(wmape, 2),
+            'Bias': np.round(bias, 2),
+            'Bias (%)': np.round(bias_pct, 2),
+            'FVA (%)': np.round(fva, 2),
+            'MAE': np.round(mae, 2),
+            'RMSE': np.round(rmse, 2),
+            'MAPE (%)': np.round(mape, 2),
+        }
+
+        results = []
+        for g in pd.Index(stats.keys).argsort():
+            item = {'group': stats.keys[g]}
+            item.update((name, values[g]) for name, values in columns.items())
+            if not mae_naive[g] > 0:
+                item['FVA (%)'] = 0
+            item['n_observations'] = int(n[g])
+            results.append(item)
+        return results
+
+    @staticmethod
+    def calculate_metrics_aggregated(df, y_true_col='y', y_pred_col='yhat', group_by=None, metrics_global=None):
         if group_by is None:
             y_true = df[y_true_col].values
             y_pred = df[y_pred_col].values
@@ -245,24 +296,19 @@ class XGBoostService:
             if group_by not in df.columns:
                 raise ValueError(f"Coluna '{group_by}' não encontrada no DataFrame")
             
-            results = []
-            
-            for group_name, group_df in df.groupby(group_by):
-                y_true = group_df[y_true_col].values
-                y_pred = group_df[y_pred_col].values
-                metrics = XGBoostService.calculate_metrics(y_true, y_pred)
-                
-                results.append({
-                    group_by: group_name,
-                    **metrics,
-                    'n_observations': len(group_df)
-                })
+            results = [
+                {group_by: item.pop('group'), **item}
+                for item in XGBoostService.calculate_metrics_by_group(
+                    df[group_by], df[y_true_col].values, df[y_pred_col].values
+                )
+            ]
             
             results_df = pd.DataFrame(results).sort_values('WMAPE (%)', ascending=False)
             
-            y_true_all = df[y_true_col].values
-            y_pred_all = df[y_pred_col].values
-            metrics_global = XGBoostService.calculate_metrics(y_true_all, y_pred_all)
+            if metrics_global is None:
+                y_true_all = df[y_true_col].values
+                y_pred_all = df[y_pred_col].values
+                metrics_global = XGBoostService.calculate_metrics(y_true_all, y_pred_all)
             
             return {
                 'metrics_by_group': results_df.to_dict('records'),
@@ -281,10 +327,12 @@ class XGBoostService:
             df, y_true_col, y_pred_col, group_by=None
         )
         
+        # Métricas globais calculadas uma vez e reaproveitadas por coluna
         for col in group_columns:
             if col in df.columns:
                 results[col.lower()] = XGBoostService.calculate_metrics_aggregated(
-                    df, y_true_col, y_pred_col, group_by=col
+                    df, y_true_col, y_pred_col, group_by=col,
+                    metrics_global=results['global']['metrics_global']
                 )
         
         return results
@@ -299,9 +347,7 @@ class XGBoostService:
             }
         
         y = forecast_df['yhat'].values
-        X = np.arange(len(y))
-        A = np.vstack([X, np.ones(len(X))]).T
-        slope, intercept = np.linalg.lstsq(A, y, rcond=None)[0]
+        slope = linear_slope(y)
         
         first_value = y[0]
         last_value = y[-1]
@@ -325,6 +371,15 @@ class XGBoostService:
     def make_prediction(self, df, sku=None, periods=12, outlier_method='iqr', outlier_threshold=1.5, time=None, aggregation_info=None):
         time = Time()
 
+        fitted = self._fit_series(df, sku=sku, outlier_method=outlier_method, outlier_threshold=outlier_threshold)
+        fitted['time'] = time
+
+        forecast_data = self._forecast_lockstep([fitted], periods)[0]
+
+        return self._finalize_prediction(fitted, forecast_data)
+
+    def _prepare_series(self, df, sku=None, outlier_method='iqr', outlier_threshold=1.5, feature_index=None):
+        """Filtra o SKU (ou usa o agregado), trata outliers e gera as features."""
         if sku is not None:
             if "SKU" not in df.columns:
                 raise ValueError("DataFrame deve conter coluna 'SKU' quando sku é especificado")
@@ -345,7 +400,25 @@ class XGBoostService:
 
         df_enriched = self.enrich_features(df_filtered, target='Quantidade', date_col='Data')
         df_enriched = self.add_external_regressors(df_enriched, date_col='Data')
-        df_enriched = self.add_custom_features(df_enriched, date_col='Data')
+        df_enriched = self.add_custom_features(df_enriched, date_col='Data', feature_index=feature_index)
+
+        return df_filtered, df_enriched
+
+    def _fit_series(self, df, sku=None, outlier_method='iqr', outlier_threshold=1.5, feature_index=None,
+                    n_threads=None):
+        """
+        Prepara a série e treina o XGBoost com split temporal 80/20.
+
+        Args:
+            feature_index: CustomFeatureIndex já carregado (se None, carrega);
+                obrigatório quando chamado fora da thread da sessão de banco
+            n_threads: Threads do XGBoost deste modelo (None = xgb_threads)
+
+        Returns:
+            Dict com o modelo treinado, as colunas de features, as métricas de
+            teste e os dados necessários para prever e persistir o resultado.
+        """
+        df_filtered, df_enriched = self._prepare_series(df, sku, outlier_method, outlier_threshold, feature_index)
 
         split_date = df_enriched['Data'].quantile(0.8)
         train = df_enriched[df_enriched['Data'] < split_date]
@@ -366,6 +439,7 @@ class XGBoostService:
             max_depth=5,
             early_stopping_rounds=50,
             random_state=42,
+            n_jobs=n_threads or self.xgb_threads,
         )
 
         model.fit(X_train, y_train, eval_set=[(X_train, y_train), (X_test, y_test)], verbose=False)
@@ -384,126 +458,117 @@ class XGBoostService:
         for idx, row in feature_importance.head(10).iterrows():
             print(f"  {row['feature']}: {row['importance_pct']}%")
 
-        last_date = df_enriched['Data'].max()
-        future_dates = pd.date_range(start=last_date + pd.DateOffset(months=1), periods=periods, freq='MS')
-        
-        max_future_date = future_dates[-1]
-        incc_future = get_incc_with_forecast(end_date=max_future_date, forecast_periods=730)
-        selic_future = get_selic_with_forecast(end_date=max_future_date)
-        
-        incc_future['ds'] = pd.to_datetime(incc_future['ds'])
-        selic_future['ds'] = pd.to_datetime(selic_future['ds'])
-        incc_future['year_month'] = incc_future['ds'].dt.to_period('M')
-        selic_future['year_month'] = selic_future['ds'].dt.to_period('M')
-        
-        incc_monthly = incc_future.groupby('year_month')['incc'].mean().to_dict()
-        selic_monthly = selic_future.groupby('year_month')['selic'].mean().to_dict()
-        
-        historical_quantities = df_enriched['Quantidade'].tolist()
-        future_predictions = []
+        return {
+            'sku': sku,
+            'df_filtered': df_filtered,
+            'df_enriched': df_enriched,
+            'model': model,
+            'feature_cols': feature_cols,
+            'metrics': metrics,
+            'test': test,
+            'y_test': y_test,
+            'y_pred_test': y_pred_test,
+            'feature_importance': feature_importance,
+        }
 
-        for i in range(periods):
-            future_date = future_dates[i]
-            year_month = future_date.to_period('M')
-            
-            lag_1 = historical_quantities[-1] if len(historical_quantities) >= 1 else 0
-            lag_3 = historical_quantities[-3] if len(historical_quantities) >= 3 else 0
-            lag_6 = historical_quantities[-6] if len(historical_quantities) >= 6 else 0
-            lag_12 = historical_quantities[-12] if len(historical_quantities) >= 12 else 0
-            
-            recent_3 = historical_quantities[-3:] if len(historical_quantities) >= 3 else historical_quantities
-            recent_6 = historical_quantities[-6:] if len(historical_quantities) >= 6 else historical_quantities
-            recent_12 = historical_quantities[-12:] if len(historical_quantities) >= 12 else historical_quantities
-            
-            rolling_mean_3 = np.mean(recent_3) if len(recent_3) > 0 else 0
-            rolling_mean_6 = np.mean(recent_6) if len(recent_6) > 0 else 0
-            rolling_mean_12 = np.mean(recent_12) if len(recent_12) > 0 else 0
-            
-            rolling_std_3 = np.std(recent_3) if len(recent_3) > 1 else 0
-            rolling_std_6 = np.std(recent_6) if len(recent_6) > 1 else 0
-            rolling_std_12 = np.std(recent_12) if len(recent_12) > 1 else 0
-            
-            growth_rate_1 = (lag_1 - historical_quantities[-2]) / historical_quantities[-2] if len(historical_quantities) >= 2 and historical_quantities[-2] != 0 else 0
-            growth_rate_3 = (lag_1 - historical_quantities[-4]) / historical_quantities[-4] if len(historical_quantities) >= 4 and historical_quantities[-4] != 0 else 0
-            growth_rate_6 = (lag_1 - historical_quantities[-7]) / historical_quantities[-7] if len(historical_quantities) >= 7 and historical_quantities[-7] != 0 else 0
-            
-            if len(recent_6) >= 3:
-                y = np.array(recent_6)
-                X = np.arange(len(y))
-                A = np.vstack([X, np.ones(len(X))]).T
-                trend_6, _ = np.linalg.lstsq(A, y, rcond=None)[0]
-            else:
-                trend_6 = 0
-            
-            year = future_date.year
-            month = future_date.month
-            quarter = (month - 1) // 3 + 1
-            day_of_year = future_date.dayofyear
-            week_of_year = future_date.isocalendar()[1]
-            
-            month_sin = np.sin(2 * np.pi * month / 12)
-            month_cos = np.cos(2 * np.pi * month / 12)
-            quarter_sin = np.sin(2 * np.pi * quarter / 4)
-            quarter_cos = np.cos(2 * np.pi * quarter / 4)
-            
-            feriados = ['01-01', '04-21', '05-01', '09-07', '10-12', '11-02', '11-15', '12-25']
-            is_holiday = 1 if future_date.strftime('%m-%d') in feriados else 0
-            
-            incc_value = incc_monthly.get(year_month, df_enriched['incc'].iloc[-1])
-            selic_value = selic_monthly.get(year_month, df_enriched['selic'].iloc[-1])
-
-            # Busca valores das features customizadas para a data futura
-            custom_features = self.get_future_custom_features(future_date, df_enriched)
-
-            # Cria dicionário base com todas as features
-            future_data = {
-                'lag_1': lag_1,
-                'lag_3': lag_3,
-                'lag_6': lag_6,
-                'lag_12': lag_12,
-                'rolling_mean_3': rolling_mean_3,
-                'rolling_mean_6': rolling_mean_6,
-                'rolling_mean_12': rolling_mean_12,
-                'rolling_std_3': rolling_std_3,
-                'rolling_std_6': rolling_std_6,
-                'rolling_std_12': rolling_std_12,
-                'growth_rate_1': growth_rate_1,
-                'growth_rate_3': growth_rate_3,
-                'growth_rate_6': growth_rate_6,
-                'year': year,
-                'month': month,
-                'quarter': quarter,
-                'day_of_year': day_of_year,
-                'week_of_year': week_of_year,
-                'month_sin': month_sin,
-                'month_cos': month_cos,
-                'quarter_sin': quarter_sin,
-                'quarter_cos': quarter_cos,
-                'is_holiday': is_holiday,
-                'trend_6': trend_6,
-                'incc': incc_value,
-                'selic': selic_value
+    def _forecast_lockstep(self, fitted_series, periods):
+        """
+        Previsão recursiva de várias séries em lockstep.
+
+        No passo h, as features de todas as séries são montadas numa única
+        matriz e o `predict` é chamado uma vez por modelo (séries que
+        compartilham o mesmo modelo são previstas juntas).
+
+        Args:
+            fitted_series: Lista de dicts retornados por `_fit_series`
+            periods: Horizonte de previsão (meses)
+
+        Returns:
+            Lista de DataFrames ('ds', 'yhat'), na mesma ordem de `fitted_series`
+        """
+        for fitted in fitted_series:
+            last_date = fitted['df_enriched']['Data'].max()
+            fitted['future_dates'] = pd.date_range(start=last_date + pd.DateOffset(months=1), periods=periods, freq='MS')
+
+        max_future_date = max(fitted['future_dates'][-1] for fitted in fitted_series)
+        exogenous_table = get_monthly_exogenous(max_future_date)
+        feature_index = CustomFeatureIndex.load(self.db)
+
+        # Séries com as mesmas colunas compartilham uma matriz de features
+        column_groups = {}
+        for i, fitted in enumerate(fitted_series):
+            column_groups.setdefault(tuple(fitted['feature_cols']), []).append(i)
+
+        predictions = [[] for _ in fitted_series]
+
+        for feature_cols, members in column_groups.items():
+            series = [fitted_series[i] for i in members]
+            feature_state = BatchForecastFeatureState(
+                [fitted['df_enriched']['Quantidade'].to_numpy() for fitted in series], feature_cols
+            )
+
+            model_groups = {}
+            for row, fitted in enumerate(series):
+                model_groups.setdefault(id(fitted['model']), (fitted['model'], []))[1].append(row)
+
+            # Fora da tabela, repete o último valor conhecido de cada série
+            last_exogenous = {
+                col: np.array([fitted['df_enriched'][col].iloc[-1] for fitted in series])
+                for col in MonthlyExogenousTable.COLUMNS
             }
 
-            # Adiciona as custom features ao dicionário
-            future_data.update(custom_features)
+            # Features customizadas de todo o horizonte numa única consulta ao índice
+            custom_features = self.get_future_custom_features(
+                np.array([fitted['future_dates'] for fitted in series]),
+                [fitted['df_enriched'] for fitted in series],
+                feature_index,
+            )
+            # Features fixas da série (ex.: codificação do SKU no modelo global)
+            static_features = pd.DataFrame(
+                [fitted.get('static_features', {}) for fitted in series], index=range(len(series))
+            )
 
-            # Cria o DataFrame
-            future_row = pd.DataFrame([future_data])
-            
-            X_future = future_row[feature_cols]
-            pred = model.predict(X_future)[0]
-            pred = max(0, pred)
-            
-            future_predictions.append({
-                'ds': future_date,
-                'yhat': pred
-            })
-            
-            historical_quantities.append(pred)
+            for h in range(periods):
+                future_dates = [fitted['future_dates'][h] for fitted in series]
+
+                exogenous = {
+                    col: exogenous_table.lookup(col, future_dates, fill_value=last_exogenous[col])
+                    for col in MonthlyExogenousTable.COLUMNS
+                }
+                exogenous.update({col: values[:, h] for col, values in custom_features.items()})
+                exogenous.update({col: static_features[col].to_numpy() for col in static_features.columns})
+                X_future = feature_state.next_features(future_dates, exogenous)
+
+                preds = np.empty(len(series))
+                for model, rows in model_groups.values():
+                    preds[rows] = model.predict(X_future[rows])
+                preds = np.maximum(preds, 0)
+
+                for row, i in enumerate(members):
+                    predictions[i].append({
+                        'ds': future_dates[row],
+                        'yhat': preds[row]
+                    })
+
+                feature_state.push(preds)
+
+        return [pd.DataFrame(future_predictions) for future_predictions in predictions]
+
+    def _finalize_prediction(self, fitted, forecast_data, run_id=None):
+        """
+        Calcula tendência, persiste a execução/métricas e monta o retorno.
+        Com `run_id`, a série entra numa execução já criada (ex.: lote).
+        """
+        sku = fitted['sku']
+        df_filtered = fitted['df_filtered']
+        metrics = fitted['metrics']
+        test = fitted['test']
+        y_test = fitted['y_test']
+        y_pred_test = fitted['y_pred_test']
+        feature_importance = fitted['feature_importance']
+        time = fitted['time']
+        model_name = fitted.get('model_name', 'XGBoost')
 
-        forecast_data = pd.DataFrame(future_predictions)
-        
         trend_info = self.calculate_trend(forecast_data)
 
         identifier = sku if sku else "aggregated"
@@ -511,12 +576,13 @@ class XGBoostService:
             num_skus = int(df_filtered['SKU'].nunique())
         else:
             num_skus = 1
-        run_id = self.saver.save_forecast_run("XGBoost", num_skus, identifier)
+        if run_id is None:
+            run_id = self.saver.save_forecast_run(model_name, num_skus, identifier)
         
         if sku:
             self.saver.salvar_metricas_sku(
                 sku=sku,
-                ds_modelo="XGBoost",
+                ds_modelo=model_name,
                 wmape=metrics['WMAPE (%)'],
                 bias=metrics['Bias'],
                 bias_pct=metrics['Bias (%)'],
@@ -557,29 +623,217 @@ class XGBoostService:
 
         return run_id, forecast_data, time_elapsed, result_metrics
 
-    def predict_all_skus(self, df, periods=12, outlier_method='iqr', outlier_threshold=1.5):
+    def predict_batch(self, series, run_id, n_jobs=None, outlier_method='iqr', outlier_threshold=1.5):
+        """
+        Treina e prevê várias séries (SKUs ou agregados) numa única execução.
+
+        Os modelos são treinados em paralelo (threads; o XGBoost libera o GIL
+        e cada modelo usa cpu_count // n_jobs threads) e as previsões de
+        mesmo horizonte saem juntas em lockstep. Todas as séries são gravadas
+        na execução `run_id`.
+
+        Args:
+            series: Lista de (df, sku ou None, períodos)
+            run_id: Execução já criada (save_forecast_run) que agrupa o lote
+            n_jobs: Séries treinadas ao mesmo tempo (None = núcleos disponíveis)
+
+        Returns:
+            Lista, na ordem de `series`, de (resultado de make_prediction ou
+            None, mensagem de erro ou None)
+        """
+        results = [(None, None)] * len(series)
+        if not series:
+            return results
+
+        n_workers = min(len(series), n_jobs or os.cpu_count() or 1)
+        xgb_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        # Carregado aqui: a sessão de banco não pode ser usada pelas threads
+        feature_index = CustomFeatureIndex.load(self.db)
+
+        def fit(df, sku):
+            time = Time()
+            fitted = self._fit_series(
+                df, sku=sku,
+                outlier_method=outlier_method,
+                outlier_threshold=outlier_threshold,
+                feature_index=feature_index,
+                n_threads=xgb_threads,
+            )
+            fitted['time'] = time
+            return fitted
+
+        print(f"⚙️ Treinando {len(series)} séries em {n_workers} threads ({xgb_threads} threads XGBoost cada)")
+
+        fitted_by_periods = {}
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(fit, df, sku): (i, periods)
+                for i, (df, sku, periods) in enumerate(series)
+            }
+            for future in as_completed(futures):
+                i, periods = futures[future]
+                try:
+                    fitted_by_periods.setdefault(periods, []).append((i, future.result()))
+                except Exception as e:
+                    results[i] = (None, str(e))
+
+        for periods, members in fitted_by_periods.items():
+            members.sort(key=lambda member: member[0])
+            print(f"\n🔮 Previsão em lockstep de {len(members)} séries por {periods} períodos")
+            try:
+                forecast_frames = self._forecast_lockstep([fitted for _, fitted in members], periods)
+            except Exception:
+                # Uma série problemática não derruba as demais: prevê uma a uma
+                forecast_frames = []
+                for i, fitted in members:
+                    try:
+                        forecast_frames.append(self._forecast_lockstep([fitted], periods)[0])
+                    except Exception as e:
+                        forecast_frames.append(None)
+                        results[i] = (None, str(e))
+
+            for (i, fitted), forecast_data in zip(members, forecast_frames):
+                if forecast_data is None:
+                    continue
+                try:
+                    results[i] = (self._finalize_prediction(fitted, forecast_data, run_id=run_id), None)
+                except Exception as e:
+                    results[i] = (None, str(e))
+
+        return results
+
+    def predict_all_skus(self, df, periods=12, outlier_method='iqr', outlier_threshold=1.5, lockstep=False,
+                         training_mode='per_sku', pool_by=None, n_jobs=1, on_result=None, on_progress=None):
+        """
+        Gera previsões para todos os SKUs.
+
+        Args:
+            lockstep: Se True, treina todos os modelos primeiro e depois
+                avança o horizonte de todos os SKUs juntos (uma matriz de
+                features por passo em vez de uma linha por SKU)
+            training_mode: 'per_sku' (um XGBoost por SKU) ou 'global' (um
+                modelo compartilhado treinado no painel de todos os SKUs)
+            pool_by: No modo global, coluna para treinar um modelo por grupo
+                ('Familia' ou 'Processo'); None treina um único modelo
+            n_jobs: Processos para o modo por SKU (sem lockstep). Cada worker
+                abre sua própria sessão de banco e limita as threads do XGBoost
+                a cpu_count // n_jobs. None usa todos os núcleos.
+            on_result: Callback chamado a cada SKU concluído, na ordem de
+                término, com (sku, resultado de make_prediction, erro)
+            on_progress: Callback chamado durante o treino separado da
+                previsão (lockstep e modo global), com (concluídos, total,
+                mensagem): por SKU treinado ou por rodadas do modelo global
+
+        Exceções levantadas pelos callbacks (ex.: cancelamento da tarefa) não
+        contam como falha de SKU: interrompem a execução.
+        """
+        if training_mode not in ('per_sku', 'global'):
+            raise ValueError(f"Modo de treino '{training_mode}' não reconhecido. Use: 'per_sku', 'global'")
+
         skus = np.sort(df["SKU"].unique())
 
-        run_id = self.saver.save_forecast_run("XGBoost", len(skus), None)
+        model_name = "XGBoost Global" if training_mode == 'global' else "XGBoost"
+        run_id = self.saver.save_forecast_run(model_name, len(skus), None)
 
         print(f"Iniciando as previsões para {len(skus)} SKUs")
 
         forecasts = {}
         failed_skus = []
 
-        for i, sku in enumerate(skus, 1):
+        if training_mode == 'global':
+            fitted_series = self._fit_global(
+                df, skus,
+                outlier_method=outlier_method,
+                outlier_threshold=outlier_threshold,
+                pool_by=pool_by,
+                on_progress=on_progress
+            )
+        elif lockstep:
+            fitted_series = []
+            for i, sku in enumerate(skus, 1):
+                if on_progress:
+                    on_progress(i - 1, len(skus), f"Treinando SKU {i}/{len(skus)}")
+                try:
+                    print(f"\n--- Treinando SKU {i}/{len(skus)}: {sku} ---")
+                    time = Time()
+                    fitted = self._fit_series(
+                        df, sku=sku,
+                        outlier_method=outlier_method,
+                        outlier_threshold=outlier_threshold
+                    )
+                    fitted['time'] = time
+                    fitted_series.append(fitted)
+
+                except Exception as e:
+                    failed_skus.append((sku, str(e)))
+                    continue
+
+            if on_progress:
+                on_progress(len(skus), len(skus), f"{len(skus)} SKUs treinados")
+        else:
+            fitted_series = []
+            n_workers = os.cpu_count() if n_jobs is None else n_jobs
+
+            if n_workers > 1:
+                # closing: se on_result interromper, os SKUs ainda na fila são descartados
+                with closing(self._predict_skus_parallel(
+                    df, skus, periods, outlier_method, outlier_threshold, n_workers
+                )) as results:
+                    for sku, forecast, error in results:
+                        if error is None:
+                            forecasts[sku] = forecast
+                        else:
+                            failed_skus.append((sku, error))
+                        if on_result:
+                            on_result(sku, forecast, error)
+            else:
+                for i, sku in enumerate(skus, 1):
+                    forecast, error = None, None
+                    try:
+                        print(f"\n--- Processando SKU {i}/{len(skus)}: {sku} ---")
+                        forecast = self.make_prediction(
+                            df, sku=sku, periods=periods, 
+                            outlier_method=outlier_method, 
+                            outlier_threshold=outlier_threshold
+                        )
+                        forecasts[sku] = forecast
+
+                    except Exception as e:
+                        error = str(e)
+                        failed_skus.append((sku, error))
+
+                    # Fora do try: a exceção do callback interrompe o loop
+                    if on_result:
+                        on_result(sku, forecast, error)
+
+        if fitted_series:
+            print(f"\n🔮 Previsão em lockstep de {len(fitted_series)} SKUs por {periods} períodos")
+            forecast_errors = [None] * len(fitted_series)
             try:
-                print(f"\n--- Processando SKU {i}/{len(skus)}: {sku} ---")
-                forecast = self.make_prediction(
-                    df, sku=sku, periods=periods, 
-                    outlier_method=outlier_method, 
-                    outlier_threshold=outlier_threshold
-                )
-                forecasts[sku] = forecast
+                forecast_frames = self._forecast_lockstep(fitted_series, periods)
+            except Exception:
+                # Um SKU problemático não derruba o catálogo: prevê um a um
+                forecast_frames = []
+                for k, fitted in enumerate(fitted_series):
+                    try:
+                        forecast_frames.append(self._forecast_lockstep([fitted], periods)[0])
+                    except Exception as e:
+                        forecast_frames.append(None)
+                        forecast_errors[k] = str(e)
 
-            except Exception as e:
-                failed_skus.append((sku, str(e)))
-                continue
+            for fitted, forecast_data, error in zip(fitted_series, forecast_frames, forecast_errors):
+                forecast = None
+                if error is None:
+                    try:
+                        forecast = self._finalize_prediction(fitted, forecast_data)
+                        forecasts[fitted['sku']] = forecast
+                    except Exception as e:
+                        error = str(e)
+                if error is not None:
+                    failed_skus.append((fitted['sku'], error))
+
+                if on_result:
+                    on_result(fitted['sku'], forecast, error)
 
         print("\nProcesso concluído!")
         print(f"SKUs processados com sucesso: {len(forecasts)}")
@@ -592,6 +846,184 @@ class XGBoostService:
 
         return run_id, failed_skus
 
+    @staticmethod
+    def _predict_skus_parallel(df, skus, periods, outlier_method, outlier_threshold, n_workers):
+        """
+        Executa make_prediction por SKU em processos separados.
+
+        Cada worker recebe só as linhas do seu SKU, abre a própria sessão de
+        banco e usa cpu_count // n_workers threads no XGBoost. Os resultados
+        são devolvidos (gerador) à medida que os SKUs terminam.
+
+        Yields:
+            (sku, resultado de make_prediction ou None, mensagem de erro ou None)
+        """
+        xgb_threads = max(1, (os.cpu_count() or 1) // n_workers)
+        print(f"⚙️ Executando em {n_workers} processos ({xgb_threads} threads XGBoost cada)")
+
+        # spawn: fork + OpenMP do XGBoost pode travar, e cada worker cria seu engine
+        context = multiprocessing.get_context("spawn")
+
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=context,
+            initializer=_init_prediction_worker,
+            initargs=(xgb_threads,),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _predict_sku_worker, df_sku, sku, periods, outlier_method, outlier_threshold
+                ): sku
+                for sku, df_sku in df[df["SKU"].isin(skus)].groupby("SKU")
+            }
+
+            try:
+                for i, future in enumerate(as_completed(futures), 1):
+                    sku = futures[future]
+                    try:
+                        forecast = future.result()
+                    except Exception as e:
+                        yield sku, None, str(e)
+                        continue
+                    print(f"--- SKU {i}/{len(futures)} concluído: {sku} ---")
+                    yield sku, forecast, None
+            finally:
+                # Gerador fechado antes do fim (ex.: tarefa cancelada): o
+                # __exit__ só espera os SKUs em execução, não os da fila
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fit_global(self, df, skus, outlier_method='iqr', outlier_threshold=1.5, pool_by=None, on_progress=None):
+        """
+        Treina um XGBoost compartilhado no painel de todos os SKUs.
+
+        O painel é enriquecido de uma vez (enrich_features agrupado por SKU) e
+        recebe codificações do SKU (`sku_code` e `sku_level`, a média do SKU no
+        período de treino), para que o modelo diferencie o nível de cada série.
+        Com `pool_by`, treina um modelo por valor da coluna (Familia/Processo).
+        `on_progress(concluídos, total, mensagem)` recebe os modelos treinados
+        (fração do modelo atual pelas rodadas de boosting).
+
+        Returns:
+            Lista de dicts no formato de `_fit_series`, um por SKU, que
+            compartilham o mesmo objeto de modelo dentro de cada grupo.
+        """
+        if pool_by is not None and pool_by not in df.columns:
+            raise ValueError(f"Coluna '{pool_by}' não encontrada no DataFrame")
+
+        time = Time()
+        df_panel = df[df["SKU"].isin(skus)]
+
+        if outlier_method != 'none':
+            df_panel = self._remove_outliers_by_sku(df_panel, method=outlier_method, threshold=outlier_threshold)
+
+        print(f"📊 Painel preparado: {len(df_panel)} pontos de dados, {df_panel['SKU'].nunique()} SKUs")
+
+        panel = self.enrich_features(df_panel, target='Quantidade', date_col='Data', group_col='SKU')
+        panel = self.add_external_regressors(panel, date_col='Data')
+        panel = self.add_custom_features(panel, date_col='Data', group_col='SKU')
+
+        # Corte 80/20 dentro de cada SKU, como em _fit_series: um corte único
+        # no painel deixaria sem teste os SKUs cujo histórico acaba antes dele
+        split_by_sku = panel.groupby('SKU')['Data'].quantile(0.8)
+        is_train = panel['Data'] < panel['SKU'].map(split_by_sku)
+
+        sku_codes = pd.Categorical(panel['SKU'], categories=skus).codes
+        train_level = panel.loc[is_train].groupby('SKU')['Quantidade'].mean()
+        panel['sku_code'] = sku_codes
+        panel['sku_level'] = panel['SKU'].map(train_level).fillna(panel.loc[is_train, 'Quantidade'].mean())
+
+        feature_cols = [col for col in panel.columns
+                        if col not in ['Data', 'SKU', 'Quantidade', 'Familia', 'Processo', 'Classe_ABC',
+                                      'Percentual_Acumulado', 'Quantidade_Total']]
+
+        if pool_by is None:
+            pools = [("global", panel)]
+        else:
+            pools = list(panel.groupby(pool_by))
+
+        y_pred_panel = pd.Series(np.nan, index=panel.index)
+        pool_models = {}
+
+        for k, (pool_name, pool) in enumerate(pools):
+            train = pool[is_train.loc[pool.index]]
+            test = pool[~is_train.loc[pool.index]]
+            eval_set = [(train[feature_cols], train['Quantidade'])]
+            if not test.empty:
+                eval_set.append((test[feature_cols], test['Quantidade']))
+
+            model = XGBRegressor(
+                n_estimators=1500,
+                learning_rate=0.03,
+                max_depth=5,
+                early_stopping_rounds=50,
+                random_state=42,
+                n_jobs=self.xgb_threads,
+            )
+            if on_progress:
+                model.set_params(callbacks=[_TrainingProgress(
+                    on_progress, k, len(pools), model.n_estimators,
+                    f"Treinando modelo global '{pool_name}' ({k + 1}/{len(pools)})"
+                )])
+            model.fit(train[feature_cols], train['Quantidade'], eval_set=eval_set, verbose=False)
+
+            if not test.empty:
+                y_pred_panel.loc[test.index] = model.predict(test[feature_cols])
+            pool_models[pool_name] = model
+            print(f"🌐 Modelo global '{pool_name}': {pool['SKU'].nunique()} SKUs, {len(train)} linhas de treino")
+            if on_progress:
+                on_progress(k + 1, len(pools), f"Modelo global '{pool_name}' treinado ({k + 1}/{len(pools)})")
+
+        test_panel = panel[~is_train].copy()
+        test_panel['y'] = test_panel['Quantidade']
+        test_panel['yhat'] = y_pred_panel.loc[test_panel.index]
+
+        global_metrics = self.calculate_metrics_aggregated(test_panel, y_true_col='y', y_pred_col='yhat')
+        print(f"\n📊 WMAPE global do modelo compartilhado: {global_metrics['metrics_global']['WMAPE (%)']}%")
+        print(f"⏱️ Treino global concluído em {time.obter_tempo():.2f}s")
+
+        filtered_by_sku = dict(tuple(df_panel.groupby('SKU')))
+
+        fitted_series = []
+        for sku, df_enriched in panel.groupby('SKU', sort=True):
+            pool_name = "global" if pool_by is None else df_enriched[pool_by].iloc[0]
+            model = pool_models[pool_name]
+            test = df_enriched[~is_train.loc[df_enriched.index]]
+            y_pred_test = y_pred_panel.loc[test.index].to_numpy()
+
+            feature_importance = pd.DataFrame({
+                'feature': feature_cols,
+                'importance': model.feature_importances_
+            }).sort_values('importance', ascending=False)
+            feature_importance['importance_pct'] = (feature_importance['importance'] / feature_importance['importance'].sum() * 100).round(2)
+
+            fitted_series.append({
+                'sku': sku,
+                'df_filtered': filtered_by_sku[sku],
+                'df_enriched': df_enriched,
+                'model': model,
+                'model_name': "XGBoost Global",
+                'feature_cols': feature_cols,
+                'static_features': {
+                    'sku_code': df_enriched['sku_code'].iloc[0],
+                    'sku_level': df_enriched['sku_level'].iloc[0],
+                },
+                'metrics': self.calculate_metrics(test['Quantidade'], y_pred_test),
+                'test': test,
+                'y_test': test['Quantidade'],
+                'y_pred_test': y_pred_test,
+                'feature_importance': feature_importance,
+                'time': time,
+            })
+
+        # Todo SKU tem teste no próprio corte; WMAPE não finito só sobra para
+        # SKUs com demanda zero no teste, que ficam sinalizados no log
+        nao_finitos = [fitted['sku'] for fitted in fitted_series
+                       if not np.isfinite(fitted['metrics']['WMAPE (%)'])]
+        if nao_finitos:
+            print(f"⚠️ {len(nao_finitos)} SKUs com WMAPE não finito (demanda zero no teste): {nao_finitos[:10]}")
+
+        return fitted_series
+
     def _remove_outliers(self, df, method='iqr', threshold=1.5):
         df_clean = df.copy()
         
@@ -625,6 +1057,45 @@ class XGBoostService:
         
         print(f"🧹 Outliers removidos: {len(df) - len(df_clean)} pontos ({method})")
         return df_clean
+
+    @staticmethod
+    def _remove_outliers_by_sku(df, method='iqr', threshold=1.5):
+        """
+        `_remove_outliers` em cada SKU do painel, numa passada.
+
+        As estatísticas por SKU saem do GroupedStats (mesmos valores do
+        pandas por grupo) e as regras de descarte são as de `_remove_outliers`.
+        As linhas ficam agrupadas por SKU em ordem, como no concat por grupo.
+        """
+        stats = GroupedStats(df['SKU'], df['Quantidade'])
+        values = stats.values
+        keep = np.ones(len(df), dtype=bool)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if method == 'iqr':
+                q1, q3 = stats.quantile(0.25), stats.quantile(0.75)
+                iqr = q3 - q1
+                keep = (values >= stats.broadcast(q1 - threshold * iqr)) & (values <= stats.broadcast(q3 + threshold * iqr))
+            elif method == 'zscore':
+                mean, std = stats.broadcast(stats.mean()), stats.broadcast(stats.std())
+                skip = (std == 0) | np.isnan(std)
+                keep = skip | (np.abs((values - mean) / std) < threshold)
+            elif method == 'percentile':
+                lower = stats.broadcast(stats.quantile(threshold / 100))
+                upper = stats.broadcast(stats.quantile(1 - threshold / 100))
+                keep = (values >= lower) & (values <= upper)
+            elif method == 'mad':
+                median = stats.median()
+                mad = stats.broadcast(stats.mad(median))
+                modified_z_scores = 0.6745 * (values - stats.broadcast(median)) / mad
+                keep = (mad == 0) | (np.abs(modified_z_scores) < threshold)
+
+        # Linhas sem SKU ficam fora, como no groupby
+        keep &= stats.codes >= 0
+        df_clean = df[keep].sort_values('SKU', kind='stable').reset_index(drop=True)
+        print(f"🧹 Outliers removidos: {len(df) - len(df_clean)} pontos ({method}, {stats.n_groups} SKUs)")
+        return df_clean
+
     def apply_filters(self, df, familia=None, processo=None, abc_class=None):
         df_filtered = df.copy()
         
@@ -637,4 +1108,36 @@ class XGBoostService:
         if abc_class:
             df_filtered = df_filtered[df_filtered['Classe_ABC'].isin(abc_class)]
         
-        return df_filtered
\ No newline at end of file
+        return df_filtered
+
+
+class _TrainingProgress(TrainingCallback):
+    """Repassa as rodadas de boosting do modelo global para on_progress."""
+
+    def __init__(self, on_progress, done, total, rounds, message):
+        super().__init__()
+        self.on_progress = on_progress
+        self.done = done
+        self.total = total
+        self.rounds = rounds
+        self.message = message
+
+    def after_iteration(self, model, epoch, evals_log):
+        # Fração do modelo atual pelo máximo de rodadas (o early stopping pode parar antes)
+        self.on_progress(self.done + (epoch + 1) / self.rounds, self.total, self.message)
+        return False
+
+
+def _init_prediction_worker(xgb_threads):
+    """Inicializador dos workers de predict_all_skus: limita threads do XGBoost."""
+    XGBoostService.xgb_threads = xgb_threads
+
+
+def _predict_sku_worker(df_sku, sku, periods, outlier_method, outlier_threshold):
+    """Previsão de um SKU num worker, com sessão de banco própria."""
+    with DatabaseConfig.get_db_session() as db:
+        return XGBoostService(db).make_prediction(
+            df_sku, sku=sku, periods=periods,
+            outlier_method=outlier_method,
+            outlier_threshold=outlier_threshold
+        )
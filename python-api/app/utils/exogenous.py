@@ -0,0 +1,114 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from app.utils.incc import INCC_FILE, _file_signature, get_incc_with_forecast
+from app.utils.selic import SELIC_FILE, get_selic_with_forecast
+
+
+def month_index(dates):
+    """Índice inteiro do mês (ano*12 + mês-1) de cada data, como int64."""
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    return dates.year.to_numpy(dtype=np.int64) * 12 + dates.month.to_numpy(dtype=np.int64) - 1
+
+
+class MonthlyExogenousTable:
+    """
+    Tabela mensal imutável dos regressores externos (INCC e SELIC).
+
+    Os valores ficam em arrays contíguos indexados pelo mês (`month_index`),
+    de modo que buscar o regressor de N datas é só um `take` no array, sem
+    merge nem dicionário de Periods.
+    """
+
+    COLUMNS = ('incc', 'selic')
+
+    def __init__(self, first_month, values):
+        """
+        Args:
+            first_month: month_index do primeiro mês da tabela
+            values: Dict coluna -> array com um valor por mês consecutivo
+        """
+        self.first_month = int(first_month)
+        self._values = {}
+        for col, array in values.items():
+            array = np.array(array, dtype=float)
+            array.flags.writeable = False
+            self._values[col] = array
+        self.last_month = self.first_month + len(next(iter(self._values.values()))) - 1
+
+    @classmethod
+    def from_daily(cls, incc_data, selic_data, end_date):
+        """
+        Agrega as séries (diária do INCC, mensal da SELIC) pela média do mês,
+        do primeiro mês disponível até o mês de `end_date`.
+        """
+        monthly = {}
+        for col, data in (('incc', incc_data), ('selic', selic_data)):
+            months = month_index(data['ds'])
+            monthly[col] = pd.Series(data[col].to_numpy(dtype=float)).groupby(months).mean()
+
+        first = min(series.index.min() for series in monthly.values())
+        last = month_index([end_date])[0]
+        all_months = np.arange(first, last + 1)
+
+        # Meses sem observação herdam o vizinho, como o ffill/bfill do merge antigo
+        values = {
+            col: series.reindex(all_months).ffill().bfill().to_numpy()
+            for col, series in monthly.items()
+        }
+        return cls(first, values)
+
+    def covers(self, date):
+        return month_index([date])[0] <= self.last_month
+
+    def lookup(self, col, dates, fill_value=None):
+        """
+        Valor mensal de `col` para cada data.
+
+        Args:
+            col: 'incc' ou 'selic'
+            dates: Datas a consultar
+            fill_value: Valor para meses fora da tabela; se None, usa o mês
+                mais próximo (primeiro/último da tabela)
+        """
+        values = self._values[col]
+        positions = month_index(dates) - self.first_month
+        result = values[np.clip(positions, 0, len(values) - 1)]
+        if fill_value is not None:
+            outside = (positions < 0) | (positions >= len(values))
+            result = np.where(outside, fill_value, result)
+        return result
+
+
+_table_lock = threading.Lock()
+_table_cache = {}
+
+
+def get_monthly_exogenous(end_date):
+    """
+    Tabela mensal de INCC/SELIC cobrindo pelo menos até `end_date`.
+
+    É montada uma vez e reaproveitada enquanto cobrir o período pedido e as
+    planilhas de origem não mudarem; só é reconstruída (com horizonte maior)
+    quando uma data posterior é necessária.
+    """
+    end_date = pd.to_datetime(end_date)
+    signature = (_file_signature(INCC_FILE), _file_signature(SELIC_FILE))
+
+    with _table_lock:
+        table = _table_cache.get(signature)
+    if table is not None and table.covers(end_date):
+        return table
+
+    incc_data = get_incc_with_forecast(end_date=end_date, forecast_periods=730)
+    selic_data = get_selic_with_forecast(end_date=end_date)
+    table = MonthlyExogenousTable.from_daily(incc_data, selic_data, end_date)
+
+    with _table_lock:
+        _table_cache.clear()
+        _table_cache[signature] = table
+
+    print(f"📅 Tabela mensal de INCC/SELIC montada até {end_date.strftime('%Y-%m')}")
+    return table
@@ -1,3 +1,6 @@
+import hashlib
+import os
+import threading
 import warnings
 
 import pandas as pd
@@ -5,26 +8,91 @@ from statsmodels.tsa.holtwinters import ExponentialSmoothing
 
 warnings.filterwarnings("ignore")
 
+INCC_FILE = "INCC_Prophet_Format.xlsx"
+
+# Diretório opcional para persistir as projeções entre processos/reinícios
+INCC_CACHE_DIR = os.getenv("INCC_CACHE_DIR")
+
+# Cache em memória, chaveado pela assinatura do arquivo (caminho, mtime, tamanho)
+_cache_lock = threading.Lock()
+_historico_cache = {}
+_model_cache = {}
+_forecast_cache = {}
+
+
+def _file_signature(path=INCC_FILE):
+    """Identifica a versão do arquivo-fonte: muda quando ele é substituído."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def clear_incc_cache():
+    """Descarta as projeções memoizadas (o cache em disco não é apagado)."""
+    with _cache_lock:
+        _historico_cache.clear()
+        _model_cache.clear()
+        _forecast_cache.clear()
+
 
 def get_incc():
     """Carrega dados históricos do INCC"""
-    dados_incc = pd.read_excel("INCC_Prophet_Format.xlsx")
-    dados_incc["ds"] = pd.to_datetime(dados_incc["ds"])
-    dados_incc.columns = ["ds", "incc"]
-    return dados_incc
+    signature = _file_signature()
+
+    with _cache_lock:
+        cached = _historico_cache.get(signature)
+
+    if cached is None:
+        cached = pd.read_excel(INCC_FILE)
+        cached["ds"] = pd.to_datetime(cached["ds"])
+        cached.columns = ["ds", "incc"]
+        with _cache_lock:
+            _historico_cache[signature] = cached
+
+    return cached.copy()
+
+
+def _fit_incc_model(signature, incc_historico):
+    """Ajusta (uma vez por versão do arquivo) o Holt-Winters do INCC."""
+    with _cache_lock:
+        fitted_model = _model_cache.get(signature)
+
+    if fitted_model is None:
+        incc_historico_indexed = incc_historico.set_index("ds")
+
+        model_incc = ExponentialSmoothing(
+            incc_historico_indexed["incc"], seasonal_periods=30, trend="add", seasonal="add"
+        )
 
+        fitted_model = model_incc.fit()
+        with _cache_lock:
+            _model_cache[signature] = fitted_model
 
-def get_incc_with_forecast(end_date=None, forecast_periods=540):
+    return fitted_model
+
+
+def _disk_cache_path(key, cache_dir):
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"incc_forecast_{digest}.pkl")
+
+
+def get_incc_with_forecast(end_date=None, forecast_periods=540, cache_dir=None):
     """
     Carrega INCC histórico e faz previsão dos valores futuros.
 
+    A projeção é memoizada pela versão do arquivo (mtime/tamanho) e pelo
+    horizonte necessário para cobrir `end_date`: o ajuste do Holt-Winters
+    acontece uma vez por processo (ou por mudança no arquivo). Com
+    `cache_dir` (ou INCC_CACHE_DIR), também é persistida em disco.
+
     Args:
         end_date: Data final necessária (se None, usa data atual + forecast_periods)
         forecast_periods: Número de dias para prever (padrão 540 = 18 meses)
+        cache_dir: Diretório do cache em disco (padrão: INCC_CACHE_DIR)
 
     Returns:
         DataFrame com 'ds' e 'incc' (histórico + previsão)
     """
+    signature = _file_signature()
     incc_historico = get_incc()
 
     if end_date is not None:
@@ -33,17 +101,27 @@ def get_incc_with_forecast(end_date=None, forecast_periods=540):
         if days_needed > 0:
             forecast_periods = max(forecast_periods, days_needed + 30)
 
-    print(
-        f"🔮 Prevendo INCC por {forecast_periods} dias (último histórico: {incc_historico['ds'].max()})"
-    )
+    key = (signature, forecast_periods)
+    cache_dir = cache_dir or INCC_CACHE_DIR
+
+    with _cache_lock:
+        cached = _forecast_cache.get(key)
 
-    incc_historico_indexed = incc_historico.set_index("ds")
+    if cached is None and cache_dir:
+        path = _disk_cache_path(key, cache_dir)
+        if os.path.exists(path):
+            cached = pd.read_pickle(path)
+            with _cache_lock:
+                _forecast_cache[key] = cached
 
-    model_incc = ExponentialSmoothing(
-        incc_historico_indexed["incc"], seasonal_periods=30, trend="add", seasonal="add"
+    if cached is not None:
+        return cached.copy()
+
+    print(
+        f"🔮 Prevendo INCC por {forecast_periods} dias (último histórico: {incc_historico['ds'].max()})"
     )
 
-    fitted_model = model_incc.fit()
+    fitted_model = _fit_incc_model(signature, incc_historico)
 
     forecast = fitted_model.forecast(steps=forecast_periods)
 
@@ -62,4 +140,15 @@ def get_incc_with_forecast(end_date=None, forecast_periods=540):
 
     print(f"✅ INCC disponível até {incc_completo['ds'].max()}")
 
-    return incc_completo
+    with _cache_lock:
+        _forecast_cache[key] = incc_completo
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = _disk_cache_path(key, cache_dir)
+        # Grava num temporário e renomeia: outro worker nunca lê arquivo parcial
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        incc_completo.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    return incc_completo.copy()
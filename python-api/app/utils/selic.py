@@ -1,12 +1,16 @@
 # app/utils/selic.py
 import pandas as pd
 from pathlib import Path
+
+SELIC_FILE = 'SELIC.xlsx'
+
+
 def get_selic_with_forecast(end_date=None):
     """
     Carrega a planilha da SELIC e retorna um DataFrame com projeção mensal até end_date.
     A coluna principal é 'selic', com data em 'ds'.
     """
-    selic_df = pd.read_excel('SELIC.xlsx')
+    selic_df = pd.read_excel(SELIC_FILE)
 
     selic_df["ds"] = pd.to_datetime(selic_df["ds"])
     selic_df["selic"] = selic_df["SELIC"]
@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def _sum_squares_x(size):
+    """Σ(x - x̄)² para x = 0..size-1 (denominador da inclinação OLS)."""
+    return size * (size**2 - 1) / 12
+
+
+def linear_slope(values):
+    """
+    Inclinação da reta de mínimos quadrados de `values` contra 0..n-1.
+
+    Equivale a np.linalg.lstsq([x, 1], y)[0][0], mas em forma fechada:
+    slope = Σ(x - x̄)·y / Σ(x - x̄)². Retorna 0 para menos de 2 pontos.
+    """
+    y = np.asarray(values, dtype=float)
+    return float(trailing_slope(y[None, :], [len(y)])[0])
+
+
+def trailing_slope(windows, sizes):
+    """
+    Inclinação OLS dos últimos `sizes[i]` valores de cada linha de `windows`.
+
+    Args:
+        windows: Matriz (n_séries, w) com os valores em ordem cronológica
+        sizes: Quantidade de valores válidos no fim de cada linha
+
+    Returns:
+        np.ndarray (n_séries,) com a inclinação; 0 quando há menos de 2 pontos
+    """
+    windows = np.asarray(windows, dtype=float)
+    sizes = np.asarray(sizes)[:, None]
+    width = windows.shape[1]
+
+    # x de cada valor dentro da sua janela (0..size-1), centrado na média
+    valid = np.arange(width) >= width - sizes
+    x_centered = np.arange(width) - (width - sizes) - (sizes - 1) / 2
+    sum_xy = np.where(valid, x_centered * windows, 0.0).sum(axis=1)
+
+    sum_xx = _sum_squares_x(sizes[:, 0])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(sum_xx > 0, sum_xy / sum_xx, 0.0)
+
+
+def rolling_slope(values, window=6, min_periods=3, group_positions=None):
+    """
+    Inclinação OLS móvel, vetorizada, com a mesma semântica de
+    `Series.rolling(window, min_periods).apply(lstsq)`.
+
+    Args:
+        values: Série/array de valores (pode conter NaN)
+        window: Tamanho máximo da janela
+        min_periods: Mínimo de observações para calcular a inclinação
+        group_positions: Posição de cada linha dentro da sua série (cumcount),
+            para dados com várias séries contíguas. Se None, uma única série.
+
+    Returns:
+        np.ndarray com a inclinação de cada janela; NaN quando a janela tem
+        menos de `min_periods` pontos ou contém NaN (como o lstsq do pandas).
+    """
+    y = np.asarray(values, dtype=float)
+    n_obs = len(y)
+    if group_positions is None:
+        positions = np.arange(n_obs)
+    else:
+        positions = np.asarray(group_positions)
+
+    # Janela efetiva: truncada no início de cada série
+    size = np.minimum(positions + 1, window)
+    x_mean = (size - 1) / 2
+
+    index = np.arange(n_obs)
+    sum_xy = np.zeros(n_obs)
+    has_nan = np.zeros(n_obs, dtype=bool)
+
+    # k = distância até a linha atual; x do ponto dentro da janela = size-1-k
+    for k in range(window):
+        present = k < size
+        y_k = y[np.maximum(index - k, 0)]
+        has_nan |= present & np.isnan(y_k)
+        sum_xy += np.where(present, (size - 1 - k - x_mean) * y_k, 0.0)
+
+    sum_xx = _sum_squares_x(size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where(sum_xx > 0, sum_xy / sum_xx, 0.0)
+
+    slope[(size < min_periods) | has_nan] = np.nan
+    return slope
@@ -0,0 +1,103 @@
+# benchmark_enrich_features.py
+# Compara o enrich_features agrupado (vetorizado) com o laço antigo por SKU.
+# Uso: python -m testes.benchmark_enrich_features [qtd_skus ...]
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from app.services.xgboost_service import XGBoostService
+
+warnings.filterwarnings("ignore")
+
+MESES = 36
+TAMANHOS_PADRAO = [100, 1_000, 10_000]
+# Acima disso o laço antigo leva minutos; mede só a versão nova
+LIMITE_LEGADO = 1_000
+
+
+def gerar_painel(qtd_skus, meses=MESES, seed=42):
+    """Painel sintético SKU x mês no formato do DataTransformer."""
+    rng = np.random.default_rng(seed)
+    datas = pd.date_range("2022-08-01", periods=meses, freq="MS")
+    df = pd.DataFrame({
+        "SKU": np.repeat([f"SKU{i:06d}" for i in range(qtd_skus)], meses),
+        "Data": np.tile(datas, qtd_skus),
+        "Quantidade": rng.gamma(2.0, 50.0, size=qtd_skus * meses).round(),
+    })
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def enrich_features_legado(df, target="Quantidade", date_col="Data", group_col=None):
+    """Cópia do laço por grupo usado antes da versão agrupada (referência)."""
+    df = df.copy()
+    df[date_col] = pd.to_datetime(df[date_col])
+    df = df.sort_values(date_col).reset_index(drop=True)
+
+    group_obj = df.groupby(group_col) if group_col else [(None, df)]
+    enriched_dfs = []
+
+    def rolling_trend(x):
+        y = np.array(x)
+        X = np.arange(len(y))
+        A = np.vstack([X, np.ones(len(X))]).T
+        return np.linalg.lstsq(A, y, rcond=None)[0][0]
+
+    for _, group_df in group_obj:
+        g = group_df.copy()
+        for lag in [1, 3, 6, 12]:
+            g[f"lag_{lag}"] = g[target].shift(lag)
+        for w in [3, 6, 12]:
+            g[f"rolling_mean_{w}"] = g[target].shift(1).rolling(window=w, min_periods=1).mean()
+            g[f"rolling_std_{w}"] = g[target].shift(1).rolling(window=w, min_periods=1).std()
+        g["growth_rate_1"] = g[target].pct_change(1)
+        g["growth_rate_3"] = g[target].pct_change(3)
+        g["growth_rate_6"] = g[target].pct_change(6)
+        g["year"] = g[date_col].dt.year
+        g["month"] = g[date_col].dt.month
+        g["quarter"] = g[date_col].dt.quarter
+        g["day_of_year"] = g[date_col].dt.dayofyear
+        g["week_of_year"] = g[date_col].dt.isocalendar().week.astype(int)
+        g["month_sin"] = np.sin(2 * np.pi * g["month"] / 12)
+        g["month_cos"] = np.cos(2 * np.pi * g["month"] / 12)
+        g["quarter_sin"] = np.sin(2 * np.pi * g["quarter"] / 4)
+        g["quarter_cos"] = np.cos(2 * np.pi * g["quarter"] / 4)
+        feriados = ["01-01", "04-21", "05-01", "09-07", "10-12", "11-02", "11-15", "12-25"]
+        g["is_holiday"] = g[date_col].dt.strftime("%m-%d").isin(feriados).astype(int)
+        g["trend_6"] = g[target].shift(1).rolling(window=6, min_periods=3).apply(rolling_trend, raw=False)
+        g = g.replace([np.inf, -np.inf], np.nan).bfill().fillna(0)
+        enriched_dfs.append(g)
+
+    return pd.concat(enriched_dfs, ignore_index=True)
+
+
+def medir(func, df):
+    inicio = time.perf_counter()
+    resultado = func(df, group_col="SKU")
+    return time.perf_counter() - inicio, resultado
+
+
+if __name__ == "__main__":
+    tamanhos = [int(arg) for arg in sys.argv[1:]] or TAMANHOS_PADRAO
+
+    print(f"\n⏱️  enrich_features — {MESES} meses por SKU")
+    print("=" * 60)
+
+    for qtd in tamanhos:
+        df = gerar_painel(qtd)
+        tempo_novo, novo = medir(XGBoostService.enrich_features, df)
+
+        if qtd <= LIMITE_LEGADO:
+            tempo_legado, legado = medir(enrich_features_legado, df)
+            # trend_6 usa inclinação em forma fechada: difere do lstsq só no arredondamento
+            pd.testing.assert_frame_equal(legado, novo, check_exact=False, rtol=1e-9, atol=1e-9)
+            print(
+                f"✅ {qtd:>6} SKUs: legado={tempo_legado:8.2f}s  agrupado={tempo_novo:8.2f}s  "
+                f"speedup={tempo_legado / tempo_novo:6.1f}x  (saídas equivalentes)"
+            )
+        else:
+            print(f"✅ {qtd:>6} SKUs: agrupado={tempo_novo:8.2f}s  (legado omitido)")
+
+    print("=" * 60 + "\n")
@@ -0,0 +1,109 @@
+# benchmark_outliers.py
+# Compara o tratamento de outliers agrupado (GroupedStats) com os
+# groupby.transform(lambda) usados antes, para todos os métodos.
+# Uso: python -m testes.benchmark_outliers [qtd_skus ...]
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from app.data_processing.transformer import DataTransformer
+
+warnings.filterwarnings("ignore")
+
+MESES = 36
+TAMANHOS_PADRAO = [1_100, 10_000]
+METODOS = ["iqr", "mad", "percentile", "zscore", "winsorize"]
+
+
+def gerar_painel(qtd_skus, meses=MESES, seed=42):
+    """Painel sintético SKU x mês, com picos e SKUs intermitentes."""
+    rng = np.random.default_rng(seed)
+    quantidade = rng.gamma(2.0, 50.0, size=qtd_skus * meses).round()
+    quantidade[rng.random(quantidade.size) < 0.05] *= 10
+    quantidade[rng.random(quantidade.size) < 0.15] = 0
+    df = pd.DataFrame({
+        "SKU": np.repeat([f"SKU{i:06d}" for i in range(qtd_skus)], meses),
+        "Data": np.tile(pd.date_range("2022-08-01", periods=meses, freq="MS"), qtd_skus),
+        "Quantidade": quantidade,
+    })
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def outliers_legado(df, method, threshold=1.5):
+    """Cópia dos ramos agrupados antigos (groupby.transform com lambdas)."""
+    df = df.copy()
+    grupos = df.groupby("SKU")["Quantidade"]
+
+    if method == "iqr":
+        q1 = grupos.transform(lambda x: x.quantile(0.25))
+        q3 = grupos.transform(lambda x: x.quantile(0.75))
+        iqr = q3 - q1
+        df["Quantidade"] = df["Quantidade"].clip(lower=np.maximum(0, q1 - threshold * iqr), upper=q3 + threshold * iqr)
+
+    elif method == "mad":
+        def mad_treatment(series):
+            median = series.median()
+            mad = np.median(np.abs(series - median))
+            if mad == 0:
+                return series.clip(upper=series.quantile(0.90))
+            series_clean = series.copy()
+            series_clean[np.abs(0.6745 * (series - median) / mad) > 2.5] = median
+            return series_clean
+        df["Quantidade"] = grupos.transform(mad_treatment)
+
+    elif method == "percentile":
+        df["Quantidade"] = grupos.transform(lambda s: s.clip(lower=s.quantile(0.05), upper=s.quantile(0.90)))
+
+    elif method == "zscore":
+        def zscore_treatment(series):
+            std = series.std()
+            if std == 0:
+                return series
+            series_clean = series.copy()
+            series_clean[np.abs((series - series.mean()) / std) > threshold] = series.median()
+            return series_clean
+        df["Quantidade"] = grupos.transform(zscore_treatment)
+
+    elif method == "winsorize":
+        def winsorize_treatment(series):
+            lower, upper = series.quantile(0.10), series.quantile(0.90)
+            series_clean = series.copy()
+            series_clean[series < lower] = lower
+            series_clean[series > upper] = upper
+            return series_clean
+        df["Quantidade"] = grupos.transform(winsorize_treatment)
+
+    return df
+
+
+def medir(func, *args):
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+if __name__ == "__main__":
+    tamanhos = [int(arg) for arg in sys.argv[1:]] or TAMANHOS_PADRAO
+
+    print(f"\n⏱️  Tratamento de outliers por SKU — {MESES} meses por SKU")
+    print("=" * 72)
+
+    for qtd in tamanhos:
+        df = gerar_painel(qtd)
+        print(f"📦 {qtd} SKUs ({len(df)} linhas)")
+
+        for metodo in METODOS:
+            transformer = DataTransformer(outlier_method=metodo, verbose=False)
+            tempo_novo, novo = medir(transformer.remove_outliers, df)
+            tempo_legado, legado = medir(outliers_legado, df, metodo)
+
+            pd.testing.assert_series_equal(legado["Quantidade"], novo["Quantidade"], check_exact=True)
+            print(
+                f"   ✅ {metodo:<10} legado={tempo_legado:7.3f}s  agrupado={tempo_novo:7.3f}s  "
+                f"speedup={tempo_legado / tempo_novo:6.1f}x  (saídas idênticas)"
+            )
+
+    print("=" * 72 + "\n")